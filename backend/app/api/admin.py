@@ -0,0 +1,42 @@
+"""Admin Router — Operational endpoints guarded by ADMIN_TOKEN."""
+import asyncio
+import hmac
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.profiler import sample_stacks
+
+router = APIRouter()
+
+_profile_lock = asyncio.Lock()
+
+
+def _require_admin(token: str | None):
+    if not settings.ADMIN_TOKEN:
+        # Admin endpoints don't exist unless a token is configured.
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/admin/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    x_admin_token: str | None = Header(None, alias="X-Admin-Token"),
+):
+    """Sample every thread's stack for ``seconds``; returns collapsed stacks.
+
+    Feed the result to flamegraph.pl or speedscope.
+    """
+    _require_admin(x_admin_token)
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with _profile_lock:
+        collapsed = await asyncio.to_thread(
+            sample_stacks, min(seconds, settings.PROFILE_MAX_SECONDS), interval_ms / 1000
+        )
+    return PlainTextResponse(
+        collapsed, headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
@@ -0,0 +1,126 @@
+"""Jobs Router — Generate stories without holding the request open."""
+import logging
+import uuid
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.database import async_session, get_db
+from app.core.metrics import record_job
+from app.models import GenerationJob
+from app.routes.api import (
+    GenerateRequest,
+    GenerateResponse,
+    debit_generation,
+    payer_request,
+    produce_stories,
+    request_payer,
+    return_generations,
+)
+from app.services.idempotency import idempotent
+from app.services.jobs import ClaimedJob, JobWorkerPool
+from app.services.pages import save_page
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    year: int
+    lang: str
+    result: Optional[GenerateResponse] = None
+    error: Optional[str] = None
+
+
+async def run_generation_job(job: ClaimedJob) -> dict:
+    stories = await produce_stories(job.year, job.lang, job.paid)
+    async with async_session() as db:
+        page_id = save_page(db, job.year, job.lang, stories)
+        await db.commit()
+    return {
+        "stories": list(stories),
+        "seed": getattr(stories, "seed", None),
+        "prompt_variant": getattr(stories, "prompt_variant", None),
+        "page_id": page_id,
+    }
+
+
+async def refund_generation_job(db: AsyncSession, job: ClaimedJob):
+    """Give a failed job's generation back to whoever paid for it."""
+    if job.payer is None:
+        return
+    if not await return_generations(payer_request(job.payer, job.year, job.lang), db, 1):
+        logger.warning("Could not refund failed job %s to %s", job.id, job.payer)
+
+
+job_workers = JobWorkerPool(run_generation_job, refund=refund_generation_job)
+
+
+def _job_response(job: GenerationJob) -> JobResponse:
+    result = None
+    if job.status == "done" and job.result is not None:
+        result = GenerateResponse(year=job.year, **job.result)
+    return JobResponse(
+        job_id=str(job.id), status=job.status, year=job.year, lang=job.lang,
+        result=result, error=job.error,
+    )
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(
+    request: GenerateRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+):
+    """Charge the request and queue the generation; poll GET /jobs/{id} for the page.
+
+    With an Idempotency-Key, retries get the same job back.
+    """
+
+    async def run():
+        job = GenerationJob(
+            year=request.year,
+            lang=request.lang,
+            paid=bool(request.token or request.use_wallet),
+            device_id=request.device_id,
+            payer=request_payer(request),
+        )
+        # Added before the debit so the debit's commit stores both: the credit
+        # is never spent without a job to show for it.
+        db.add(job)
+        await debit_generation(request, db)
+        record_job("queued")
+        job_workers.notify()
+        return _job_response(job)
+
+    if not idempotency_key:
+        return await run()
+    return await idempotent("jobs", idempotency_key, request, response, db, run)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: uuid.UUID,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Job status and, once done, the generated page.
+
+    With ``wait`` the request is held until the job finishes or the wait
+    (capped at JOB_WAIT_MAX_SECONDS) runs out.
+    """
+    if wait:
+        job = await job_workers.wait(job_id, min(wait, settings.JOB_WAIT_MAX_SECONDS))
+    else:
+        job = await db.get(GenerationJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    response = _job_response(job)
+    return JSONResponse(response.model_dump(), status_code=200 if job.finished else 202)
@@ -3,13 +3,15 @@ import hmac
 import hashlib
 import json
 import httpx
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.database import get_db
 from app.models import GenerationToken, PaymentTransaction
 from app.schemas.payment import Product, CreateCheckoutRequest, CreateCheckoutResponse
+from app.services.idempotency import idempotent
 
 
 def get_creem_api_base():
@@ -56,9 +58,23 @@ def _calculate_discount(sku: str) -> int | None:
 @router.post("/payment/create-checkout", response_model=CreateCheckoutResponse)
 async def create_checkout(
     request: CreateCheckoutRequest,
+    response: Response,
     db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
 ):
-    """Create a Creem checkout session."""
+    """Create a Creem checkout session.
+
+    With an Idempotency-Key, retries get the first session back instead of
+    creating another one.
+    """
+    if not idempotency_key:
+        return await _create_checkout(request)
+    return await idempotent(
+        "checkout", idempotency_key, request, response, db, lambda: _create_checkout(request)
+    )
+
+
+async def _create_checkout(request: CreateCheckoutRequest) -> CreateCheckoutResponse:
     if request.product_sku not in settings.PRODUCTS:
         raise HTTPException(status_code=400, detail="Invalid product SKU")
 
@@ -1,8 +1,9 @@
 """Token Router — Query, validate, and list tokens."""
 from datetime import datetime
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 from pydantic import BaseModel
 
 from app.core.database import get_db
@@ -27,6 +28,13 @@ class ValidateResponse(BaseModel):
     valid: bool
 
 
+class WalletResponse(BaseModel):
+    device_id: str
+    remaining_generations: int
+    token_count: int
+    next_expiry: Optional[str] = None
+
+
 @router.get("/tokens/info/{token}", response_model=TokenInfo)
 async def get_token_info(
     token: str,
@@ -92,3 +100,31 @@ async def get_tokens_by_device(
             for t in tokens
         ]
     )
+
+
+@router.get("/tokens/wallet/{device_id}", response_model=WalletResponse)
+async def get_wallet_balance(
+    device_id: str,
+    db: AsyncSession = Depends(get_db),
+):
+    """Get the combined balance of all valid tokens for a device."""
+    now = datetime.utcnow()
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(GenerationToken.remaining_generations), 0),
+            func.count(),
+            func.min(GenerationToken.expires_at),
+        ).where(
+            GenerationToken.device_id == device_id,
+            GenerationToken.remaining_generations > 0,
+            GenerationToken.expires_at > now,
+        )
+    )
+    remaining, count, next_expiry = result.one()
+
+    return WalletResponse(
+        device_id=device_id,
+        remaining_generations=remaining,
+        token_count=count,
+        next_expiry=next_expiry.isoformat() if next_expiry else None,
+    )
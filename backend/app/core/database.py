@@ -1,4 +1,6 @@
 """Database setup with async SQLAlchemy."""
+import asyncio
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
@@ -24,3 +26,20 @@ async def init_db():
     """Create all tables (for development/startup)."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def init_schema():
+    """Create missing tables, then apply the migrations for existing ones."""
+    import app.models  # noqa: F401  (registers the tables on Base)
+    from app.core.migrations import migrate
+
+    await init_db()
+    await migrate(engine)
+
+
+if __name__ == "__main__":
+    # Create the schema explicitly, e.g. once per deploy when DB_CREATE_SCHEMA is off.
+    # Go through the package module: under -m this file is also __main__, with its own Base.
+    from app.core import database
+
+    asyncio.run(database.init_schema())
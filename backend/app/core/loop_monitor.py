@@ -0,0 +1,77 @@
+"""Event-loop lag sampling and stall detection.
+
+A background task sleeps for LOOP_LAG_INTERVAL_SECONDS at a time and
+records how late each wake-up is. Every wake-up also refreshes a heartbeat.
+A watchdog thread checks that heartbeat. When the loop has not come back
+for LOOP_STALL_THRESHOLD_SECONDS past its wake-up, the thread captures the
+loop thread's stack and logs the coroutine that is blocking it.
+"""
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.core.metrics import record_loop_lag, record_loop_stall
+
+logger = logging.getLogger(__name__)
+
+
+def _blocking_coroutine(frame) -> Optional[str]:
+    """Name of the innermost coroutine on the stack that starts at ``frame``."""
+    while frame is not None:
+        if frame.f_code.co_flags & inspect.CO_COROUTINE:
+            return f"{frame.f_code.co_qualname} ({frame.f_code.co_filename}:{frame.f_lineno})"
+        frame = frame.f_back
+    return None
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, stall_threshold: float):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+
+    async def run(self):
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self._heartbeat = now = time.monotonic()
+                record_loop_lag(max(0.0, now - started - self.interval))
+        finally:
+            self._stop.set()
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.stall_threshold / 2):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.stall_threshold:
+                continue
+            if reported != heartbeat:
+                # One report per stall, taken while the loop is still blocked.
+                reported = heartbeat
+                self._report_stall(blocked_for)
+
+    def _report_stall(self, blocked_for: float):
+        record_loop_stall()
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        logger.warning(
+            "Event loop blocked for %.0f ms in %s\n%s",
+            blocked_for * 1000,
+            _blocking_coroutine(frame) or "a callback",
+            "".join(traceback.format_stack(frame)),
+        )
@@ -1,7 +1,13 @@
 """
 Prometheus Metrics for DenseMatrix Demo Tools
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR before the app
+is imported: every worker then writes its values to mmap-backed files in
+that directory and /api/metrics merges all of them. ``gunicorn.conf.py``
+does this and cleans up after dead workers.
 """
-from prometheus_client import Counter, Histogram
+from prometheus_client import CollectorRegistry, Counter, Histogram
+import glob
 import os
 
 TOOL_SLUG = os.getenv("TOOL_SLUG", "future-hacker-news")
@@ -39,6 +45,137 @@ GENERATION_LATENCY = Histogram(
     buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
 )
 
+# LLM call metrics
+LLM_CALL_COUNTER = Counter(
+    'llm_call_total',
+    'LLM completion calls by serving model',
+    ['tool', 'model', 'purpose', 'status']
+)
+
+LLM_CALL_LATENCY = Histogram(
+    'llm_call_latency_seconds',
+    'LLM completion latency by serving model',
+    ['tool', 'model', 'purpose'],
+    buckets=[0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0]
+)
+
+LLM_QUEUE_WAIT = Histogram(
+    'llm_queue_wait_seconds',
+    'Time an LLM call waited for a concurrency slot, by priority class',
+    ['tool', 'priority'],
+    buckets=[0.005, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
+)
+
+LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'How late the event loop woke up a sleeping sampler task',
+    ['tool'],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+LOOP_STALLS = Counter(
+    'event_loop_stalls_total',
+    'Times the event loop was blocked past the stall threshold',
+    ['tool']
+)
+
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'SQL statements executed per request, by route',
+    ['tool', 'route'],
+    buckets=[0, 1, 2, 3, 4, 6, 8, 12, 20, 50]
+)
+
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds',
+    'Time spent in SQL statements per request, by route',
+    ['tool', 'route'],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+PROMPT_CALLS = Counter(
+    'llm_prompt_calls_total',
+    'Completions by prompt variant and outcome (ok, parse_error, error)',
+    ['tool', 'purpose', 'variant', 'outcome']
+)
+
+PROMPT_LATENCY = Histogram(
+    'llm_prompt_latency_seconds',
+    'Time from queueing a prompt to its parsed result, by prompt variant',
+    ['tool', 'purpose', 'variant'],
+    buckets=[0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0]
+)
+
+PROMPT_TTFT = Histogram(
+    'llm_prompt_ttft_seconds',
+    'Time to the first streamed token, by prompt variant',
+    ['tool', 'purpose', 'variant'],
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0]
+)
+
+PROMPT_OUTPUT_TOKENS = Histogram(
+    'llm_prompt_output_tokens',
+    'Completion tokens per response, by prompt variant',
+    ['tool', 'purpose', 'variant'],
+    buckets=[100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000]
+)
+
+PROMPT_STORIES = Histogram(
+    'llm_prompt_stories_returned',
+    'Usable stories parsed from one stories response, by prompt variant',
+    ['tool', 'variant'],
+    buckets=[0, 5, 10, 15, 20, 25, 28, 29, 30]
+)
+
+DETAILS_BATCH_SIZE = Histogram(
+    'llm_details_batch_size',
+    'Stories per coalesced story-details completion',
+    ['tool'],
+    buckets=[1, 2, 3, 4, 5, 8, 10]
+)
+
+DETAILS_BATCH_RETRIES = Counter(
+    'llm_details_batch_retries_total',
+    'Stories missing from a batch response and retried individually',
+    ['tool']
+)
+
+STORIES_TOPUP = Counter(
+    'llm_stories_topup_total',
+    'Stories requested in follow-up completions for short pages',
+    ['tool']
+)
+
+MAINTENANCE_ROWS = Counter(
+    'maintenance_rows_archived_total',
+    'Rows moved out of hot tables by the maintenance job',
+    ['tool', 'table']
+)
+
+JOB_COUNTER = Counter(
+    'generation_job_total',
+    'Generation jobs by lifecycle event',
+    ['tool', 'event']
+)
+
+IDEMPOTENCY_COUNTER = Counter(
+    'idempotency_requests_total',
+    'Requests carrying an Idempotency-Key, by outcome',
+    ['tool', 'endpoint', 'outcome']
+)
+
+CORPUS_EVICTIONS = Counter(
+    'story_corpus_evictions_total',
+    'Stories dropped from a full story corpus to make room for new ones',
+    ['tool']
+)
+
+SINGLE_FLIGHT_COUNTER = Counter(
+    'single_flight_requests_total',
+    'Callers of deduplicated work, by kind of work and outcome (led, waited, stored, timeout, unlocked)',
+    ['tool', 'kind', 'outcome']
+)
+
 
 def record_payment(status: str):
     PAYMENT_COUNTER.labels(tool=TOOL_SLUG, status=status).inc()
@@ -58,3 +195,110 @@ def record_token_consumed(count: int = 1):
 
 def generation_timer():
     return GENERATION_LATENCY.labels(tool=TOOL_SLUG).time()
+
+
+def record_llm_call(model: str, purpose: str, status: str, latency: float | None = None):
+    LLM_CALL_COUNTER.labels(tool=TOOL_SLUG, model=model, purpose=purpose, status=status).inc()
+    if latency is not None:
+        LLM_CALL_LATENCY.labels(tool=TOOL_SLUG, model=model, purpose=purpose).observe(latency)
+
+
+def record_llm_queue_wait(priority: str, seconds: float):
+    LLM_QUEUE_WAIT.labels(tool=TOOL_SLUG, priority=priority).observe(seconds)
+
+
+def record_loop_lag(seconds: float):
+    LOOP_LAG.labels(tool=TOOL_SLUG).observe(seconds)
+
+
+def record_loop_stall():
+    LOOP_STALLS.labels(tool=TOOL_SLUG).inc()
+
+
+def record_request_queries(route: str, count: int, seconds: float):
+    REQUEST_DB_QUERIES.labels(tool=TOOL_SLUG, route=route).observe(count)
+    REQUEST_DB_SECONDS.labels(tool=TOOL_SLUG, route=route).observe(seconds)
+
+
+def record_prompt_call(
+    purpose: str,
+    variant: str,
+    outcome: str,
+    latency: float | None = None,
+    output_tokens: int | None = None,
+    ttft: float | None = None,
+):
+    PROMPT_CALLS.labels(tool=TOOL_SLUG, purpose=purpose, variant=variant, outcome=outcome).inc()
+    if latency is not None:
+        PROMPT_LATENCY.labels(tool=TOOL_SLUG, purpose=purpose, variant=variant).observe(latency)
+    if output_tokens is not None:
+        PROMPT_OUTPUT_TOKENS.labels(tool=TOOL_SLUG, purpose=purpose, variant=variant).observe(output_tokens)
+    if ttft is not None:
+        PROMPT_TTFT.labels(tool=TOOL_SLUG, purpose=purpose, variant=variant).observe(ttft)
+
+
+def record_prompt_stories(variant: str, count: int):
+    PROMPT_STORIES.labels(tool=TOOL_SLUG, variant=variant).observe(count)
+
+
+def record_details_batch(size: int, missing: int = 0):
+    DETAILS_BATCH_SIZE.labels(tool=TOOL_SLUG).observe(size)
+    if missing:
+        DETAILS_BATCH_RETRIES.labels(tool=TOOL_SLUG).inc(missing)
+
+
+def record_stories_topup(count: int):
+    STORIES_TOPUP.labels(tool=TOOL_SLUG).inc(count)
+
+
+def record_maintenance(table: str, count: int):
+    MAINTENANCE_ROWS.labels(tool=TOOL_SLUG, table=table).inc(count)
+
+
+def record_job(event: str):
+    JOB_COUNTER.labels(tool=TOOL_SLUG, event=event).inc()
+
+
+def record_idempotency(endpoint: str, outcome: str):
+    IDEMPOTENCY_COUNTER.labels(tool=TOOL_SLUG, endpoint=endpoint, outcome=outcome).inc()
+
+
+def record_corpus_eviction():
+    CORPUS_EVICTIONS.labels(tool=TOOL_SLUG).inc()
+
+
+def record_single_flight(kind: str, outcome: str):
+    SINGLE_FLIGHT_COUNTER.labels(tool=TOOL_SLUG, kind=kind, outcome=outcome).inc()
+
+
+def multiprocess_dir() -> str | None:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def prepare_multiprocess_dir(path: str | None = None):
+    """Create the shared metrics directory and drop files left by a previous run."""
+    path = path or multiprocess_dir()
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def mark_worker_dead(pid: int, path: str | None = None):
+    """Remove a dead worker's live-gauge files; its counters keep counting.
+
+    The live gauge is the instrumentator's ``http_requests_inprogress``
+    (``multiprocess_mode="livesum"``), so a worker that dies mid-request
+    no longer counts as busy. The app declares no gauges of its own.
+    """
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(pid, path or multiprocess_dir())
+
+
+def merged_registry(path: str | None = None) -> CollectorRegistry:
+    """A registry that reads the values of all workers from the shared directory."""
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path or multiprocess_dir())
+    return registry
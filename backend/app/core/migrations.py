@@ -0,0 +1,96 @@
+"""Schema changes that ``create_all`` cannot make on an existing database.
+
+``create_all`` only adds missing tables, so new columns and index changes
+on tables that already exist are listed here, in order, and applied by
+``python -m app.core.database`` once the tables are in place.
+
+Columns are nullable, so adding one only touches the catalog. Indexes are
+built and dropped CONCURRENTLY so the hot tables stay writable. Every step
+can be re-run: one that is already applied is skipped, and an index left
+INVALID by an interrupted build is dropped and built again. Only PostgreSQL
+needs this; elsewhere the models' indexes come with the tables.
+"""
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# (table, column, ALTER statement), added before the index changes.
+COLUMNS: list[tuple[str, str, str]] = [
+    ("generation_jobs", "payer", "ALTER TABLE generation_jobs ADD COLUMN payer VARCHAR(300)"),
+    ("generated_stories", "search_text", "ALTER TABLE generated_stories ADD COLUMN search_text TEXT"),
+]
+
+# (index name, CREATE statement); None drops the index.
+MIGRATIONS: list[tuple[str, Optional[str]]] = [
+    (
+        "ix_generation_tokens_device_live",
+        "CREATE INDEX CONCURRENTLY ix_generation_tokens_device_live ON generation_tokens (device_id, expires_at) "
+        "INCLUDE (remaining_generations) WHERE remaining_generations > 0",
+    ),
+    (
+        "ix_payment_transactions_token_id",
+        "CREATE INDEX CONCURRENTLY ix_payment_transactions_token_id ON payment_transactions (token_id)",
+    ),
+    # Superseded by ix_generation_tokens_device_live.
+    ("ix_generation_tokens_device_id", None),
+    (
+        "ix_generated_stories_search_text",
+        "CREATE INDEX CONCURRENTLY ix_generated_stories_search_text ON generated_stories USING gin "
+        "(to_tsvector('simple', coalesce(search_text, title || ' ' || coalesce(summary, ''))))",
+    ),
+    # Superseded by ix_generated_stories_search_text.
+    ("ix_generated_stories_search", None),
+]
+
+
+async def _index_valid(conn: AsyncConnection, name: str) -> Optional[bool]:
+    """Whether index ``name`` is valid; None if it does not exist."""
+    return (await conn.execute(
+        text(
+            "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+        ),
+        {"name": name},
+    )).scalar()
+
+
+async def _column_missing(conn: AsyncConnection, table: str, column: str) -> bool:
+    """Whether ``table`` exists without ``column``."""
+    columns = (await conn.execute(
+        text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table"
+        ),
+        {"table": table},
+    )).scalars().all()
+    return bool(columns) and column not in columns
+
+
+async def _apply(conn: AsyncConnection, statement: str, applied: list[str]):
+    logger.info("Migration: %s", statement)
+    await conn.execute(text(statement))
+    applied.append(statement)
+
+
+async def migrate(engine: AsyncEngine) -> list[str]:
+    """Apply the migrations not yet in the database; returns the statements run."""
+    if engine.dialect.name != "postgresql":
+        return []
+    applied = []
+    async with engine.connect() as conn:
+        # CONCURRENTLY cannot run inside a transaction.
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table, column, alter in COLUMNS:
+            if await _column_missing(conn, table, column):
+                await _apply(conn, alter, applied)
+        for name, create in MIGRATIONS:
+            valid = await _index_valid(conn, name)
+            if valid is False or (valid and create is None):
+                await _apply(conn, f"DROP INDEX CONCURRENTLY {name}", applied)
+            if create is not None and not valid:
+                await _apply(conn, create, applied)
+    return applied
@@ -0,0 +1,37 @@
+"""Sampling profiler for the live process.
+
+Samples the stacks of every thread at a fixed interval and aggregates them
+in the collapsed-stack format used by flamegraph.pl and speedscope:
+``thread;outer (file:line);...;inner (file:line) count``.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> str:
+    """Profile all other threads for ``seconds``; blocks the calling thread."""
+    me = threading.get_ident()
+    names = {}
+    stacks: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if thread_id not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            thread_name = names.get(thread_id, str(thread_id)).replace(" ", "_")
+            stacks[";".join([thread_name, *reversed(labels)])] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
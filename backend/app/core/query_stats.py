@@ -0,0 +1,106 @@
+"""Per-request SQL statement counts and database time.
+
+Engine-level SQLAlchemy hooks time every statement. The time goes to the
+``QueryStats`` of the current request, held in a context variable, and to
+every enclosing ``QueryStats``, so tests can wrap HTTP calls in
+``assert_max_queries``. ``QueryStatsMiddleware`` opens one per HTTP request.
+When the request finishes it reports the totals by route template, and it
+logs requests that exceed DB_QUERY_BUDGET.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import record_request_queries
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: list[str] = []
+
+    def add(self, statement: str, seconds: float):
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.seconds += seconds
+            stats.statements.append(statement)
+            stats = stats.parent
+
+
+@contextmanager
+def track_queries():
+    """Count the statements executed inside the block."""
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail if the block executes more than ``limit`` SQL statements."""
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        listing = "\n".join(f"  {s}" for s in stats.statements)
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.count}:\n{listing}")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started")
+    if stats is not None and started:
+        stats.add(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware, so the context variable reaches the endpoint."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_queries() as stats:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    record_request_queries(route, stats.count, stats.seconds)
+                    if 0 < settings.DB_QUERY_BUDGET < stats.count:
+                        logger.warning(
+                            "%s %s ran %d queries (%.1f ms of DB time), budget is %d",
+                            scope["method"], route, stats.count, stats.seconds * 1000, settings.DB_QUERY_BUDGET,
+                        )
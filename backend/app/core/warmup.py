@@ -0,0 +1,83 @@
+"""Start-up warm-up and readiness state."""
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+DB_RETRY_SECONDS = 2.0
+
+
+class Readiness:
+    """Tracks warm-up progress for the /ready probe."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ready_at: float | None = None
+        self.steps: dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def mark_ready(self):
+        self.ready_at = time.monotonic()
+        logger.info("Warm-up finished in %.2fs", self.ready_at - self.started_at)
+
+    def to_dict(self) -> dict:
+        elapsed = (self.ready_at or time.monotonic()) - self.started_at
+        return {"ready": self.ready, "warm_up_seconds": round(elapsed, 3), "steps": dict(self.steps)}
+
+
+readiness = Readiness()
+
+
+async def _warm_db():
+    """Open the first pool connections so no request pays for connect + auth."""
+
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    while True:
+        try:
+            # Held concurrently, so the pool really holds N open connections.
+            await asyncio.gather(*(ping() for _ in range(max(1, settings.DB_WARM_CONNECTIONS))))
+            return
+        except Exception as e:
+            readiness.steps["db"] = f"retrying: {e}"
+            logger.warning("DB warm-up failed, retrying in %.0fs: %s", DB_RETRY_SECONDS, e)
+            await asyncio.sleep(DB_RETRY_SECONDS)
+
+
+async def _warm_llm():
+    from app.services.llm import warm_up_clients
+
+    await warm_up_clients()
+
+
+async def warm_up():
+    """Warm every dependency, then mark the process ready.
+
+    The database is required and retried until it answers; the LLM warm-up
+    is best-effort since the router already fails over between models.
+    """
+    readiness.steps["db"] = "warming"
+    await _warm_db()
+    readiness.steps["db"] = "ok"
+
+    if settings.LLM_WARM_UP:
+        readiness.steps["llm"] = "warming"
+        try:
+            await _warm_llm()
+            readiness.steps["llm"] = "ok"
+        except Exception as e:
+            readiness.steps["llm"] = f"skipped: {e}"
+            logger.warning("LLM warm-up failed: %s", e)
+
+    readiness.mark_ready()
@@ -1,21 +1,75 @@
 """Future Hacker News - FastAPI Backend"""
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from prometheus_fastapi_instrumentator import Instrumentator
 
+from app.core.config import settings
 from app.core.database import init_db
+from app.core.loop_monitor import LoopMonitor
+from app.core.query_stats import QueryStatsMiddleware
+from app.core.warmup import readiness, warm_up
+from app.services.maintenance import maintenance_loop
 from app.core.metrics import record_generation, generation_timer
-from app.routes.api import router as api_router
+from app.routes.api import router as api_router, _details_cache, _stories_cache
+from app.services.cache_snapshot import snapshot_store
+from app.services.single_flight import single_flight
 from app.api.payment import router as payment_router
 from app.api.tokens import router as tokens_router
+from app.api.jobs import router as jobs_router, job_workers
+from app.api.admin import router as admin_router
+
+logger = logging.getLogger(__name__)
+
+
+async def restore_caches(path: str):
+    """Load the cache snapshot, then decode the story pages every visitor asks for.
+
+    Details stay lazy; there are far more of them and most are never read
+    again.
+    """
+    await snapshot_store.load(path)
+    logger.info("Warmed %d story pages from the cache snapshot", _stories_cache.warm())
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database tables on startup."""
-    await init_db()
+    """Create tables if enabled, then warm up in the background until /ready passes.
+
+    Also schedules the table maintenance job, starts the generation job
+    workers and the event-loop monitor, and reloads the cache snapshot,
+    which the shutdown path writes.
+    """
+    if settings.DB_CREATE_SCHEMA:
+        await init_db()
+    tasks = [asyncio.create_task(warm_up())]
+    if settings.CACHE_SNAPSHOT_PATH:
+        # Not part of warm-up: /ready must not wait for a large snapshot.
+        tasks.append(asyncio.create_task(restore_caches(settings.CACHE_SNAPSHOT_PATH)))
+    if settings.LOOP_LAG_INTERVAL_SECONDS > 0:
+        monitor = LoopMonitor(settings.LOOP_LAG_INTERVAL_SECONDS, settings.LOOP_STALL_THRESHOLD_SECONDS)
+        tasks.append(asyncio.create_task(monitor.run()))
+    if settings.MAINTENANCE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(maintenance_loop()))
+    if settings.JOB_WORKERS > 0:
+        job_workers.start(settings.JOB_WORKERS)
     yield
+    for task in tasks:
+        task.cancel()
+    await job_workers.stop()
+    await single_flight.close()
+    if settings.CACHE_SNAPSHOT_PATH:
+        try:
+            await asyncio.to_thread(
+                snapshot_store.save,
+                settings.CACHE_SNAPSHOT_PATH,
+                {"stories": _stories_cache, "details": _details_cache},
+            )
+        except OSError:
+            logger.exception("Could not write cache snapshot")
 
 
 app = FastAPI(title="Future Hacker News API", version="2.0.0", lifespan=lifespan)
@@ -28,14 +82,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(QueryStatsMiddleware)
+
 app.include_router(api_router, prefix="/api")
 app.include_router(payment_router, prefix="/api")
 app.include_router(tokens_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
 
-# Prometheus metrics
-Instrumentator().instrument(app).expose(app, endpoint="/api/metrics")
+# Prometheus metrics. Under PROMETHEUS_MULTIPROC_DIR /api/metrics merges all
+# workers; the in-progress gauge is then summed over live workers only.
+Instrumentator(should_instrument_requests_inprogress=True).instrument(app).expose(app, endpoint="/api/metrics")
 
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "service": "future-hacker-news"}
+
+
+@app.get("/ready")
+async def ready_check():
+    """Readiness probe: passes only once warm-up has finished."""
+    return JSONResponse(readiness.to_dict(), status_code=200 if readiness.ready else 503)
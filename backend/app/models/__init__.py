@@ -1,5 +1,25 @@
 from app.models.token import GenerationToken
 from app.models.payment import PaymentTransaction
 from app.models.free_trial import FreeTrialTracking
+from app.models.generated_story import GeneratedStory
+from app.models.job import GenerationJob
+from app.models.archive import GenerationTokenArchive, PaymentTransactionArchive, FreeTrialArchive
+from app.models.single_flight import SingleFlightResult
+from app.models.idempotency import IdempotencyKey
+from app.models.reroll import RerollAllowance
+from app.models.page import StoredPage
 
-__all__ = ["GenerationToken", "PaymentTransaction", "FreeTrialTracking"]
+__all__ = [
+    "GenerationToken",
+    "PaymentTransaction",
+    "FreeTrialTracking",
+    "GeneratedStory",
+    "GenerationJob",
+    "GenerationTokenArchive",
+    "PaymentTransactionArchive",
+    "FreeTrialArchive",
+    "SingleFlightResult",
+    "IdempotencyKey",
+    "RerollAllowance",
+    "StoredPage",
+]
@@ -0,0 +1,62 @@
+"""Archive Models — Cold storage for rows moved out of the hot tables."""
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary, Uuid
+
+from app.core.database import Base
+
+
+class GenerationTokenArchive(Base):
+    """Expired or exhausted tokens, moved out of ``generation_tokens``."""
+
+    __tablename__ = "generation_tokens_archive"
+
+    id = Column(Uuid, primary_key=True)
+    token = Column(String(255), nullable=False, index=True)
+    product_sku = Column(String(50), nullable=False)
+    total_generations = Column(Integer, nullable=False)
+    remaining_generations = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    device_id = Column(String(255))
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class PaymentTransactionArchive(Base):
+    """Transactions of archived tokens.
+
+    On PostgreSQL the table is range-partitioned by month on ``created_at``;
+    the maintenance job creates partitions as needed, and old months can be
+    detached or dropped without touching the rest.
+    """
+
+    __tablename__ = "payment_transactions_archive"
+
+    # The partition key has to be part of the primary key.
+    id = Column(Uuid, primary_key=True)
+    created_at = Column(DateTime, primary_key=True)
+    token_id = Column(Uuid, nullable=False, index=True)
+    product_sku = Column(String(50), nullable=False)
+    provider = Column(String(20), nullable=False)
+    provider_transaction_id = Column(String(255))
+    amount_cents = Column(Integer, nullable=False)
+    currency = Column(String(3), nullable=False)
+    status = Column(String(20), nullable=False)
+    device_id = Column(String(255))
+    optional_email = Column(String(255))
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+
+
+class FreeTrialArchive(Base):
+    """Compacted free-trial usage of devices not seen for a long time.
+
+    Keyed by a 16-byte digest of the device id instead of the id itself,
+    with none of the hot table's bookkeeping columns.
+    """
+
+    __tablename__ = "free_trial_archive"
+
+    device_hash = Column(LargeBinary(16), primary_key=True)
+    uses_count = Column(Integer, nullable=False)
@@ -1,8 +1,7 @@
 """FreeTrialTracking Model — Track free trial usage per device."""
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, DateTime, Uuid
 
 from app.core.database import Base
 
@@ -10,7 +9,7 @@ from app.core.database import Base
 class FreeTrialTracking(Base):
     __tablename__ = "free_trial_tracking"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     device_id = Column(String(255), unique=True, nullable=False, index=True)
     uses_count = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
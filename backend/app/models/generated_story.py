@@ -0,0 +1,35 @@
+"""GeneratedStory Model — Every generated story, for full-text search."""
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, String, Integer, Text, DateTime, Index, text
+
+from app.core.database import Base
+
+
+class GeneratedStory(Base):
+    __tablename__ = "generated_stories"
+
+    # Expression the GIN index is built on; queries must use it verbatim.
+    # Rows stored before search_text existed fall back to the raw text.
+    SEARCH_VECTOR = "to_tsvector('simple', coalesce(search_text, title || ' ' || coalesce(summary, '')))"
+
+    # Monotonic id doubles as the keyset pagination cursor.
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    year = Column(Integer, nullable=False)
+    lang = Column(String(5), nullable=False)
+    story_id = Column(Integer, nullable=False)
+    title = Column(Text, nullable=False)
+    url = Column(Text, nullable=False, default="")
+    summary = Column(Text)
+    # Title and summary with CJK runs split into bigrams (see search.cjk_bigrams).
+    search_text = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_generated_stories_year_lang_id", "year", "lang", "id"),
+        Index("ix_generated_stories_year_lang_title", "year", "lang", "title"),
+        Index(
+            "ix_generated_stories_search_text",
+            text(SEARCH_VECTOR),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
@@ -0,0 +1,25 @@
+"""IdempotencyKey Model — Claimed Idempotency-Keys and their stored outcomes."""
+from datetime import datetime
+from sqlalchemy import JSON, Column, String, Integer, DateTime
+
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # "<scope>:<Idempotency-Key>"
+    key = Column(String(300), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    # running -> done | failed
+    status = Column(String(20), nullable=False, default="running")
+    # 200 with the response body in result, or a 4xx with {"detail": ...}
+    status_code = Column(Integer)
+    result = Column(JSON)
+    # Credits debited under this key, committed together with the debit.
+    credits_charged = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=1)
+    # A running key whose lease has passed belongs to a dead worker and is run again.
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
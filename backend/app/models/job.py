@@ -0,0 +1,36 @@
+"""GenerationJob Model — Queued story generations and their stored results."""
+import uuid
+from datetime import datetime
+from sqlalchemy import JSON, Boolean, Column, String, Integer, Text, DateTime, Index, Uuid
+
+from app.core.database import Base
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    # queued -> running -> done | failed
+    status = Column(String(20), nullable=False, default="queued")
+    year = Column(Integer, nullable=False)
+    lang = Column(String(5), nullable=False)
+    paid = Column(Boolean, nullable=False, default=False)
+    device_id = Column(String(255))
+    # Who was charged, as request_payer names it; a failed job is refunded to them.
+    payer = Column(String(300))
+    result = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    # A running job whose lease has passed belongs to a dead worker and is retried.
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_generation_jobs_status_created_at", "status", "created_at"),
+    )
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
@@ -0,0 +1,19 @@
+"""StoredPage Model — Pages callers can come back to by page_id."""
+from datetime import datetime
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Integer, String
+
+from app.core.database import Base
+
+
+class StoredPage(Base):
+    __tablename__ = "story_pages"
+
+    page_id = Column(String(32), primary_key=True)
+    year = Column(Integer, nullable=False)
+    lang = Column(String(8), nullable=False)
+    stories = Column(JSON, nullable=False)
+    seed = Column(BigInteger, nullable=True)
+    prompt_variant = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Pushed back whenever the page is re-rolled.
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,8 +1,7 @@
 """PaymentTransaction Model — Records all payment events."""
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Uuid
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -11,8 +10,8 @@ from app.core.database import Base
 class PaymentTransaction(Base):
     __tablename__ = "payment_transactions"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    token_id = Column(UUID(as_uuid=True), ForeignKey("generation_tokens.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    token_id = Column(Uuid, ForeignKey("generation_tokens.id"), nullable=False, index=True)
     product_sku = Column(String(50), nullable=False)
     provider = Column(String(20), nullable=False, default="creem")
     provider_transaction_id = Column(String(255), unique=True)
@@ -0,0 +1,15 @@
+"""RerollAllowance Model — Re-rolls a payer has paid for but not used yet."""
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime
+
+from app.core.database import Base
+
+
+class RerollAllowance(Base):
+    __tablename__ = "reroll_allowances"
+
+    # "token:<token>", "wallet:<device_id>" or "trial:<device_id>"
+    payer = Column(String(300), primary_key=True)
+    # A generation buys REROLL_STORIES_PER_CREDIT re-rolls; the rest of it is kept here.
+    stories = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
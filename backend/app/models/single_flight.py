@@ -0,0 +1,15 @@
+"""SingleFlightResult Model — Results of deduplicated work, for waiting replicas."""
+from datetime import datetime
+from sqlalchemy import JSON, Column, String, DateTime
+
+from app.core.database import Base
+
+
+class SingleFlightResult(Base):
+    __tablename__ = "single_flight_results"
+
+    # SHA-256 of the work's key (see single_flight.result_key).
+    key = Column(String(255), primary_key=True)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
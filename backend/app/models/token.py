@@ -1,8 +1,7 @@
 """GenerationToken Model — Token-based usage tracking."""
 import uuid
 from datetime import datetime, timedelta
-from sqlalchemy import Column, String, Integer, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, DateTime, Index, Uuid, text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -11,18 +10,33 @@ from app.core.database import Base
 class GenerationToken(Base):
     __tablename__ = "generation_tokens"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     token = Column(String(255), unique=True, nullable=False, index=True)
     product_sku = Column(String(50), nullable=False)
     total_generations = Column(Integer, nullable=False)
     remaining_generations = Column(Integer, nullable=False)
     expires_at = Column(DateTime, nullable=False, index=True)
-    device_id = Column(String(255), index=True)
+    device_id = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     transactions = relationship("PaymentTransaction", back_populates="token")
 
+    __table_args__ = (
+        # Every per-device query (by-device, wallet, wallet debit) asks for the
+        # live tokens of one device, the debit in expires_at order. Spent tokens
+        # are left out of the index, and including the balance makes the
+        # wallet sum an index-only scan.
+        Index(
+            "ix_generation_tokens_device_live",
+            "device_id",
+            "expires_at",
+            postgresql_where=text("remaining_generations > 0"),
+            postgresql_include=["remaining_generations"],
+            sqlite_where=text("remaining_generations > 0"),
+        ),
+    )
+
     @classmethod
     def create_token(cls, product_sku: str, generations: int, device_id: str = None):
         """Create a new token with 1 year validity."""
@@ -35,10 +49,10 @@ class GenerationToken(Base):
             device_id=device_id,
         )
 
-    def use_generation(self) -> bool:
-        """Consume one generation. Returns True if successful."""
-        if self.remaining_generations > 0 and datetime.utcnow() < self.expires_at:
-            self.remaining_generations -= 1
+    def use_generation(self, count: int = 1) -> bool:
+        """Consume ``count`` generations, all or none. Returns True if successful."""
+        if self.remaining_generations >= count and datetime.utcnow() < self.expires_at:
+            self.remaining_generations -= count
             return True
         return False
 
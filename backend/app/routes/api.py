@@ -1,22 +1,43 @@
 """API routes for Future Hacker News."""
+import asyncio
+import hashlib
 import logging
+import math
+from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Depends, Header, Path, Query, Response
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 
-from app.services.llm import generate_stories, generate_story_details
+from app.services.llm import generate_comment_replies, generate_stories, generate_story_details, reroll_stories
+from app.services.metadata import StoryPage, domain_from_url
+from app.services.corpus import story_corpus
+from app.services.search import index_page, index_summary, search_index
+from app.services.maintenance import restore_trial
+from app.services.scheduler import priority_class
+from app.services.cache_snapshot import RestorableCache
+from app.services.idempotency import charged_credits, idempotent, record_charge
+from app.services.pages import load_page, replace_stories, save_page
+from app.services.single_flight import single_flight
+from app.services.threads import MAX_THREAD_DEPTH, attach_replies, expansions, number_comments
 from app.core.config import settings
 from app.core.database import get_db
-from app.models import GenerationToken, FreeTrialTracking
+from app.core.metrics import record_generation
+from app.models import GenerationToken, FreeTrialTracking, RerollAllowance
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# In-memory cache for generated stories
-_stories_cache: dict[str, list[dict]] = {}
+# In-memory caches for generated stories and story details, snapshotted
+# across restarts (see cache_snapshot).
+_stories_cache: dict[str, list[dict]] = RestorableCache("stories")
+_details_cache: dict[str, dict] = RestorableCache("details", max_entries=settings.DETAILS_CACHE_MAX_ENTRIES)
+
+# Prefetch tasks, referenced until they finish.
+_prefetch_tasks: set[asyncio.Task] = set()
 
 
 class GenerateRequest(BaseModel):
@@ -24,11 +45,51 @@ class GenerateRequest(BaseModel):
     lang: str = Field(default="en", pattern=r"^(en|zh|ja|de|fr|ko|es)$")
     device_id: Optional[str] = None
     token: Optional[str] = None
+    # Pay from any valid token on device_id instead of the free trial
+    use_wallet: bool = False
 
 
 class GenerateResponse(BaseModel):
     year: int
     stories: list[dict]
+    seed: Optional[int] = None
+    # Prompt variant that wrote the page; None for remixed pages.
+    prompt_variant: Optional[str] = None
+    # Where the page is stored, for re-rolls and for opening its stories.
+    page_id: Optional[str] = None
+
+
+class RerollRequest(GenerateRequest):
+    story_ids: list[int] = Field(..., min_length=1, max_length=settings.REROLL_MAX_STORIES)
+    # The page_id /generate returned.
+    page_id: str = Field(..., max_length=64)
+
+    @field_validator("story_ids")
+    @classmethod
+    def _unique(cls, story_ids: list[int]) -> list[int]:
+        if len(set(story_ids)) != len(story_ids):
+            raise ValueError("story_ids must be unique")
+        return story_ids
+
+
+class RerollResponse(GenerateResponse):
+    page_id: str
+    rerolled: list[int]
+    credits_charged: int
+
+
+class SearchResult(BaseModel):
+    year: int
+    lang: str
+    story_id: int
+    title: str
+    url: str
+    summary: Optional[str] = None
+
+
+class SearchResponse(BaseModel):
+    results: list[SearchResult]
+    next_cursor: Optional[str] = None
 
 
 class TrialStatusResponse(BaseModel):
@@ -36,8 +97,8 @@ class TrialStatusResponse(BaseModel):
     uses_remaining: int
 
 
-async def check_and_use_free_trial(device_id: str, db: AsyncSession) -> bool:
-    """Check if device has free trial remaining. If so, consume one use."""
+async def check_and_use_free_trial(device_id: str, db: AsyncSession, credits: int = 1) -> bool:
+    """Check if device has ``credits`` free trial uses left. If so, consume them."""
     if not device_id:
         return False
 
@@ -45,22 +106,26 @@ async def check_and_use_free_trial(device_id: str, db: AsyncSession) -> bool:
         select(FreeTrialTracking).where(FreeTrialTracking.device_id == device_id)
     )
     tracking = result.scalar_one_or_none()
+    if tracking is None:
+        tracking = await restore_trial(device_id, db)
 
     if tracking is None:
-        tracking = FreeTrialTracking(device_id=device_id, uses_count=1)
+        if credits > settings.FREE_TRIAL_LIMIT:
+            return False
+        tracking = FreeTrialTracking(device_id=device_id, uses_count=credits)
         db.add(tracking)
         await db.commit()
         return True
-    elif tracking.uses_count < settings.FREE_TRIAL_LIMIT:
-        tracking.uses_count += 1
+    elif tracking.uses_count + credits <= settings.FREE_TRIAL_LIMIT:
+        tracking.uses_count += credits
         await db.commit()
         return True
     else:
         return False
 
 
-async def check_and_use_token(token_str: str, db: AsyncSession) -> bool:
-    """Validate token and consume one generation."""
+async def check_and_use_token(token_str: str, db: AsyncSession, credits: int = 1) -> bool:
+    """Validate token and consume ``credits`` generations."""
     if not token_str:
         return False
 
@@ -69,12 +134,52 @@ async def check_and_use_token(token_str: str, db: AsyncSession) -> bool:
     )
     token_obj = result.scalar_one_or_none()
 
-    if token_obj and token_obj.use_generation():
+    if token_obj and token_obj.use_generation(credits):
         await db.commit()
         return True
     return False
 
 
+async def check_and_use_wallet(device_id: str, db: AsyncSession, credits: int = 1) -> bool:
+    """Consume ``credits`` generations from the device's earliest-expiring token that has them.
+
+    Picking the token and decrementing it is a single UPDATE, so a paid
+    generation costs one round trip. A concurrent debit of the same token
+    waits for the row lock, then the pick is re-checked against the
+    committed balance, so credits are neither spent twice nor refused
+    while some remain. A charge is never split across tokens.
+    """
+    if not device_id:
+        return False
+
+    now = datetime.utcnow()
+    pick = (
+        select(GenerationToken.id)
+        .where(
+            GenerationToken.device_id == device_id,
+            # Spelled out so the planner can use the partial live-token index.
+            GenerationToken.remaining_generations > 0,
+            GenerationToken.remaining_generations >= credits,
+            GenerationToken.expires_at > now,
+        )
+        .order_by(GenerationToken.expires_at)
+        .limit(1)
+        .with_for_update()
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(GenerationToken)
+        .where(GenerationToken.id == pick)
+        .values(remaining_generations=GenerationToken.remaining_generations - credits, updated_at=now)
+        .returning(GenerationToken.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar_one_or_none() is None:
+        return False
+    await db.commit()
+    return True
+
+
 @router.get("/trial-status/{device_id}", response_model=TrialStatusResponse)
 async def get_trial_status(device_id: str, db: AsyncSession = Depends(get_db)):
     """Check free trial status for a device."""
@@ -82,6 +187,10 @@ async def get_trial_status(device_id: str, db: AsyncSession = Depends(get_db)):
         select(FreeTrialTracking).where(FreeTrialTracking.device_id == device_id)
     )
     tracking = result.scalar_one_or_none()
+    if tracking is None:
+        tracking = await restore_trial(device_id, db)
+        if tracking is not None:
+            await db.commit()
 
     if tracking is None:
         return TrialStatusResponse(has_free_trial=True, uses_remaining=settings.FREE_TRIAL_LIMIT)
@@ -90,19 +199,50 @@ async def get_trial_status(device_id: str, db: AsyncSession = Depends(get_db)):
         return TrialStatusResponse(has_free_trial=remaining > 0, uses_remaining=remaining)
 
 
-@router.post("/generate", response_model=GenerateResponse)
-async def generate(request: GenerateRequest, db: AsyncSession = Depends(get_db)):
-    """Generate 30 future HN stories for a given year."""
+async def caller_priority(token_str: Optional[str], db: AsyncSession) -> str:
+    """Priority class of a read-only request: "paid" for a live, unspent token, else "free"."""
+    if not token_str:
+        return "free"
+    live = await db.scalar(
+        select(GenerationToken.id)
+        .where(
+            GenerationToken.token == token_str,
+            GenerationToken.remaining_generations > 0,
+            GenerationToken.expires_at > datetime.utcnow(),
+        )
+        .limit(1)
+    )
+    return "paid" if live is not None else "free"
+
+
+async def debit_generation(request: GenerateRequest, db: AsyncSession, credits: int = 1) -> bool:
+    """Charge ``credits`` to a token, the device wallet or the free trial.
+
+    Returns True for paid generations; raises 402/400 when nothing can pay.
+    Only a successful debit commits the session. Under an Idempotency-Key
+    the credits are recorded on the key in the same commit, and a retry of
+    a run that already paid is not charged again.
+    """
+    if charged_credits() >= credits:
+        return bool(request.token or request.use_wallet)
+    await record_charge(db, credits)
     # 1. Try paid token first
     if request.token:
-        if not await check_and_use_token(request.token, db):
+        if not await check_and_use_token(request.token, db, credits):
             raise HTTPException(
                 status_code=402,
                 detail="Token is invalid, expired, or has no remaining generations"
             )
-    # 2. Try free trial
+    # 2. Try the device wallet
+    elif request.device_id and request.use_wallet:
+        if not await check_and_use_wallet(request.device_id, db, credits):
+            raise HTTPException(
+                status_code=402,
+                detail="No valid token with remaining generations on this device"
+            )
+    # 3. Try free trial
     elif request.device_id:
-        if not await check_and_use_free_trial(request.device_id, db):
+        if not await check_and_use_free_trial(request.device_id, db, credits):
             raise HTTPException(
                 status_code=402,
                 detail="Free trial exhausted. Please purchase credits to continue."
@@ -112,28 +252,503 @@ async def generate(request: GenerateRequest, db: AsyncSession = Depends(get_db))
             status_code=400,
             detail="Either device_id (for free trial) or token (for paid use) is required"
         )
+    return bool(request.token or request.use_wallet)
+
 
-    cache_key = f"{request.year}_{request.lang}"
-    stories = await generate_stories(request.year, request.lang)
+async def produce_stories(year: int, lang: str, paid: bool) -> list[dict]:
+    """Generate (or remix) a page, then record it in the corpus, index and cache.
+
+    LLM calls run in the paid or free priority class.
+    """
+    cache_key = f"{year}_{lang}"
+    stories = None
+    # Free-trial pages are remixed from the corpus once it is big enough.
+    if not paid and settings.CORPUS_REMIX_FREE_TRIAL and (
+        story_corpus.size(year, lang) >= settings.CORPUS_REMIX_MIN_STORIES
+    ):
+        stories = story_corpus.remix(year, lang)
+
+    if stories is not None:
+        record_generation("remix")
+    else:
+        try:
+            with priority_class("paid" if paid else "free"):
+                stories = await generate_stories(year, lang)
+        except Exception:
+            # Fall back to a remixed page rather than failing the request.
+            stories = story_corpus.remix(year, lang)
+            if stories is None:
+                raise
+            logger.exception("Story generation failed, serving remixed page")
+            record_generation("remix")
+        else:
+            await story_corpus.add_page(year, lang, stories)
+            await index_page(year, lang, stories)
+            record_generation("paid" if paid else "free")
+            prefetch_details(year, lang, stories[:settings.LLM_DETAILS_PREFETCH])
     _stories_cache[cache_key] = stories
+    return stories
+
+
+@router.post("/generate", response_model=GenerateResponse)
+async def generate(
+    request: GenerateRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+):
+    """Generate 30 future HN stories for a given year.
+
+    The page is stored under the returned ``page_id`` (see app.services.pages).
+    With an Idempotency-Key, retries get the first request's page and are
+    not charged again.
+    """
+
+    async def run():
+        paid = await debit_generation(request, db)
+        stories = await produce_stories(request.year, request.lang, paid)
+        page_id = save_page(db, request.year, request.lang, stories)
+        await db.commit()
+        return GenerateResponse(
+            year=request.year,
+            stories=stories,
+            seed=getattr(stories, "seed", None),
+            prompt_variant=getattr(stories, "prompt_variant", None),
+            page_id=page_id,
+        )
+
+    if not idempotency_key:
+        return await run()
+    return await idempotent("generate", idempotency_key, request, response, db, run)
+
+
+def request_payer(request: GenerateRequest) -> Optional[str]:
+    """Who pays for a request, following debit_generation's order.
+
+    "token:<token>", "wallet:<device_id>" or "trial:<device_id>"; it names
+    re-roll allowances and the payer of queued jobs.
+    """
+    if request.token:
+        return f"token:{request.token}"
+    if request.device_id:
+        return f"{'wallet' if request.use_wallet else 'trial'}:{request.device_id}"
+    return None
+
+
+def payer_request(payer: str, year: int, lang: str) -> GenerateRequest:
+    """A request paid for by ``payer``, as ``request_payer`` named it."""
+    kind, _, who = payer.partition(":")
+    if kind == "token":
+        return GenerateRequest(year=year, lang=lang, token=who)
+    return GenerateRequest(year=year, lang=lang, device_id=who, use_wallet=kind == "wallet")
+
+
+async def debit_reroll(request: RerollRequest, db: AsyncSession, count: int) -> tuple[bool, int]:
+    """Charge re-rolling ``count`` stories; returns (paid, generations debited).
+
+    Re-rolls come out of the payer's allowance first. Only the shortfall is
+    debited, in whole generations of REROLL_STORIES_PER_CREDIT re-rolls,
+    and the re-rolls they buy beyond ``count`` are banked in the same commit.
+    """
+    paid = bool(request.token or request.use_wallet)
+    if charged_credits():
+        # A retry of a run that already paid, and banked, under this key.
+        return paid, charged_credits()
+    payer = request_payer(request)
+    if payer is None:
+        # Raises the same 400 as /generate.
+        await debit_generation(request, db)
+    unit = max(1, settings.REROLL_STORIES_PER_CREDIT)
+    while True:
+        banked = await db.scalar(select(RerollAllowance.stories).where(RerollAllowance.payer == payer))
+        credits = max(0, math.ceil((count - (banked or 0)) / unit))
+        left = (banked or 0) + credits * unit - count
+        if banked is None:
+            db.add(RerollAllowance(payer=payer, stories=left))
+        else:
+            # Only if no other re-roll has spent from the allowance since the read.
+            result = await db.execute(
+                update(RerollAllowance)
+                .where(RerollAllowance.payer == payer, RerollAllowance.stories == banked)
+                .values(stories=left, updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                continue
+        if credits == 0:
+            await db.commit()
+            return paid, 0
+        try:
+            return await debit_generation(request, db, credits), credits
+        except HTTPException:
+            await db.rollback()
+            raise
+        except IntegrityError:
+            # Another re-roll created the allowance first.
+            await db.rollback()
+
+
+async def return_generations(request: GenerateRequest, db: AsyncSession, credits: int) -> bool:
+    """Give ``credits`` generations back to the token, wallet or free trial that paid."""
+    now = datetime.utcnow()
+    if request.token:
+        stmt = (
+            update(GenerationToken)
+            .where(GenerationToken.token == request.token)
+            .values(remaining_generations=GenerationToken.remaining_generations + credits, updated_at=now)
+        )
+    elif request.use_wallet:
+        # Any live token of the device with room for them, drained ones
+        # included: the debit may have taken a token's last generation.
+        pick = (
+            select(GenerationToken.id)
+            .where(
+                GenerationToken.device_id == request.device_id,
+                GenerationToken.remaining_generations + credits <= GenerationToken.total_generations,
+                GenerationToken.expires_at > now,
+            )
+            .order_by(GenerationToken.expires_at)
+            .limit(1)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(GenerationToken)
+            .where(GenerationToken.id == pick)
+            .values(remaining_generations=GenerationToken.remaining_generations + credits, updated_at=now)
+        )
+    else:
+        stmt = (
+            update(FreeTrialTracking)
+            .where(FreeTrialTracking.device_id == request.device_id, FreeTrialTracking.uses_count >= credits)
+            .values(uses_count=FreeTrialTracking.uses_count - credits, updated_at=now)
+        )
+    result = await db.execute(stmt.execution_options(synchronize_session=False))
+    return result.rowcount == 1
+
+
+async def refund_reroll(request: RerollRequest, db: AsyncSession, count: int, credits: int) -> int:
+    """Give back ``count`` re-rolls that were paid for but not delivered.
+
+    They go back into the payer's allowance, and whole generations of it,
+    up to the ``credits`` the request debited, are returned to where they
+    came from. Returns the generations returned. Best effort: if the
+    database fails, the charge stands, and a retry under the same
+    Idempotency-Key is not charged again.
+    """
+    unit = max(1, settings.REROLL_STORIES_PER_CREDIT)
+    payer = request_payer(request)
+    try:
+        banked = (await db.execute(
+            update(RerollAllowance)
+            .where(RerollAllowance.payer == payer)
+            .values(stories=RerollAllowance.stories + count, updated_at=datetime.utcnow())
+            .returning(RerollAllowance.stories)
+            .execution_options(synchronize_session=False)
+        )).scalar_one()
+        refund = min(credits, banked // unit)
+        if refund and await return_generations(request, db, refund):
+            await db.execute(
+                update(RerollAllowance)
+                .where(RerollAllowance.payer == payer)
+                .values(stories=RerollAllowance.stories - refund * unit)
+                .execution_options(synchronize_session=False)
+            )
+            await record_charge(db, -refund)
+        else:
+            # Less than a generation, or nowhere to put it (the wallet's live
+            # tokens are full); the re-rolls stay banked.
+            refund = 0
+        await db.commit()
+        return refund
+    except Exception:
+        logger.exception("Could not refund %d re-rolls to %s", count, payer)
+        await db.rollback()
+        return 0
+
+
+@router.post("/reroll", response_model=RerollResponse)
+async def reroll(
+    request: RerollRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+):
+    """Replace the chosen stories on a stored page, keeping the rest.
+
+    ``page_id`` is the one /generate returned; the page is edited in place,
+    so the details and replies endpoints open the new stories under the
+    same id, on any replica. Only the replacements are generated; new
+    stories keep their slot's id and metadata. The caller pays for the
+    stories actually replaced (see ``debit_reroll``): an LLM failure or a
+    short answer gives the rest back (``refund_reroll``).
+
+    No details are invalidated: they are cached by title, so a new story
+    gets its own entry, and the replaced stories' entries still serve the
+    other pages that show them.
+    """
+
+    async def run():
+        page = await load_page(db, request.year, request.lang, request.page_id)
+        if not page:
+            raise HTTPException(status_code=404, detail="No page to re-roll; generate one first")
+        old = {story["id"]: story for story in page if story.get("id") in request.story_ids}
+        unknown = [i for i in request.story_ids if i not in old]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Stories not on this page: {unknown}")
+
+        count = len(request.story_ids)
+        paid, credits = await debit_reroll(request, db, count)
+        replace = [old[i]["title"] for i in request.story_ids]
+        keep = [story.get("title", "") for story in page if story.get("id") not in old]
+        try:
+            with priority_class("paid" if paid else "free"):
+                new = await reroll_stories(request.year, request.lang, keep, replace)
+        except Exception:
+            await refund_reroll(request, db, count, credits)
+            raise
+        record_generation("reroll")
+
+        # Splice into the page as it is now, skipping slots another request
+        # has changed in the meantime; the row lock queues concurrent splices.
+        current = await load_page(db, request.year, request.lang, request.page_id, for_update=True)
+        if current is None:
+            await db.rollback()
+            await refund_reroll(request, db, count, credits)
+            raise HTTPException(status_code=404, detail="The page expired during the re-roll")
+        replacements = {story_id: fresh for story_id, fresh in zip(request.story_ids, new)}
+        stories, added = [], []
+        for story in current:
+            fresh = replacements.get(story.get("id"))
+            if fresh is None or story.get("title") != old[story["id"]]["title"]:
+                stories.append(story)
+                continue
+            story = {**story, **fresh, "domain": domain_from_url(fresh["url"]) or "example.com"}
+            stories.append(story)
+            added.append(story)
+        stories = StoryPage(
+            stories, seed=getattr(current, "seed", None), prompt_variant=getattr(current, "prompt_variant", None)
+        )
+        await replace_stories(db, request.page_id, stories)
+        await db.commit()
+        if len(added) < count:
+            credits -= await refund_reroll(request, db, count - len(added), credits)
+        if added:
+            await story_corpus.add_page(request.year, request.lang, added)
+            await index_page(request.year, request.lang, added)
+        return RerollResponse(
+            year=request.year,
+            stories=stories,
+            seed=stories.seed,
+            prompt_variant=stories.prompt_variant,
+            page_id=request.page_id,
+            rerolled=[story["id"] for story in added],
+            credits_charged=credits,
+        )
+
+    if not idempotency_key:
+        return await run()
+    return await idempotent("reroll", idempotency_key, request, response, db, run)
+
+
+async def _find_story(
+    story_id: int, year: int, lang: str, db: AsyncSession, page_id: Optional[str] = None
+) -> Optional[dict]:
+    if page_id:
+        page = await load_page(db, year, lang, page_id) or []
+    else:
+        page = _stories_cache.get(f"{year}_{lang}", [])
+    for story in page:
+        if story.get("id") == story_id:
+            return story
+    return None
+
+
+def _details_key(year: int, lang: str, story: dict) -> str:
+    return f"{year}_{lang}_{story.get('title', '')}"
+
+
+async def cached_details(year: int, lang: str, story: dict) -> dict:
+    """The story's details from the cache, generating them on a miss."""
+    details_key = _details_key(year, lang, story)
+    details = _details_cache.get(details_key)
+    if details is None:
+
+        async def generate_details():
+            details = await generate_story_details(story)
+            if isinstance(details.get("comments"), list):
+                number_comments(details["comments"])
+            if isinstance(details.get("summary"), str):
+                await index_summary(year, lang, story, details["summary"])
+            return details
+
+        # A viral story is generated once, however many replicas it is asked on.
+        details = await single_flight.run(f"details:{details_key}", generate_details)
+        _details_cache[details_key] = details
+    return details
 
-    return GenerateResponse(year=request.year, stories=stories)
+
+async def _prefetch(year: int, lang: str, stories: list[dict]):
+    for story in stories:
+        try:
+            await cached_details(year, lang, story)
+        except Exception:
+            logger.warning("Details prefetch failed for %r", story.get("title"), exc_info=True)
+
+
+def prefetch_details(year: int, lang: str, stories: list[dict]):
+    """Generate details for ``stories`` in the background priority class."""
+    if not stories:
+        return
+    with priority_class("background"):
+        task = asyncio.create_task(_prefetch(year, lang, list(stories)))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
 
 
 @router.get("/story/{story_id}/details")
-async def get_story_details(story_id: int, year: int = 2035, lang: str = "en"):
-    """Get detailed summary and comments for a story."""
-    cache_key = f"{year}_{lang}"
-    stories = _stories_cache.get(cache_key, [])
+async def get_story_details(
+    story_id: int,
+    year: int = 2035,
+    lang: str = "en",
+    token: Optional[str] = Header(None, alias="X-Generation-Token", max_length=255),
+    page_id: Optional[str] = Query(None, max_length=64),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get the summary and top comments for a story.
 
-    story = None
-    for s in stories:
-        if s.get("id") == story_id:
-            story = s
-            break
+    Comments carry path ids; their reply threads are generated on demand by
+    the replies endpoint. A paid token in ``X-Generation-Token`` puts
+    generation in the paid priority class. ``page_id`` looks the story up
+    on a stored page instead of the latest one.
+    """
+    story = await _find_story(story_id, year, lang, db, page_id)
 
-    if not story:
-        story = {"id": story_id, "title": f"Future Story #{story_id}", "url": "https://example.com"}
+    with priority_class(await caller_priority(token, db)):
+        if not story:
+            story = {"id": story_id, "title": f"Future Story #{story_id}", "url": "https://example.com"}
+            details = await generate_story_details(story)
+            if isinstance(details.get("comments"), list):
+                number_comments(details["comments"])
+            return {"story_id": story_id, **details}
 
-    details = await generate_story_details(story)
+        details = await cached_details(year, lang, story)
     return {"story_id": story_id, **details}
+
+
+def _replies_key(details_key: str, details: dict, comment_id: str, batch: int) -> str:
+    # The summary pins the key to this generation of the details, so a
+    # regenerated story does not pick up replies written for the old one.
+    version = hashlib.blake2b(str(details.get("summary", "")).encode("utf-8"), digest_size=6).hexdigest()
+    return f"replies:{details_key}@{version}#{comment_id}/{batch}"
+
+
+async def _shared_details(details_key: str) -> Optional[dict]:
+    """Cached details, or the ones another replica stored in the single-flight store."""
+    details = _details_cache.get(details_key)
+    if details is None:
+        details = await single_flight.stored(f"details:{details_key}")
+        if details is not None:
+            _details_cache[details_key] = details
+    return details
+
+
+async def _shared_thread(details_key: str, details: dict, comment_id: str) -> Optional[list[dict]]:
+    """Like ``find_thread``, attaching reply batches stored by other replicas on the way down."""
+    thread = []
+    level = details.get("comments") or []
+    for part in comment_id.split("."):
+        index = int(part) - 1
+        parent = thread[-1] if thread else None
+        while parent is not None and index >= len(level) and expansions(parent) < settings.LLM_REPLIES_MAX_EXPANDS:
+            batch = expansions(parent) + 1
+            replies = await single_flight.stored(_replies_key(details_key, details, parent["id"], batch))
+            if replies is None:
+                break
+            if expansions(parent) < batch:
+                attach_replies(parent, replies)
+            level = parent["replies"]
+        if not isinstance(level, list) or not 0 <= index < len(level):
+            return None
+        thread.append(level[index])
+        level = level[index].get("replies") or []
+    return thread
+
+
+@router.get("/story/{story_id}/comments/{comment_id}/replies")
+async def get_comment_replies(
+    story_id: int,
+    comment_id: str = Path(..., pattern=r"^[1-9]\d{0,2}(\.[1-9]\d{0,2})*$"),
+    year: int = 2035,
+    lang: str = "en",
+    more: bool = False,
+    token: Optional[str] = Header(None, alias="X-Generation-Token", max_length=255),
+    page_id: Optional[str] = Query(None, max_length=64),
+    db: AsyncSession = Depends(get_db),
+):
+    """Expand the reply thread under one comment, generating it on first open.
+
+    The replies are stored in the story's cached details, so reopening a
+    thread, or expanding a reply further down, reuses what was generated.
+    ``more`` adds another batch of replies, up to LLM_REPLIES_MAX_EXPANDS
+    batches per comment; ``has_more`` says whether one can still be added.
+    Every batch also goes through the single-flight result store, so with
+    SINGLE_FLIGHT_BACKEND=postgres any replica can continue a thread that
+    another one started. Generation runs in the caller's priority class,
+    and ``page_id`` selects a stored page, as for details.
+    """
+    story = await _find_story(story_id, year, lang, db, page_id)
+    details_key = _details_key(year, lang, story) if story else None
+    details = await _shared_details(details_key) if details_key else None
+    if details is None:
+        raise HTTPException(status_code=404, detail="Story details have not been generated")
+
+    thread = await _shared_thread(details_key, details, comment_id)
+    if thread is None:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    comment = thread[-1]
+
+    if len(thread) >= MAX_THREAD_DEPTH:
+        if not isinstance(comment.get("replies"), list):
+            attach_replies(comment, [])
+        limit = expansions(comment)
+    else:
+        limit = settings.LLM_REPLIES_MAX_EXPANDS
+        done = expansions(comment)
+        batch = done + 1 if (more or not done) else done
+        if done < batch <= limit:
+            # A double click, or the same thread opened on another replica, costs one completion.
+            with priority_class(await caller_priority(token, db)):
+                replies = await single_flight.run(
+                    _replies_key(details_key, details, comment_id, batch),
+                    lambda: generate_comment_replies(
+                        story, details.get("summary", ""), thread, settings.LLM_REPLIES_PER_EXPAND
+                    ),
+                )
+            if expansions(comment) < batch:
+                attach_replies(comment, replies)
+
+    return {
+        "story_id": story_id,
+        "comment_id": comment_id,
+        "replies": comment["replies"],
+        "has_more": expansions(comment) < limit,
+    }
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_stories(
+    q: str = Query(..., min_length=1, max_length=200),
+    year: Optional[int] = Query(None, ge=2030, le=2040),
+    lang: Optional[str] = Query(None, pattern=r"^(en|zh|ja|de|fr|ko|es)$"),
+    cursor: Optional[str] = Query(None, pattern=r"^\d+$"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Search every generated story title and summary, newest first."""
+    hits, next_cursor = await search_index.search(
+        q, year=year, lang=lang, cursor=int(cursor) if cursor else None, limit=limit
+    )
+    return SearchResponse(
+        results=[SearchResult(**hit.to_dict()) for hit in hits],
+        next_cursor=str(next_cursor) if next_cursor is not None else None,
+    )
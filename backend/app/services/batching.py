@@ -0,0 +1,96 @@
+"""Micro-batching of concurrent LLM requests."""
+import asyncio
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect items submitted within a short window and process them together.
+
+    ``run_batch`` receives the list of items and returns a dict mapping each
+    item's index to its result; it may leave some indexes out. Those items,
+    or every item if the batch call raises, are retried one at a time with
+    ``run_single``. A window holding a single item skips the batch call.
+
+    The window only applies while earlier work is still running: an item
+    submitted when nothing is in flight is sent on the next loop iteration,
+    together with whatever was submitted in the same iteration.
+
+    Work never runs in the context of whichever caller happened to trigger
+    the flush. Retried items run in their own submitter's context; the batch
+    call runs in ``batch_context(contexts)`` if given, else an empty context.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list], Awaitable[dict[int, Any]]],
+        run_single: Callable[[Any], Awaitable[Any]],
+        max_size: int = 5,
+        window: float = 0.02,
+        on_batch: Callable[[int, int], None] | None = None,
+        batch_context: Callable[[list[contextvars.Context]], contextvars.Context] | None = None,
+    ):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.max_size = max_size
+        self.window = window
+        self.on_batch = on_batch
+        self.batch_context = batch_context
+        self._pending: list[tuple[Any, asyncio.Future, contextvars.Context]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        # Strong references: the loop only keeps weak ones to running tasks.
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, contextvars.copy_context()))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif len(self._pending) == 1:
+            delay = self.window if self._tasks else 0
+            self._timer = loop.call_later(delay, self._flush, context=contextvars.Context())
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch), context=contextvars.Context())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future, contextvars.Context]]):
+        items = [item for item, _, _ in batch]
+        results: dict[int, Any] = {}
+        if len(items) > 1:
+            context = self.batch_context([ctx for _, _, ctx in batch]) if self.batch_context else contextvars.Context()
+            try:
+                results = await asyncio.get_running_loop().create_task(self.run_batch(items), context=context)
+            except Exception as e:
+                logger.warning("Batch of %d failed, retrying individually: %s", len(items), e)
+
+        missing = [i for i in range(len(items)) if i not in results]
+        if self.on_batch is not None:
+            self.on_batch(len(items), len(missing) if len(items) > 1 else 0)
+
+        loop = asyncio.get_running_loop()
+        retried = await asyncio.gather(
+            *(loop.create_task(self.run_single(items[i]), context=batch[i][2]) for i in missing),
+            return_exceptions=True,
+        )
+        results.update(zip(missing, retried))
+
+        for i, (_, future, _) in enumerate(batch):
+            if future.done():
+                continue
+            if isinstance(results[i], BaseException):
+                future.set_exception(results[i])
+            else:
+                future.set_result(results[i])
@@ -0,0 +1,252 @@
+"""Snapshot of the in-memory caches, kept across restarts.
+
+On shutdown the caches are written to CACHE_SNAPSHOT_PATH as an
+append-only sequence of records:
+
+    magic | record | record | ...
+    record = body_len:u32 | crc32(body):u32 | key_len:u16 | body
+    body   = "cache\\0key" (utf-8) | zlib(json(value))
+
+A StoryPage is stored as {"__page__": stories, "seed": ..., "prompt_variant": ...}
+so its seed and prompt variant survive the restart.
+
+The file is written to a temporary name and then atomically renamed over
+the old one.
+
+On startup the file is memory-mapped. A background thread walks the record
+headers, checks each CRC and builds an index of offsets, without
+decompressing anything. Readiness does not wait for this scan. Values are
+decoded only when a cache misses, so a large snapshot costs little until it
+is used.
+
+Corrupt records are skipped. A file with a bad magic or a torn tail keeps
+whatever came before the damage. Records that were never read are copied
+byte for byte into the next snapshot.
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Optional
+
+from app.services.metadata import StoryPage
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FHNSNAP1"
+_HEADER = struct.Struct(">IIH")
+_SEP = "\x00"
+_PAGE = "__page__"
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, StoryPage):
+        return {_PAGE: list(value), "seed": value.seed, "prompt_variant": value.prompt_variant}
+    return value
+
+
+def _from_json(value: Any) -> Any:
+    if isinstance(value, dict) and _PAGE in value:
+        return StoryPage(value[_PAGE], seed=value.get("seed"), prompt_variant=value.get("prompt_variant"))
+    return value
+
+
+def encode_record(cache: str, key: str, value: Any) -> bytes:
+    key_bytes = f"{cache}{_SEP}{key}".encode("utf-8")
+    body = key_bytes + zlib.compress(json.dumps(_to_json(value), separators=(",", ":")).encode("utf-8"))
+    return _HEADER.pack(len(body), zlib.crc32(body), len(key_bytes)) + body
+
+
+class SnapshotReader:
+    """Memory-mapped snapshot with a lazily built offset index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # (cache, key) -> (record start, payload start, record end)
+        self._index: dict[tuple[str, str], tuple[int, int, int]] = {}
+        self.loaded = False
+
+    def scan(self):
+        """Index every intact record; runs in a worker thread."""
+        data = self._map
+        index = {}
+        if data[:len(MAGIC)] != MAGIC:
+            if len(data):
+                logger.warning("Cache snapshot %s has no valid header; ignoring it", self.path)
+            self._index, self.loaded = index, True
+            return
+        pos, skipped = len(MAGIC), 0
+        while pos + _HEADER.size <= len(data):
+            body_len, crc, key_len = _HEADER.unpack_from(data, pos)
+            record, start, end = pos, pos + _HEADER.size, pos + _HEADER.size + body_len
+            if end > len(data) or key_len > body_len:
+                logger.warning("Cache snapshot %s is truncated at byte %d", self.path, pos)
+                break
+            pos = end
+            if zlib.crc32(data[start:end]) != crc:
+                skipped += 1
+                continue
+            try:
+                cache, _, key = bytes(data[start:start + key_len]).decode("utf-8").partition(_SEP)
+            except UnicodeDecodeError:
+                skipped += 1
+                continue
+            index[(cache, key)] = (record, start + key_len, end)
+        if skipped:
+            logger.warning("Skipped %d corrupt records in cache snapshot %s", skipped, self.path)
+        self._index, self.loaded = index, True
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, cache: str, key: str) -> Optional[Any]:
+        span = self._index.get((cache, key))
+        if span is None:
+            return None
+        try:
+            return _from_json(json.loads(zlib.decompress(self._map[span[1]:span[2]])))
+        except (zlib.error, ValueError):
+            logger.warning("Undecodable record %s/%s in cache snapshot", cache, key)
+            self._index.pop((cache, key), None)
+            return None
+
+    def keys(self, cache: str) -> list[str]:
+        return [key for name, key in list(self._index) if name == cache]
+
+    def raw_records(self, exclude: set[tuple[str, str]]):
+        """Undecoded records not in ``exclude``, ready to append to a new snapshot."""
+        for cache_key, (start, _, end) in list(self._index.items()):
+            if cache_key not in exclude:
+                yield cache_key, bytes(self._map[start:end])
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+class SnapshotStore:
+    """Holds the snapshot loaded at startup for RestorableCache lookups."""
+
+    def __init__(self):
+        self.reader: Optional[SnapshotReader] = None
+
+    def get(self, cache: str, key: str) -> Optional[Any]:
+        if self.reader is None or not self.reader.loaded:
+            return None
+        return self.reader.get(cache, key)
+
+    def keys(self, cache: str) -> list[str]:
+        if self.reader is None or not self.reader.loaded:
+            return []
+        return self.reader.keys(cache)
+
+    async def load(self, path: str):
+        if not path or not os.path.exists(path):
+            return
+        try:
+            reader = SnapshotReader(path)
+            await asyncio.to_thread(reader.scan)
+        except (OSError, ValueError):
+            logger.exception("Could not load cache snapshot %s", path)
+            return
+        self.reader = reader
+        logger.info("Cache snapshot %s: %d records indexed", path, len(reader))
+
+    def save(self, path: str, caches: dict[str, dict]):
+        """Write ``caches`` plus any still-unread snapshot records to ``path``.
+
+        Carried-over records count against a cache's ``max_entries``.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        written = set()
+        count = 0
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            for name, cache in caches.items():
+                for key, value in list(cache.items()):
+                    try:
+                        f.write(encode_record(name, key, value))
+                    except (TypeError, ValueError):
+                        continue
+                    written.add((name, key))
+                    count += 1
+            if self.reader is not None and self.reader.loaded:
+                room = {
+                    name: max(0, cache.max_entries - len(cache))
+                    for name, cache in caches.items()
+                    if getattr(cache, "max_entries", None) is not None
+                }
+                for (name, _), record in self.reader.raw_records(written):
+                    if name in room:
+                        if room[name] <= 0:
+                            continue
+                        room[name] -= 1
+                    f.write(record)
+                    count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        logger.info("Cache snapshot %s: %d records written", path, count)
+
+
+snapshot_store = SnapshotStore()
+
+
+class RestorableCache(dict):
+    """Dict cache that falls back to the startup snapshot on a miss.
+
+    ``max_entries`` bounds the cache; the least recently used entries are
+    evicted first.
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int] = None, store: SnapshotStore = snapshot_store):
+        super().__init__()
+        self.name = name
+        self.max_entries = max_entries
+        self.store = store
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        # Re-insert so iteration order runs from least to most recently used.
+        super().__delitem__(key)
+        super().__setitem__(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        super().pop(key, None)
+        super().__setitem__(key, value)
+        if self.max_entries is not None:
+            while len(self) > self.max_entries:
+                del self[next(iter(self))]
+
+    def __missing__(self, key):
+        value = self.store.get(self.name, key)
+        if value is None:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def warm(self) -> int:
+        """Decode every snapshot record of this cache now; returns how many were loaded."""
+        loaded = 0
+        for key in self.store.keys(self.name):
+            if not dict.__contains__(self, key) and self.get(key) is not None:
+                loaded += 1
+        return loaded
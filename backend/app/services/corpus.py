@@ -0,0 +1,221 @@
+"""Corpus of generated stories and the remix engine built on it.
+
+Every story the model writes is kept, indexed by (year, lang, topic), with
+near-duplicate titles dropped using MinHash signatures over character
+shingles and LSH banding. ``remix`` assembles a new page by sampling across
+topics and re-synthesizing metadata, so it costs no LLM tokens.
+"""
+import asyncio
+import random
+import re
+import secrets
+import zlib
+from array import array
+from collections import defaultdict
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import record_corpus_eviction
+from app.services.metadata import StoryPage, synthesize_metadata
+
+TOPIC_KEYWORDS = {
+    "ask": ["ask hn"],
+    "show": ["show hn", "launch hn"],
+    "ai": ["ai", "llm", "model", "agent", "neural", "gpt", "inference", "transformer", "agi"],
+    "science": ["fusion", "quantum", "physics", "biology", "space", "mars", "climate", "superconduct",
+                "genome", "telescope", "battery"],
+    "policy": ["law", "act", "eu", "ftc", "ban", "regulat", "court", "congress", "privacy", "antitrust"],
+    "opensource": ["open source", "open-source", "github", "release", "released", "linux", "rust", "python",
+                   "postgres", "kernel"],
+    "startup": ["startup", "raises", "yc", "acquire", "ipo", "funding", "launch", "layoff"],
+}
+DEFAULT_TOPIC = "culture"
+
+SHINGLE_SIZE = 3
+NUM_PERM = 32
+LSH_BANDS = 8
+LSH_ROWS = NUM_PERM // LSH_BANDS
+DUPLICATE_THRESHOLD = 0.8
+
+_MERSENNE = (1 << 61) - 1
+_perm_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_perm_rng.randrange(1, _MERSENNE), _perm_rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)
+]
+
+
+def classify_topic(title: str) -> str:
+    lowered = title.lower()
+    words = set(re.findall(r"[a-z0-9]+", lowered))
+    for topic, keywords in TOPIC_KEYWORDS.items():
+        for keyword in keywords:
+            if (" " in keyword and keyword in lowered) or keyword in words or (
+                len(keyword) > 4 and keyword in lowered
+            ):
+                return topic
+    return DEFAULT_TOPIC
+
+
+def shingles(title: str, size: int = SHINGLE_SIZE) -> set[str]:
+    normalized = " ".join(re.findall(r"\w+", title.lower()))
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash(title: str) -> array:
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(title)]
+    return array("Q", (min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS))
+
+
+def estimate_similarity(sig_a, sig_b) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class MinHashIndex:
+    """LSH index answering "is there already a title like this one?".
+
+    Signatures are stored as arrays of 64-bit ints and buckets are keyed by
+    the hash of a band, which keeps an indexed title to a few hundred bytes.
+    Two bands that merely share a hash are compared like any other
+    candidate, so a collision costs a comparison, not a wrong answer.
+    """
+
+    def __init__(self):
+        # scope -> band hash -> signatures
+        self._buckets: dict = defaultdict(dict)
+
+    def _band_keys(self, signature):
+        for band in range(LSH_BANDS):
+            yield hash((band, *signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]))
+
+    def add_if_new(self, scope, title: str, signature: Optional[array] = None) -> bool:
+        """Index ``title`` under ``scope`` unless a near-duplicate is there already."""
+        if signature is None:
+            signature = minhash(title)
+        buckets = self._buckets[scope]
+        keys = list(self._band_keys(signature))
+        for key in keys:
+            for other in buckets.get(key, ()):
+                if estimate_similarity(signature, other) >= DUPLICATE_THRESHOLD:
+                    return False
+        for key in keys:
+            buckets.setdefault(key, []).append(signature)
+        return True
+
+    def remove(self, scope, signature: array):
+        buckets = self._buckets[scope]
+        for key in self._band_keys(signature):
+            bucket = buckets.get(key)
+            if not bucket:
+                continue
+            for i, other in enumerate(bucket):
+                if other is signature:
+                    del bucket[i]
+                    break
+            if not bucket:
+                del buckets[key]
+
+
+class StoryCorpus:
+    """Generated stories, indexed by (year, lang) and topic.
+
+    Holds at most ``max_per_scope`` stories per (year, lang). Past that, each
+    new story replaces a random one, so the corpus stays a uniform sample of
+    everything generated and memory stays bounded.
+    """
+
+    def __init__(self, max_per_scope: Optional[int] = None, seed: Optional[int] = None):
+        # (year, lang) -> topic -> [(title, url, signature)]
+        self._stories: dict[tuple[int, str], dict[str, list[tuple[str, str, Optional[array]]]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        self._dedupe = MinHashIndex()
+        self.max_per_scope = max_per_scope
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return sum(self.size(year, lang) for year, lang in self._stories)
+
+    def size(self, year: int, lang: str) -> int:
+        topics = self._stories.get((year, lang))
+        return sum(len(items) for items in topics.values()) if topics else 0
+
+    def add(
+        self, year: int, lang: str, title: str, url: str, dedupe: bool = True, signature: Optional[array] = None
+    ) -> bool:
+        title = title.strip()
+        if not title:
+            return False
+        scope = (year, lang)
+        if dedupe:
+            signature = minhash(title) if signature is None else signature
+            if not self._dedupe.add_if_new(scope, title, signature):
+                return False
+        else:
+            signature = None
+        if self.max_per_scope is not None and self.size(year, lang) >= self.max_per_scope:
+            self._evict(scope)
+        self._stories[scope][classify_topic(title)].append((title, url, signature))
+        return True
+
+    def _evict(self, scope):
+        """Drop one story of ``scope``, chosen uniformly at random."""
+        topics = self._stories[scope]
+        names = list(topics)
+        topic = self._rng.choices(names, [len(topics[name]) for name in names])[0]
+        items = topics[topic]
+        index = self._rng.randrange(len(items))
+        items[index], items[-1] = items[-1], items[index]
+        _, _, signature = items.pop()
+        if not items:
+            del topics[topic]
+        if signature is not None:
+            self._dedupe.remove(scope, signature)
+        record_corpus_eviction()
+
+    async def add_page(self, year: int, lang: str, stories: list[dict]) -> int:
+        """Add a generated page; returns how many stories were new.
+
+        Signatures are computed in a worker thread, so hashing a page does
+        not hold up the event loop.
+        """
+        titles = [s.get("title", "").strip() for s in stories]
+        signatures = await asyncio.to_thread(lambda: [minhash(t) if t else None for t in titles])
+        return sum(
+            self.add(year, lang, title, s.get("url", ""), signature=signature)
+            for title, s, signature in zip(titles, stories, signatures)
+        )
+
+    def remix(self, year: int, lang: str, count: int = 30, seed: Optional[int] = None) -> Optional[StoryPage]:
+        """Assemble a page of ``count`` distinct stories, or None if the corpus is too small.
+
+        Topics are drawn in proportion to their share of the corpus, so a
+        remixed page has the same mix as generated ones. Cost is O(count)
+        regardless of corpus size.
+        """
+        topics = self._stories.get((year, lang))
+        if not topics or self.size(year, lang) < count:
+            return None
+
+        if seed is None:
+            seed = secrets.randbits(32)
+        rng = random.Random(seed)
+        names = list(topics)
+        weights = [len(topics[name]) for name in names]
+
+        picked: set[tuple[str, int]] = set()
+        stories = []
+        while len(stories) < count:
+            topic = rng.choices(names, weights)[0]
+            index = rng.randrange(len(topics[topic]))
+            if (topic, index) in picked:
+                continue
+            picked.add((topic, index))
+            title, url, _ = topics[topic][index]
+            stories.append({"id": len(stories) + 1, "title": title, "url": url})
+
+        return StoryPage(synthesize_metadata(stories, seed), seed=seed)
+
+
+story_corpus = StoryCorpus(settings.CORPUS_MAX_STORIES_PER_SCOPE)
@@ -0,0 +1,314 @@
+"""Idempotency-Key handling for endpoints that charge credits or call Creem.
+
+Keys are rows of ``idempotency_keys``, so a retry is deduplicated on
+whichever worker or replica it reaches. The first request with a key
+claims it and runs. A retry with the same key then gets:
+
+- the stored outcome once the run is done, without touching anything else
+  in the database or any upstream service. The stored outcome can be a
+  result or a 4xx error;
+- the same outcome after waiting, while the run is still going. The row
+  is polled every IDEMPOTENCY_POLL_SECONDS for up to
+  IDEMPOTENCY_WAIT_SECONDS, after which the retry gets a 409;
+- a run of its own when the earlier one failed (a 5xx error, an unexpected
+  error or a cancelled request) or its worker died. A run renews its lease
+  every third of IDEMPOTENCY_LEASE_SECONDS, so an expired lease means the
+  worker is gone, however long the LLM takes.
+
+The debit records its credits on the key in the same transaction
+(``record_charge``). A run that fails after paying therefore leaves a paid
+key behind, and the re-run is not charged again (``charged_credits``).
+
+Keys are held for IDEMPOTENCY_TTL_SECONDS. Reusing a key with a different
+request body is rejected with 422. Retries in the same process wait on the
+first run directly instead of polling.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.metrics import record_idempotency
+from app.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request."""
+
+
+@dataclass
+class Claim:
+    key: str
+    attempts: int
+    # Credits charged under the key by earlier attempts.
+    credits: int = 0
+
+
+_claim: ContextVar[Optional[Claim]] = ContextVar("idempotency_claim", default=None)
+
+
+def charged_credits() -> int:
+    """Credits an earlier attempt already paid under the current key (0 outside one)."""
+    claim = _claim.get()
+    return claim.credits if claim is not None else 0
+
+
+async def record_charge(db: AsyncSession, credits: int):
+    """Add ``credits`` to the current key inside ``db``'s open transaction.
+
+    Call it right before the debit, so the debit's commit stores both.
+    Negative ``credits`` record a refund the same way.
+    """
+    claim = _claim.get()
+    if claim is None or not credits:
+        return
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == claim.key)
+        .values(credits_charged=IdempotencyKey.credits_charged + credits)
+    )
+
+
+def _still_running() -> HTTPException:
+    return HTTPException(status_code=409, detail="A request with this Idempotency-Key is still running")
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float, lease: float, wait: float, poll: float, session_factory=async_session):
+        self.ttl = ttl
+        self.lease = lease
+        self.wait = wait
+        self.poll = poll
+        # Lease renewals use their own sessions; the run's session is busy.
+        self.session_factory = session_factory
+        # Keys a request in this process holds; resolved when it lets go.
+        self._running: dict[str, asyncio.Future] = {}
+
+    async def run(
+        self, db: AsyncSession, key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """Run ``call`` once per key; returns (result, replayed)."""
+        deadline = time.monotonic() + self.wait
+        while (local := self._running.get(key)) is not None:
+            # Another request in this process holds the key; its outcome is
+            # in the table once it is done.
+            try:
+                await asyncio.wait_for(asyncio.shield(local), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise _still_running()
+        done = asyncio.get_running_loop().create_future()
+        self._running[key] = done
+        try:
+            return await self._run(db, key, fingerprint, call, deadline)
+        finally:
+            if self._running.get(key) is done:
+                del self._running[key]
+            done.set_result(None)
+
+    async def _run(
+        self, db: AsyncSession, key: str, fingerprint: str, call: Callable[[], Awaitable[Any]], deadline: float
+    ) -> tuple[Any, bool]:
+        while True:
+            row = await self._load(db, key)
+            now = datetime.utcnow()
+            if row is None or row.expires_at <= now:
+                claim = await self._insert(db, key, fingerprint, now, stale=row is not None)
+            elif row.fingerprint != fingerprint:
+                raise IdempotencyConflict(key)
+            elif row.status == "done":
+                if row.status_code >= 400:
+                    raise HTTPException(status_code=row.status_code, detail=(row.result or {}).get("detail"))
+                return row.result, True
+            elif row.status == "running" and row.lease_expires_at > now:
+                # Running on another worker.
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise _still_running()
+                await asyncio.sleep(min(self.poll, remaining))
+                continue
+            else:
+                claim = await self._take_over(db, key, row, now)
+            if claim is not None:
+                return await self._run_claimed(db, claim, call), False
+
+    async def _load(self, db: AsyncSession, key: str):
+        row = (await db.execute(
+            select(
+                IdempotencyKey.fingerprint,
+                IdempotencyKey.status,
+                IdempotencyKey.status_code,
+                IdempotencyKey.result,
+                IdempotencyKey.credits_charged,
+                IdempotencyKey.attempts,
+                IdempotencyKey.lease_expires_at,
+                IdempotencyKey.expires_at,
+            ).where(IdempotencyKey.key == key)
+        )).first()
+        # Don't sit in a transaction while waiting.
+        await db.commit()
+        return row
+
+    async def _insert(self, db: AsyncSession, key: str, fingerprint: str, now: datetime, stale: bool):
+        try:
+            if stale:
+                await db.execute(
+                    delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.expires_at <= now)
+                )
+            await db.execute(insert(IdempotencyKey).values(
+                key=key,
+                fingerprint=fingerprint,
+                status="running",
+                attempts=1,
+                credits_charged=0,
+                lease_expires_at=now + timedelta(seconds=self.lease),
+                created_at=now,
+                expires_at=now + timedelta(seconds=self.ttl),
+            ))
+            await db.commit()
+        except IntegrityError:
+            # Another request claimed the key first.
+            await db.rollback()
+            return None
+        return Claim(key, attempts=1)
+
+    async def _take_over(self, db: AsyncSession, key: str, row, now: datetime):
+        claimed = await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key, IdempotencyKey.attempts == row.attempts)
+            .values(
+                status="running",
+                attempts=row.attempts + 1,
+                lease_expires_at=now + timedelta(seconds=self.lease),
+            )
+        )
+        if claimed.rowcount != 1:
+            await db.rollback()
+            return None
+        await db.commit()
+        return Claim(key, attempts=row.attempts + 1, credits=row.credits_charged)
+
+    async def _renew_lease(self, claim: Claim):
+        """Push the claim's lease out every third of it until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(IdempotencyKey)
+                        .where(*self._owned(claim), IdempotencyKey.status == "running")
+                        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease))
+                    )
+                    await db.commit()
+            except Exception:
+                # The next renewal may get through before the lease runs out.
+                logger.warning("Could not renew the lease of Idempotency-Key %s", claim.key, exc_info=True)
+
+    async def _run_claimed(self, db: AsyncSession, claim: Claim, call: Callable[[], Awaitable[Any]]):
+        token = _claim.set(claim)
+        renewal = asyncio.create_task(self._renew_lease(claim))
+        try:
+            result = await call()
+        except HTTPException as e:
+            if e.status_code < 500:
+                await db.rollback()
+                await self._finish(db, claim, e.status_code, {"detail": e.detail})
+            else:
+                await self._fail(db, claim)
+            raise
+        except BaseException:
+            await self._fail(db, claim)
+            raise
+        finally:
+            renewal.cancel()
+            _claim.reset(token)
+        await self._finish(db, claim, 200, jsonable_encoder(result))
+        return result
+
+    def _owned(self, claim: Claim):
+        return IdempotencyKey.key == claim.key, IdempotencyKey.attempts == claim.attempts
+
+    async def _finish(self, db: AsyncSession, claim: Claim, status_code: int, result: Any):
+        try:
+            await db.execute(
+                update(IdempotencyKey)
+                .where(*self._owned(claim))
+                .values(status="done", status_code=status_code, result=result)
+            )
+            await db.commit()
+        except Exception:
+            # The response still goes out; a retry runs again once the lease is up.
+            logger.exception("Could not store the outcome of Idempotency-Key %s", claim.key)
+
+    async def _fail(self, db: AsyncSession, claim: Claim):
+        try:
+            await db.rollback()
+            # Unpaid keys are dropped; paid ones stay so the retry is not charged again.
+            await db.execute(delete(IdempotencyKey).where(*self._owned(claim), IdempotencyKey.credits_charged == 0))
+            await db.execute(
+                update(IdempotencyKey)
+                .where(*self._owned(claim))
+                .values(status="failed", lease_expires_at=datetime.utcnow())
+            )
+            await db.commit()
+        except Exception:
+            # The lease runs out and a retry takes over.
+            logger.exception("Could not release Idempotency-Key %s", claim.key)
+
+
+async def purge_idempotency_batch(db: AsyncSession, now: datetime, batch_size: int) -> int:
+    """Delete one batch of expired keys."""
+    keys = (await db.execute(
+        select(IdempotencyKey.key).where(IdempotencyKey.expires_at <= now).limit(batch_size)
+    )).scalars().all()
+    if keys:
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key.in_(keys)))
+        await db.commit()
+    return len(keys)
+
+
+idempotency_store = IdempotencyStore(
+    settings.IDEMPOTENCY_TTL_SECONDS,
+    settings.IDEMPOTENCY_LEASE_SECONDS,
+    settings.IDEMPOTENCY_WAIT_SECONDS,
+    settings.IDEMPOTENCY_POLL_SECONDS,
+)
+
+
+async def idempotent(
+    scope: str,
+    key: str,
+    request: BaseModel,
+    response: Response,
+    db: AsyncSession,
+    call: Callable[[], Awaitable[Any]],
+    store: IdempotencyStore | None = None,
+):
+    """Run an endpoint body under ``key``, replaying the stored outcome on retries."""
+    store = store or idempotency_store
+    fingerprint = hashlib.sha256(request.model_dump_json().encode("utf-8")).hexdigest()
+    try:
+        result, replayed = await store.run(db, f"{scope}:{key}", fingerprint, call)
+    except IdempotencyConflict:
+        record_idempotency(scope, "conflict")
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    record_idempotency(scope, "replayed" if replayed else "new")
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
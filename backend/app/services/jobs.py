@@ -0,0 +1,167 @@
+"""Worker pool for queued story generations.
+
+Jobs live in ``generation_jobs``, so they survive client disconnects and
+process restarts. A worker claims the oldest queued job, or a running job
+whose lease expired because its worker died, with a single
+UPDATE ... SKIP LOCKED. Several processes can therefore share the queue.
+Results are written back to the row, and waiters in this process are woken
+right away. Waiters in other processes see the result on their next poll.
+A job that fails is refunded in the transaction that marks it failed.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.metrics import record_job
+from app.models import GenerationJob
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClaimedJob:
+    id: uuid.UUID
+    year: int
+    lang: str
+    paid: bool
+    attempts: int
+    payer: Optional[str] = None
+
+
+JobHandler = Callable[[ClaimedJob], Awaitable[dict]]
+# Gives a failed job's credit back; runs in the session that marks it failed.
+JobRefund = Callable[[AsyncSession, ClaimedJob], Awaitable[None]]
+
+
+class JobWorkerPool:
+    def __init__(self, handler: JobHandler, session_factory=async_session, refund: Optional[JobRefund] = None):
+        self.handler = handler
+        self.session_factory = session_factory
+        self.refund = refund
+        self._wakeup = asyncio.Event()
+        self._waiters: dict[uuid.UUID, asyncio.Event] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, concurrency: int):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a job was enqueued in this process."""
+        self._wakeup.set()
+
+    async def claim(self) -> Optional[ClaimedJob]:
+        now = datetime.utcnow()
+        pick = (
+            select(GenerationJob.id)
+            .where(or_(
+                GenerationJob.status == "queued",
+                and_(GenerationJob.status == "running", GenerationJob.lease_expires_at < now),
+            ))
+            .order_by(GenerationJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == pick)
+                .values(
+                    status="running",
+                    attempts=GenerationJob.attempts + 1,
+                    lease_expires_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                    updated_at=now,
+                )
+                .returning(GenerationJob.id, GenerationJob.year, GenerationJob.lang,
+                           GenerationJob.paid, GenerationJob.attempts, GenerationJob.payer)
+                .execution_options(synchronize_session=False)
+            )).one_or_none()
+            await db.commit()
+        return ClaimedJob(*row) if row is not None else None
+
+    async def _finish(self, job: ClaimedJob, status: str, result: dict | None = None, error: str | None = None):
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            # Matching on attempts fences off a worker whose lease was taken over.
+            finished = await db.execute(
+                update(GenerationJob)
+                .where(
+                    GenerationJob.id == job.id,
+                    GenerationJob.status == "running",
+                    GenerationJob.attempts == job.attempts,
+                )
+                .values(status=status, result=result, error=error, finished_at=now, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if status == "failed" and finished.rowcount == 1 and self.refund is not None:
+                await self.refund(db, job)
+            await db.commit()
+        record_job(status)
+        waiter = self._waiters.get(job.id)
+        if waiter is not None:
+            waiter.set()
+
+    async def run_one(self) -> bool:
+        """Claim and run one job; returns False when the queue is empty."""
+        job = await self.claim()
+        if job is None:
+            return False
+        if job.attempts > settings.JOB_MAX_ATTEMPTS:
+            await self._finish(job, "failed", error="Generation did not complete after several attempts")
+            return True
+        if job.attempts > 1:
+            record_job("retried")
+        try:
+            result = await self.handler(job)
+        except Exception:
+            logger.exception("Generation job %s failed", job.id)
+            await self._finish(job, "failed", error="Story generation failed")
+        else:
+            await self._finish(job, "done", result=result)
+        return True
+
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.run_one():
+                    continue
+            except Exception:
+                logger.exception("Job worker error")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait(self, job_id: uuid.UUID, timeout: float) -> Optional[GenerationJob]:
+        """Return the job once it has finished, or as it stands after ``timeout``."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = self._waiters.setdefault(job_id, asyncio.Event())
+        try:
+            while True:
+                async with self.session_factory() as db:
+                    job = await db.get(GenerationJob, job_id)
+                remaining = deadline - loop.time()
+                if job is None or job.finished or remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(waiter.wait(), min(remaining, settings.JOB_POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters.pop(job_id, None)
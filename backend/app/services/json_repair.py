@@ -0,0 +1,99 @@
+"""Lenient JSON decoding for LLM output.
+
+Models sometimes return JSON that ``json.loads`` rejects. The usual causes
+are a response cut off by max_tokens, trailing commas, typographic quotes
+(“ ”) used as string delimiters, and raw newlines inside strings.
+``repair_json`` rewrites the text in a single pass. At a cut-off it keeps
+every array element that was complete and closes the open brackets, so a
+truncated story list still yields all the stories that made it through.
+"""
+import json
+
+_OPEN_QUOTES = {'"': '"', "“": "”", "„": "“"}
+_CLOSE_FOR = {"{": "}", "[": "]"}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _strip_trailing_comma(out: list[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str) -> tuple[str, bool]:
+    """Rewrite the first JSON value in ``text`` into valid JSON.
+
+    Returns the repaired text and whether it had to be cut back to the last
+    complete array element. Raises ValueError if nothing can be recovered.
+    """
+    start = min((i for i in (text.find("["), text.find("{")) if i >= 0), default=-1)
+    if start == -1:
+        raise ValueError("No JSON found in response")
+
+    out: list[str] = []
+    stack: list[str] = []
+    # Output length and open brackets at the last point where everything
+    # written so far was complete array elements.
+    checkpoint: tuple[int, tuple[str, ...]] | None = None
+    closing_quote = None
+    i = start
+    while i < len(text):
+        ch = text[i]
+        i += 1
+        if closing_quote is not None:
+            if ch == "\\" and i < len(text):
+                out.append(ch + text[i])
+                i += 1
+            elif ch == closing_quote or (closing_quote != '"' and ch == '"'):
+                out.append('"')
+                closing_quote = None
+            elif ch in _CONTROL_ESCAPES:
+                out.append(_CONTROL_ESCAPES[ch])
+            else:
+                out.append(ch)
+        elif ch in _OPEN_QUOTES:
+            out.append('"')
+            closing_quote = _OPEN_QUOTES[ch]
+        elif ch in _CLOSE_FOR:
+            out.append(ch)
+            stack.append(ch)
+            if ch == "[":
+                checkpoint = (len(out), tuple(stack))
+        elif ch in "}]":
+            if not stack or _CLOSE_FOR[stack[-1]] != ch:
+                break
+            _strip_trailing_comma(out)
+            out.append(ch)
+            stack.pop()
+            if not stack:
+                return "".join(out), False
+            if stack[-1] == "[":
+                checkpoint = (len(out), tuple(stack))
+        elif ch == ",":
+            if stack and stack[-1] == "[":
+                checkpoint = (len(out), tuple(stack))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    if checkpoint is None:
+        raise ValueError("Truncated JSON has no complete element")
+    length, open_brackets = checkpoint
+    del out[length:]
+    _strip_trailing_comma(out)
+    out.extend(_CLOSE_FOR[b] for b in reversed(open_brackets))
+    return "".join(out), True
+
+
+def loads_lenient(text: str):
+    """``json.loads`` that falls back to ``repair_json`` on malformed input."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    repaired, _ = repair_json(text)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Unrecoverable JSON in response: {e}") from e
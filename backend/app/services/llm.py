@@ -1,17 +1,120 @@
 """LLM service for generating future HN content."""
-import json
+import asyncio
+import logging
 import re
-from openai import AsyncOpenAI
+import secrets
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Optional
 
 from app.core.config import settings
+from app.core.metrics import (
+    record_details_batch,
+    record_llm_call,
+    record_prompt_call,
+    record_prompt_stories,
+    record_stories_topup,
+)
+from app.services.batching import MicroBatcher
+from app.services.json_repair import loads_lenient
+from app.services.metadata import StoryPage, synthesize_metadata
+from app.services.model_router import model_router
+from app.services.prompts import PromptRegistry, PromptVariant
+from app.services.scheduler import llm_scheduler, shared_priority_context
+from app.services.wire import decode_compact, format_instructions, story_token_budget
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
-def get_client() -> AsyncOpenAI:
-    return AsyncOpenAI(base_url=settings.LLM_PROXY_URL, api_key=settings.LLM_PROXY_KEY)
+logger = logging.getLogger(__name__)
+
+# One client (and so one HTTP connection pool) per proxy URL.
+_clients: dict[str, "AsyncOpenAI"] = {}
+
+
+def get_client(base_url: Optional[str] = None) -> "AsyncOpenAI":
+    # Imported lazily: the SDK is the heaviest import in the app and is not
+    # needed until the first completion.
+    from openai import AsyncOpenAI
+
+    base_url = base_url or settings.LLM_PROXY_URL
+    client = _clients.get(base_url)
+    if client is None:
+        client = _clients[base_url] = AsyncOpenAI(base_url=base_url, api_key=settings.LLM_PROXY_KEY)
+    return client
+
+
+async def warm_up_clients(timeout: float = 5.0):
+    """Create a client per routed endpoint and open its connection pool."""
+    for base_url in {e.base_url or settings.LLM_PROXY_URL for e in model_router.endpoints}:
+        client = get_client(base_url)
+        try:
+            await client.with_options(timeout=timeout, max_retries=0).models.list()
+        except Exception as e:
+            # Any HTTP answer, even an error, leaves a warm connection behind.
+            logger.info("LLM warm-up request to %s: %s", base_url, e)
+
+
+async def _chat(purpose: str, **kwargs):
+    """Run a chat completion on the first healthy model, falling back on errors.
+
+    Waits for a slot from ``llm_scheduler`` under the caller's priority class.
+    """
+    async with llm_scheduler.slot():
+        return await _chat_with_fallback(purpose, **kwargs)
+
+
+async def _chat_with_fallback(purpose: str, **kwargs):
+    last_error = None
+    for endpoint in model_router.candidates(purpose):
+        if not model_router.begin_call(endpoint):
+            # Another caller is making the half-open trial call.
+            continue
+        client = get_client(endpoint.base_url)
+        started = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(model=endpoint.model, **kwargs)
+            if kwargs.get("stream"):
+                response = await _collect_stream(response, started)
+        except Exception as e:
+            model_router.record_failure(endpoint)
+            record_llm_call(endpoint.name, purpose, "error")
+            logger.warning("LLM call to %s failed for %s: %s", endpoint.name, purpose, e)
+            last_error = e
+            continue
+        latency = time.perf_counter() - started
+        model_router.record_success(endpoint, latency)
+        record_llm_call(endpoint.name, purpose, "ok", latency)
+        return response
+    raise last_error or RuntimeError(f"No model endpoint is available for {purpose}")
+
+
+async def _collect_stream(stream, started: float):
+    """Assemble a streamed completion into the shape of a non-streamed one.
+
+    The result also carries ``ttft``, the seconds from sending the request
+    to the first content token.
+    """
+    parts, finish_reason, usage, ttft = [], None, None, None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        for choice in chunk.choices or ():
+            if choice.delta.content:
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                parts.append(choice.delta.content)
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+    choice = SimpleNamespace(message=SimpleNamespace(content="".join(parts)), finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice], usage=usage, ttft=ttft)
 
 
 def _extract_json(text: str):
-    """Extract JSON from LLM response, handling markdown code blocks."""
+    """Extract JSON from LLM response, handling markdown code blocks.
+
+    Malformed or truncated JSON is repaired where possible (see json_repair).
+    """
     # Try to find JSON in code blocks first
     match = re.search(r"```(?:json)?\s*\n?([\s\S]*?)\n?```", text)
     if match:
@@ -26,94 +129,412 @@ def _extract_json(text: str):
             raise ValueError("No JSON found in response")
         idx = min(i for i in [idx_arr, idx_obj] if i >= 0)
         text = text[idx:]
-    return json.loads(text)
-
-
-async def generate_stories(year: int, lang: str = "en") -> list[dict]:
-    """Generate 30 future HN stories for a given year."""
-    client = get_client()
-
-    lang_instruction = ""
-    if lang != "en":
-        lang_map = {
-            "zh": "Chinese (Simplified)",
-            "ja": "Japanese",
-            "de": "German",
-            "fr": "French",
-            "ko": "Korean",
-            "es": "Spanish",
-        }
-        lang_name = lang_map.get(lang, lang)
-        lang_instruction = f" Write ALL titles and content in {lang_name}."
-
-    prompt = f"""Generate exactly 30 Hacker News front page stories from the year {year}. 
+    return loads_lenient(text)
+
+
+async def _parse_off_loop(parse, content: str):
+    """Run ``parse(content)``, in a worker thread if the response is large.
+
+    Regex and JSON parsing of a long response would otherwise stall every
+    request sharing the event loop.
+    """
+    if len(content) > settings.PARSE_OFFLOAD_BYTES:
+        return await asyncio.to_thread(parse, content)
+    return parse(content)
+
+
+STORIES_PER_PAGE = 30
+
+# The model only writes these; the rest of each story is synthesized from a seed.
+LLM_STORY_FIELDS = ["title", "url"]
+
+# Output budget for the legacy JSON format, which repeats every key per story.
+JSON_STORIES_MAX_TOKENS = 8000
+
+# Every prompt below is registered as a variant; see prompts.py.
+prompt_registry = PromptRegistry()
+
+
+async def _complete(variant: PromptVariant, prompt: str, parse, max_tokens: Optional[int] = None):
+    """Send ``prompt`` as ``variant`` and return ``parse`` of the answer.
+
+    Records the variant's latency, output tokens, time to first token (for
+    streamed variants) and whether the answer parsed.
+    """
+    max_tokens = max_tokens or variant.max_tokens
+    stream = {"stream": True, "stream_options": {"include_usage": True}} if variant.stream else {}
+    started = time.perf_counter()
+    try:
+        response = await _chat(
+            variant.purpose,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=variant.temperature,
+            max_tokens=max_tokens,
+            **stream,
+        )
+    except Exception:
+        record_prompt_call(variant.purpose, variant.key, "error")
+        raise
+
+    choice = response.choices[0]
+    if getattr(choice, "finish_reason", None) == "length":
+        logger.warning("%s response (%s) hit max_tokens (%d)", variant.purpose, variant.key, max_tokens)
+    output_tokens = getattr(getattr(response, "usage", None), "completion_tokens", None)
+    output_tokens = output_tokens if isinstance(output_tokens, int) else None
+    ttft = getattr(response, "ttft", None)
+    ttft = ttft if isinstance(ttft, float) else None
+
+    try:
+        result = await _parse_off_loop(parse, choice.message.content)
+    except ValueError:
+        record_prompt_call(
+            variant.purpose, variant.key, "parse_error", time.perf_counter() - started, output_tokens, ttft
+        )
+        raise
+    record_prompt_call(variant.purpose, variant.key, "ok", time.perf_counter() - started, output_tokens, ttft)
+    return result
+
+
+LANG_NAMES = {
+    "zh": "Chinese (Simplified)",
+    "ja": "Japanese",
+    "de": "German",
+    "fr": "French",
+    "ko": "Korean",
+    "es": "Spanish",
+}
+
+
+def _lang_instruction(lang: str) -> str:
+    if lang == "en":
+        return ""
+    return f" Write ALL titles and content in {LANG_NAMES.get(lang, lang)}."
+
+
+def _story_brief(year: int, lang: str, count: int = STORIES_PER_PAGE) -> str:
+    return f"""Generate exactly {count} Hacker News front page stories from the year {year}. 
 These should be realistic, creative predictions of what tech news might look like in {year}.
 Include a mix of: AI breakthroughs, startup launches, open source projects, Show HN posts, 
-Ask HN posts, scientific discoveries, tech policy, and cultural tech moments.{lang_instruction}
+Ask HN posts, scientific discoveries, tech policy, and cultural tech moments.{_lang_instruction(lang)}"""
+
+
+def _avoid_clause(titles: list[str]) -> str:
+    if not titles:
+        return ""
+    listing = "\n".join(f"- {t}" for t in titles)
+    return f"""
 
-Return a JSON array with exactly 30 items. Each item must have:
-- "id": integer (1-30)
+These stories are already on the page. Do not repeat them or write close variants:
+{listing}"""
+
+
+def _json_stories_prompt(year: int, lang: str, count: int = STORIES_PER_PAGE, avoid: list[str] = ()) -> str:
+    return f"""{_story_brief(year, lang, count)}{_avoid_clause(avoid)}
+
+Return a JSON array with exactly {count} items. Each item must have:
 - "title": string (HN-style title)
-- "url": string (realistic future URL)
-- "domain": string (domain from URL)
-- "score": integer (100-3000, realistic distribution)
-- "author": string (HN-style username)  
-- "time": string (e.g. "3 hours ago", "1 day ago")
-- "comments": integer (10-800)
+- "url": string (realistic future URL; Ask HN posts use https://news.ycombinator.com/item?id=...)
 
 Return ONLY the JSON array, no other text."""
 
-    response = await client.chat.completions.create(
-        model=settings.LLM_MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.9,
-        max_tokens=8000,
-    )
 
-    content = response.choices[0].message.content
-    stories = _extract_json(content)
+def _compact_stories_prompt(year: int, lang: str, count: int = STORIES_PER_PAGE, avoid: list[str] = ()) -> str:
+    return f"""{_story_brief(year, lang, count)}{_avoid_clause(avoid)}
 
-    # Ensure we have the right structure
-    for i, story in enumerate(stories):
-        story["id"] = i + 1
-        story.setdefault("score", 100)
-        story.setdefault("comments", 10)
-        story.setdefault("time", "2 hours ago")
-        story.setdefault("author", "anonymous")
-        story.setdefault("domain", "example.com")
-        story.setdefault("url", f"https://{story.get('domain', 'example.com')}")
+Columns: title (HN-style title), url (realistic future URL; Ask HN posts use
+https://news.ycombinator.com/item?id=...).
 
-    return stories[:30]
+{format_instructions(count, LLM_STORY_FIELDS)}"""
 
 
-async def generate_story_details(story: dict) -> dict:
-    """Generate detailed summary and comments for a story."""
-    client = get_client()
+def _terse_stories_prompt(year: int, lang: str, count: int = STORIES_PER_PAGE, avoid: list[str] = ()) -> str:
+    return f"""{count} plausible Hacker News front page stories from {year}: AI, startups, open source,
+Show HN, Ask HN, science, policy.{_lang_instruction(lang)}{_avoid_clause(avoid)}
+
+Columns: title, url (Ask HN: https://news.ycombinator.com/item?id=...).
+
+{format_instructions(count, LLM_STORY_FIELDS)}"""
+
+
+# Compact answers that cannot be parsed are asked for again in JSON.
+STORIES_JSON_FALLBACK = "json.v1"
+
+prompt_registry.register(
+    PromptVariant("stories", "compact", 1, _compact_stories_prompt, 0.9, format="compact", stream=True)
+)
+prompt_registry.register(
+    PromptVariant("stories", "compact_terse", 1, _terse_stories_prompt, 0.9, weight=0.0, format="compact", stream=True)
+)
+prompt_registry.register(
+    PromptVariant("stories", "json", 1, _json_stories_prompt, 0.9, max_tokens=JSON_STORIES_MAX_TOKENS, stream=True)
+)
+
+
+def _parse_stories(content: str) -> list[dict]:
+    """Parse a stories response in either the compact or the JSON format."""
+    try:
+        return decode_compact(content)
+    except ValueError:
+        stories = _extract_json(content)
+    if not isinstance(stories, list):
+        raise ValueError("Stories response is not a list")
+    return stories
+
+
+async def _request_stories(
+    variant: PromptVariant, year: int, lang: str, count: int, avoid: list[str] = ()
+) -> list[dict]:
+    max_tokens = variant.max_tokens or story_token_budget(count, LLM_STORY_FIELDS)
+    return await _complete(variant, variant.build(year, lang, count, avoid), _parse_stories, max_tokens)
+
+
+async def _request_page(
+    year: int, lang: str, count: int, variant: PromptVariant, avoid: list[str] = ()
+) -> tuple[list[dict], PromptVariant]:
+    """Request ``count`` stories; returns them with the variant that produced them."""
+    if variant.format == "compact":
+        try:
+            return await _request_stories(variant, year, lang, count, avoid), variant
+        except ValueError as e:
+            logger.warning("Compact stories response (%s) unparseable, retrying as JSON: %s", variant.key, e)
+            variant = prompt_registry.get("stories", STORIES_JSON_FALLBACK)
+    return await _request_stories(variant, year, lang, count, avoid), variant
+
+
+def _title_key(title: str) -> str:
+    return " ".join(title.casefold().split())
+
+
+async def _top_up_stories(
+    year: int, lang: str, stories: list[dict], missing: int, variant: PromptVariant, avoid: list[str] = ()
+) -> list[dict]:
+    """Ask for just the ``missing`` stories of a short page, avoiding its titles.
+
+    Best effort: on failure the page is served short rather than failing.
+    """
+    titles = [s.get("title", "") for s in stories if s.get("title")] + list(avoid)
+    record_stories_topup(missing)
+    try:
+        extra, _ = await _request_page(year, lang, missing, variant, avoid=titles)
+    except Exception as e:
+        logger.warning("Stories top-up for %d missing stories failed: %s", missing, e)
+        return []
+    return _fresh_stories(extra, titles)[:missing]
 
-    prompt = f"""For this Hacker News story from the future:
+
+def _fresh_stories(stories: list, avoid: list[str]) -> list[dict]:
+    """``stories`` without malformed items and titles already in ``avoid`` or repeated."""
+    seen = {_title_key(t) for t in avoid}
+    fresh = []
+    for story in stories:
+        if not isinstance(story, dict):
+            continue
+        key = _title_key(story.get("title", ""))
+        if key and key not in seen:
+            seen.add(key)
+            fresh.append(story)
+    return fresh
+
+
+async def generate_stories(year: int, lang: str = "en", seed: Optional[int] = None) -> StoryPage:
+    """Generate 30 future HN stories for a given year.
+
+    The model writes titles and URLs; everything else is synthesized from
+    ``seed`` (random if not given), so the page can be rebuilt from it.
+    A short page (truncated or partly malformed output) is completed with
+    one follow-up request for only the missing stories. The page records
+    the prompt variant that produced it.
+    """
+    if seed is None:
+        seed = secrets.randbits(32)
+
+    variant = prompt_registry.choose("stories", format=settings.LLM_STORY_FORMAT)
+    stories, variant = await _request_page(year, lang, STORIES_PER_PAGE, variant)
+    stories = [s for s in stories if isinstance(s, dict)][:STORIES_PER_PAGE]
+    record_prompt_stories(variant.key, len(stories))
+    missing = STORIES_PER_PAGE - len(stories)
+    if missing > 0:
+        stories += await _top_up_stories(year, lang, stories, missing, variant)
+
+    stories = [
+        {"id": i + 1, "title": story.get("title", ""), "url": story.get("url") or "https://example.com"}
+        for i, story in enumerate(stories)
+    ]
+    return StoryPage(synthesize_metadata(stories, seed), seed=seed, prompt_variant=variant.key)
+
+
+async def reroll_stories(year: int, lang: str, keep: list[str], replace: list[str]) -> list[dict]:
+    """Generate replacements for the ``replace`` titles of a page.
+
+    Only ``len(replace)`` stories are asked for. The prompt lists the titles
+    being replaced and the first REROLL_PROMPT_TITLES ``keep`` titles as
+    stories not to repeat, so it grows with the request and not the page;
+    a repeat of any other kept title is dropped from the answer instead.
+    Returns up to that many ``{"title", "url"}`` stories, in order; a short
+    answer gets one top-up request like a short page does.
+    """
+    count = len(replace)
+    avoid = [*keep, *replace]
+    listed = [*replace, *keep[:settings.REROLL_PROMPT_TITLES]]
+    variant = prompt_registry.choose("stories", format=settings.LLM_STORY_FORMAT)
+    stories, variant = await _request_page(year, lang, count, variant, avoid=listed)
+    stories = _fresh_stories(stories, avoid)[:count]
+    record_prompt_stories(variant.key, len(stories))
+    missing = count - len(stories)
+    if missing > 0:
+        extra = await _top_up_stories(year, lang, stories, missing, variant, avoid=listed)
+        stories = _fresh_stories(stories + extra, avoid)[:count]
+    return [{"title": story["title"], "url": story.get("url") or "https://example.com"} for story in stories]
+
+
+# Details are the summary plus only the top comments; reply threads are
+# generated when a reader opens them (generate_comment_replies).
+DETAILS_MAX_TOKENS = 1500
+REPLIES_MAX_TOKENS = 800
+
+COMMENT_FIELDS = """  - "author": string (HN username)
+  - "text": string (realistic HN comment, 1-3 sentences)
+  - "score": integer (1-200)
+  - "time": string (e.g. "1 hour ago")
+  - "reply_count": integer (0-40, how many replies the comment has drawn)"""
+
+DETAILS_SCHEMA = f"""- "summary": string (2-3 paragraph article summary, written as if the article exists)
+- "comments": array of the {settings.LLM_DETAILS_TOP_COMMENTS} highest-ranked top-level comments, each with:
+{COMMENT_FIELDS}"""
+
+
+def _details_prompt(stories: list[dict], batch: bool) -> str:
+    if not batch:
+        story = stories[0]
+        return f"""For this Hacker News story from the future:
 Title: {story.get('title', 'Unknown')}
 URL: {story.get('url', '')}
 
 Generate a detailed article summary and top comments as if this were a real HN thread.
 
 Return a JSON object with:
-- "summary": string (2-3 paragraph article summary, written as if the article exists)
-- "comments": array of 5 comment objects, each with:
-  - "author": string (HN username)
-  - "text": string (realistic HN comment, 1-3 sentences)
-  - "score": integer (1-200)
-  - "time": string (e.g. "1 hour ago")
+{DETAILS_SCHEMA}
 
 Return ONLY the JSON object, no other text."""
 
-    response = await client.chat.completions.create(
-        model=settings.LLM_MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.8,
-        max_tokens=3000,
+    listing = "\n".join(
+        f"{n}. Title: {story.get('title', 'Unknown')}\n   URL: {story.get('url', '')}"
+        for n, story in enumerate(stories, start=1)
     )
+    return f"""For each of these {len(stories)} Hacker News stories from the future:
+{listing}
+
+Generate a detailed article summary and top comments as if each were a real HN thread.
+
+Return a JSON array with one object per story, each with:
+- "n": integer (the story's number above)
+{DETAILS_SCHEMA}
+
+Return ONLY the JSON array, no other text."""
+
+
+prompt_registry.register(
+    PromptVariant("details", "standard", 1, _details_prompt, 0.8, max_tokens=DETAILS_MAX_TOKENS, stream=True)
+)
+
+
+def _parse_details_batch(content: str) -> list:
+    items = _extract_json(content)
+    if not isinstance(items, list):
+        raise ValueError("Batch details response is not a list")
+    return items
+
+
+async def _generate_single_details(story: dict) -> dict:
+    """Generate detailed summary and comments for one story."""
+    variant = prompt_registry.choose("details")
+    return await _complete(variant, variant.build([story], batch=False), _extract_json)
+
+
+async def _generate_details_batch(stories: list[dict]) -> dict[int, dict]:
+    """Generate details for several stories in one completion.
+
+    Returns details keyed by the story's index in ``stories``; stories the
+    model skipped or answered malformed are left out.
+    """
+    variant = prompt_registry.choose("details")
+    items = await _complete(
+        variant, variant.build(stories, batch=True), _parse_details_batch, variant.max_tokens * len(stories)
+    )
+
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        n = item.pop("n", None)
+        if not isinstance(n, int) or not 1 <= n <= len(stories):
+            continue
+        if isinstance(item.get("summary"), str) and isinstance(item.get("comments"), list):
+            results[n - 1] = item
+    return results
+
+
+details_batcher = MicroBatcher(
+    _generate_details_batch,
+    _generate_single_details,
+    max_size=settings.LLM_DETAILS_BATCH_MAX,
+    window=settings.LLM_DETAILS_BATCH_WINDOW_MS / 1000,
+    on_batch=record_details_batch,
+    batch_context=shared_priority_context,
+)
+
+
+async def generate_story_details(story: dict) -> dict:
+    """Generate detailed summary and comments for a story.
+
+    Concurrent requests are coalesced into a single completion by
+    ``details_batcher``.
+    """
+    if details_batcher.max_size <= 1:
+        return await _generate_single_details(story)
+    return await details_batcher.submit(story)
+
+
+def _replies_prompt(story: dict, summary: str, thread: list[dict], count: int) -> str:
+    chain = "\n".join(
+        f"{'  ' * depth}{c.get('author', 'anon')}: {c.get('text', '')}" for depth, c in enumerate(thread)
+    )
+    return f"""This is a Hacker News thread from the future.
+Title: {story.get('title', 'Unknown')}
+URL: {story.get('url', '')}
+Article summary: {summary}
+
+Comment chain (each comment replies to the one above it):
+{chain}
+
+Write {count} replies to the last comment in the chain. Stay consistent with the article and the
+earlier comments; replies may agree, push back or add detail.
+
+Return a JSON array of {count} objects, each with:
+{COMMENT_FIELDS}
+
+Return ONLY the JSON array, no other text."""
+
+
+prompt_registry.register(
+    PromptVariant("replies", "standard", 1, _replies_prompt, 0.8, max_tokens=REPLIES_MAX_TOKENS)
+)
+
+
+def _parse_replies(content: str) -> list:
+    items = _extract_json(content)
+    if not isinstance(items, list):
+        raise ValueError("Replies response is not a list")
+    return items
+
 
-    content = response.choices[0].message.content
-    details = _extract_json(content)
+async def generate_comment_replies(story: dict, summary: str, thread: list[dict], count: int) -> list[dict]:
+    """Generate ``count`` replies to the last comment in ``thread``.
 
-    return details
+    ``thread`` runs from the top-level comment down to the one being
+    answered. The story, its summary and that chain are sent as context, so
+    new replies stay consistent with what the reader has already seen.
+    """
+    variant = prompt_registry.choose("replies")
+    items = await _complete(variant, variant.build(story, summary, thread, count), _parse_replies)
+    return [item for item in items if isinstance(item, dict) and isinstance(item.get("text"), str)][:count]
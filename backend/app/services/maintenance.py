@@ -0,0 +1,215 @@
+"""Background maintenance of the token, payment and free-trial tables.
+
+- Tokens that are exhausted or expired, and untouched for
+  MAINTENANCE_TOKEN_GRACE_DAYS, move to ``generation_tokens_archive``
+  together with their transactions (``payment_transactions_archive``,
+  monthly range partitions on PostgreSQL).
+- Free-trial rows not updated for MAINTENANCE_TRIAL_COMPACT_DAYS are
+  compacted into ``free_trial_archive`` and restored on the device's next
+  visit.
+- Expired ``single_flight_results``, ``idempotency_keys`` and ``story_pages``
+  are deleted.
+
+Work is done in batches of MAINTENANCE_BATCH_SIZE rows, one short
+transaction each, with SKIP LOCKED row selection on PostgreSQL so several
+replicas can run the job and none of them holds locks on the hot tables for
+long.
+
+Runs inside the app lifespan every MAINTENANCE_INTERVAL_SECONDS, or once
+from the command line:
+    python -m app.services.maintenance
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, func, insert, literal, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.metrics import record_maintenance
+from app.models import (
+    FreeTrialArchive,
+    FreeTrialTracking,
+    GenerationToken,
+    GenerationTokenArchive,
+    PaymentTransaction,
+    PaymentTransactionArchive,
+)
+from app.services.idempotency import purge_idempotency_batch
+from app.services.pages import purge_pages_batch
+from app.services.single_flight import purge_single_flight_batch
+
+logger = logging.getLogger(__name__)
+
+
+def device_hash(device_id: str) -> bytes:
+    return hashlib.sha256(device_id.encode("utf-8")).digest()[:16]
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+async def ensure_archive_partitions(db: AsyncSession, start: datetime, end: datetime):
+    """Create the monthly archive partitions covering [start, end] (PostgreSQL only)."""
+    if db.bind.dialect.name != "postgresql":
+        return
+    month = _month_start(start)
+    while month <= end:
+        upper = _next_month(month)
+        name = f"payment_transactions_archive_y{month.year}m{month.month:02d}"
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF payment_transactions_archive "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        ))
+        month = upper
+
+
+async def archive_tokens_batch(db: AsyncSession, now: datetime, batch_size: int) -> int:
+    """Move one batch of dead tokens and their transactions to the archive."""
+    cutoff = now - timedelta(days=settings.MAINTENANCE_TOKEN_GRACE_DAYS)
+    ids = (await db.execute(
+        select(GenerationToken.id)
+        .where(
+            or_(GenerationToken.remaining_generations <= 0, GenerationToken.expires_at < now),
+            func.coalesce(GenerationToken.updated_at, GenerationToken.created_at) < cutoff,
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+    if not ids:
+        return 0
+
+    span = (await db.execute(
+        select(func.min(PaymentTransaction.created_at), func.max(PaymentTransaction.created_at))
+        .where(PaymentTransaction.token_id.in_(ids))
+    )).one()
+    if span[0] is not None:
+        await ensure_archive_partitions(db, span[0], span[1])
+
+    tx_columns = [
+        "id", "created_at", "token_id", "product_sku", "provider", "provider_transaction_id",
+        "amount_cents", "currency", "status", "device_id", "optional_email",
+    ]
+    tx_source = [
+        func.coalesce(PaymentTransaction.created_at, now) if c == "created_at" else getattr(PaymentTransaction, c)
+        for c in tx_columns
+    ]
+    await db.execute(
+        insert(PaymentTransactionArchive).from_select(
+            tx_columns + ["archived_at"],
+            select(*tx_source, literal(now, DateTime)).where(PaymentTransaction.token_id.in_(ids)),
+        )
+    )
+    await db.execute(delete(PaymentTransaction).where(PaymentTransaction.token_id.in_(ids)))
+
+    token_columns = [
+        "id", "token", "product_sku", "total_generations", "remaining_generations",
+        "expires_at", "device_id", "created_at", "updated_at",
+    ]
+    await db.execute(
+        insert(GenerationTokenArchive).from_select(
+            token_columns + ["archived_at"],
+            select(*(getattr(GenerationToken, c) for c in token_columns), literal(now, DateTime))
+            .where(GenerationToken.id.in_(ids)),
+        )
+    )
+    await db.execute(delete(GenerationToken).where(GenerationToken.id.in_(ids)))
+    await db.commit()
+    return len(ids)
+
+
+async def compact_trials_batch(db: AsyncSession, now: datetime, batch_size: int) -> int:
+    """Move one batch of stale free-trial rows into the compact archive."""
+    cutoff = now - timedelta(days=settings.MAINTENANCE_TRIAL_COMPACT_DAYS)
+    rows = (await db.execute(
+        select(FreeTrialTracking.id, FreeTrialTracking.device_id, FreeTrialTracking.uses_count)
+        .where(func.coalesce(FreeTrialTracking.updated_at, FreeTrialTracking.created_at) < cutoff)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if not rows:
+        return 0
+
+    # A device hash is unique, but guard against an archive row left behind
+    # by a concurrent restore.
+    hashes = {device_hash(r.device_id): r.uses_count for r in rows}
+    existing = set((await db.execute(
+        select(FreeTrialArchive.device_hash).where(FreeTrialArchive.device_hash.in_(hashes))
+    )).scalars())
+    new_rows = [{"device_hash": h, "uses_count": c} for h, c in hashes.items() if h not in existing]
+    if new_rows:
+        await db.execute(insert(FreeTrialArchive), new_rows)
+    await db.execute(delete(FreeTrialTracking).where(FreeTrialTracking.id.in_([r.id for r in rows])))
+    await db.commit()
+    return len(rows)
+
+
+async def restore_trial(device_id: str, db: AsyncSession):
+    """Bring a compacted free-trial row back into the hot table, if there is one.
+
+    Returns the restored (uncommitted) row or None.
+    """
+    key = device_hash(device_id)
+    archived = (await db.execute(
+        select(FreeTrialArchive).where(FreeTrialArchive.device_hash == key)
+    )).scalar_one_or_none()
+    if archived is None:
+        return None
+    tracking = FreeTrialTracking(device_id=device_id, uses_count=archived.uses_count)
+    db.add(tracking)
+    await db.delete(archived)
+    return tracking
+
+
+async def _drain(step, table: str, session_factory, now: datetime) -> int:
+    total = 0
+    for _ in range(settings.MAINTENANCE_MAX_BATCHES):
+        async with session_factory() as db:
+            moved = await step(db, now, settings.MAINTENANCE_BATCH_SIZE)
+        total += moved
+        if moved:
+            record_maintenance(table, moved)
+        if moved < settings.MAINTENANCE_BATCH_SIZE:
+            break
+        # Let request traffic in between batches.
+        await asyncio.sleep(settings.MAINTENANCE_BATCH_PAUSE_SECONDS)
+    return total
+
+
+async def run_maintenance(session_factory=async_session, now: datetime | None = None) -> dict[str, int]:
+    """One full maintenance pass; returns rows moved per table."""
+    now = now or datetime.utcnow()
+    result = {
+        "generation_tokens": await _drain(archive_tokens_batch, "generation_tokens", session_factory, now),
+        "free_trial_tracking": await _drain(compact_trials_batch, "free_trial_tracking", session_factory, now),
+        "single_flight_results": await _drain(
+            purge_single_flight_batch, "single_flight_results", session_factory, now
+        ),
+        "idempotency_keys": await _drain(purge_idempotency_batch, "idempotency_keys", session_factory, now),
+        "story_pages": await _drain(purge_pages_batch, "story_pages", session_factory, now),
+    }
+    logger.info("Maintenance pass finished: %s", result)
+    return result
+
+
+async def maintenance_loop():
+    """Run maintenance every MAINTENANCE_INTERVAL_SECONDS until cancelled."""
+    while True:
+        await asyncio.sleep(settings.MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            await run_maintenance()
+        except Exception:
+            logger.exception("Maintenance pass failed")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_maintenance())
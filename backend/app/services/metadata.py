@@ -0,0 +1,111 @@
+"""Server-side synthesis of story metadata.
+
+The model only writes titles and URLs; score, comment count, author handle,
+relative time and domain are generated here from a seed so a page is
+reproducible and its numbers look like a real front page: heavy-tailed
+scores, comment counts that track score, and an ordering consistent with
+HN's ranking formula.
+"""
+import math
+import random
+from typing import Optional
+from urllib.parse import urlparse
+
+# Score distribution: log-normal around a front-page median of ~150 points.
+SCORE_MEDIAN = 150
+SCORE_SIGMA = 0.95
+SCORE_MIN, SCORE_MAX = 8, 3500
+
+# Comments per point, also log-normal; Ask HN threads run much hotter.
+COMMENT_RATIO_MEDIAN = 0.45
+COMMENT_RATIO_SIGMA = 0.6
+ASK_HN_COMMENT_BOOST = 2.5
+
+# Story age on the front page, in hours.
+AGE_MIN_HOURS, AGE_MAX_HOURS = 0.25, 22.0
+# Exponent of HN's ranking formula: rank = (points - 1) / (age + 2) ** GRAVITY
+GRAVITY = 1.8
+
+_HANDLE_WORDS = [
+    "byte", "lambda", "kernel", "rust", "pixel", "vector", "async", "null", "quantum", "orbit",
+    "tensor", "shell", "cache", "delta", "fusion", "neuron", "photon", "socket", "stack", "hex",
+    "cobalt", "ember", "flux", "garnet", "harbor", "iris", "juniper", "karma", "lumen", "mesa",
+]
+_HANDLE_SUFFIXES = ["", "", "hn", "dev", "ops", "io", "x", "lab", "bot", "42"]
+
+
+class StoryPage(list):
+    """A page of stories plus the seed its metadata was synthesized from.
+
+    Generated pages also name the prompt variant that wrote them.
+    """
+
+    def __init__(self, stories=(), seed: Optional[int] = None, prompt_variant: Optional[str] = None):
+        super().__init__(stories)
+        self.seed = seed
+        self.prompt_variant = prompt_variant
+
+
+def domain_from_url(url: str) -> str:
+    """Hostname of ``url`` without a leading ``www.``."""
+    host = urlparse(url if "//" in url else f"https://{url}").hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def format_age(hours: float) -> str:
+    if hours < 1:
+        minutes = max(1, int(hours * 60))
+        return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
+    if hours < 24:
+        whole = int(hours)
+        return f"{whole} hour{'s' if whole != 1 else ''} ago"
+    days = int(hours // 24)
+    return f"{days} day{'s' if days != 1 else ''} ago"
+
+
+def _handle(rng: random.Random) -> str:
+    style = rng.random()
+    if style < 0.4:
+        return rng.choice(_HANDLE_WORDS) + rng.choice(_HANDLE_SUFFIXES)
+    if style < 0.7:
+        return f"{rng.choice(_HANDLE_WORDS)}_{rng.choice(_HANDLE_WORDS)}"
+    if style < 0.9:
+        return f"{rng.choice(_HANDLE_WORDS)}{rng.randint(1, 9999)}"
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 7)))
+
+
+def synthesize_columns(count: int, seed: int) -> dict[str, list]:
+    """Generate ``count`` rows of metadata as columns, in front-page order."""
+    rng = random.Random(seed)
+    scores = [
+        min(SCORE_MAX, max(SCORE_MIN, int(rng.lognormvariate(math.log(SCORE_MEDIAN), SCORE_SIGMA))))
+        for _ in range(count)
+    ]
+    ages = [rng.uniform(AGE_MIN_HOURS, AGE_MAX_HOURS) for _ in range(count)]
+    ratios = [rng.lognormvariate(math.log(COMMENT_RATIO_MEDIAN), COMMENT_RATIO_SIGMA) for _ in range(count)]
+    authors = [_handle(rng) for _ in range(count)]
+
+    # Order rows the way the ranking formula would, so the top slot is the
+    # best-ranked (not necessarily highest-scored) story.
+    order = sorted(range(count), key=lambda i: (scores[i] - 1) / (ages[i] + 2) ** GRAVITY, reverse=True)
+    return {
+        "score": [scores[i] for i in order],
+        "age_hours": [ages[i] for i in order],
+        "comment_ratio": [ratios[i] for i in order],
+        "author": [authors[i] for i in order],
+    }
+
+
+def synthesize_metadata(stories: list[dict], seed: int) -> list[dict]:
+    """Fill score, comments, author, time and domain on ``stories`` in place."""
+    columns = synthesize_columns(len(stories), seed)
+    for i, story in enumerate(stories):
+        ratio = columns["comment_ratio"][i]
+        if story.get("title", "").lower().startswith("ask hn"):
+            ratio *= ASK_HN_COMMENT_BOOST
+        story["score"] = columns["score"][i]
+        story["comments"] = int(columns["score"][i] * ratio)
+        story["author"] = columns["author"][i]
+        story["time"] = format_age(columns["age_hours"][i])
+        story["domain"] = domain_from_url(story["url"]) or "example.com"
+    return stories
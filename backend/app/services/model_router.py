@@ -0,0 +1,145 @@
+"""Model routing with per-endpoint health tracking and circuit breaking."""
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import settings
+
+
+@dataclass
+class ModelEndpoint:
+    """One routable model, optionally served by its own proxy."""
+
+    model: str
+    base_url: Optional[str] = None
+    position: int = 0
+
+    # Health state
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    # When the current half-open trial call started, if one is in flight.
+    trial_started: Optional[float] = None
+    latency_ewma: Optional[float] = None
+    successes: int = 0
+    failures: int = 0
+
+    @property
+    def name(self) -> str:
+        return self.model if not self.base_url else f"{self.model}@{self.base_url}"
+
+
+def parse_endpoint(spec: str, position: int = 0) -> ModelEndpoint:
+    """Parse ``model`` or ``model@https://proxy`` into an endpoint."""
+    model, sep, base_url = spec.strip().partition("@")
+    return ModelEndpoint(model=model, base_url=base_url if sep else None, position=position)
+
+
+class ModelRouter:
+    """Pick which model serves a call, skipping endpoints whose circuit is open.
+
+    A circuit opens after ``failure_threshold`` consecutive failures and stays
+    open for ``reset_seconds``; after that a single trial call (half-open) is
+    let through and either closes it again or re-opens it. Callers claim an
+    endpoint with ``begin_call`` before using it; while a trial is in flight
+    other callers skip the endpoint. A trial that never reports back stops
+    blocking it after another ``reset_seconds``.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[ModelEndpoint],
+        routing: Optional[dict] = None,
+        failure_threshold: int = 3,
+        reset_seconds: float = 30.0,
+        latency_alpha: float = 0.3,
+    ):
+        if not endpoints:
+            raise ValueError("At least one model endpoint is required")
+        self.endpoints = endpoints
+        self.routing = routing or {}
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.latency_alpha = latency_alpha
+
+    def _is_half_open(self, endpoint: ModelEndpoint, now: float) -> bool:
+        return endpoint.opened_at is not None and now - endpoint.opened_at >= self.reset_seconds
+
+    def _trial_in_flight(self, endpoint: ModelEndpoint, now: float) -> bool:
+        return endpoint.trial_started is not None and now - endpoint.trial_started < self.reset_seconds
+
+    def _is_available(self, endpoint: ModelEndpoint, now: float) -> bool:
+        if endpoint.opened_at is None:
+            return True
+        return self._is_half_open(endpoint, now) and not self._trial_in_flight(endpoint, now)
+
+    def begin_call(self, endpoint: ModelEndpoint) -> bool:
+        """Claim ``endpoint`` for one call; False if another caller holds its half-open trial."""
+        now = time.monotonic()
+        if not self._is_half_open(endpoint, now):
+            return True
+        if self._trial_in_flight(endpoint, now):
+            return False
+        endpoint.trial_started = now
+        return True
+
+    def candidates(self, purpose: str) -> list[ModelEndpoint]:
+        """Endpoints to try for a call, in order.
+
+        ``priority`` keeps the configured order; ``fastest`` orders healthy
+        endpoints by observed latency (unmeasured ones first so they get
+        sampled). When every circuit is open, the least recently tripped
+        endpoint is returned as a last resort instead of failing outright.
+        """
+        now = time.monotonic()
+        available = [e for e in self.endpoints if self._is_available(e, now)]
+        if not available:
+            return [min(self.endpoints, key=lambda e: e.opened_at)]
+
+        if self.routing.get(purpose, "priority") == "fastest":
+            return sorted(available, key=lambda e: (e.latency_ewma or 0.0, e.position))
+        return available
+
+    def record_success(self, endpoint: ModelEndpoint, latency: float):
+        endpoint.successes += 1
+        endpoint.consecutive_failures = 0
+        endpoint.opened_at = None
+        endpoint.trial_started = None
+        if endpoint.latency_ewma is None:
+            endpoint.latency_ewma = latency
+        else:
+            endpoint.latency_ewma += self.latency_alpha * (latency - endpoint.latency_ewma)
+
+    def record_failure(self, endpoint: ModelEndpoint):
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        endpoint.trial_started = None
+        if endpoint.opened_at is not None or endpoint.consecutive_failures >= self.failure_threshold:
+            # A failed half-open trial re-opens the circuit for another period.
+            endpoint.opened_at = time.monotonic()
+
+    def snapshot(self) -> list[dict]:
+        """Health summary of every endpoint."""
+        now = time.monotonic()
+        return [
+            {
+                "model": e.name,
+                "available": self._is_available(e, now),
+                "latency_ewma": e.latency_ewma,
+                "successes": e.successes,
+                "failures": e.failures,
+            }
+            for e in self.endpoints
+        ]
+
+
+def build_router() -> ModelRouter:
+    specs = settings.LLM_MODELS or [settings.LLM_MODEL]
+    return ModelRouter(
+        endpoints=[parse_endpoint(spec, i) for i, spec in enumerate(specs)],
+        routing=settings.LLM_ROUTING,
+        failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds=settings.LLM_CIRCUIT_RESET_SECONDS,
+    )
+
+
+model_router = build_router()
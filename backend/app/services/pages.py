@@ -0,0 +1,82 @@
+"""Pages callers can come back to by ``page_id``.
+
+/generate stores every page it serves and returns its page_id. /reroll
+edits that page in place, and the details and replies endpoints open its
+stories. Pages live in ``story_pages``, so every replica sees the same
+page under an id; each re-roll keeps a page for another PAGE_TTL_DAYS,
+and maintenance deletes the expired ones.
+"""
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import StoredPage
+from app.services.metadata import StoryPage
+
+
+def _expires_at() -> datetime:
+    return datetime.utcnow() + timedelta(days=settings.PAGE_TTL_DAYS)
+
+
+def save_page(db: AsyncSession, year: int, lang: str, stories: list[dict]) -> str:
+    """Add ``stories`` to the session as a new page; returns its page_id.
+
+    Stored by the caller's next commit.
+    """
+    page_id = secrets.token_urlsafe(12)
+    db.add(StoredPage(
+        page_id=page_id,
+        year=year,
+        lang=lang,
+        stories=list(stories),
+        seed=getattr(stories, "seed", None),
+        prompt_variant=getattr(stories, "prompt_variant", None),
+        expires_at=_expires_at(),
+    ))
+    return page_id
+
+
+async def load_page(
+    db: AsyncSession, year: int, lang: str, page_id: str, for_update: bool = False
+) -> Optional[StoryPage]:
+    """The page stored under ``page_id`` for ``year``/``lang``, if it has not expired.
+
+    ``for_update`` locks the row until the session's transaction ends.
+    """
+    query = select(StoredPage).where(
+        StoredPage.page_id == page_id,
+        StoredPage.year == year,
+        StoredPage.lang == lang,
+        StoredPage.expires_at > datetime.utcnow(),
+    )
+    if for_update:
+        query = query.with_for_update()
+    row = (await db.execute(query.execution_options(populate_existing=True))).scalar_one_or_none()
+    if row is None:
+        return None
+    return StoryPage(row.stories, seed=row.seed, prompt_variant=row.prompt_variant)
+
+
+async def replace_stories(db: AsyncSession, page_id: str, stories: list[dict]):
+    """Store new ``stories`` for an existing page; the caller commits."""
+    await db.execute(
+        update(StoredPage)
+        .where(StoredPage.page_id == page_id)
+        .values(stories=list(stories), expires_at=_expires_at())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def purge_pages_batch(db: AsyncSession, now: datetime, batch_size: int) -> int:
+    """Delete one batch of expired pages."""
+    ids = (await db.execute(
+        select(StoredPage.page_id).where(StoredPage.expires_at <= now).limit(batch_size)
+    )).scalars().all()
+    if ids:
+        await db.execute(delete(StoredPage).where(StoredPage.page_id.in_(ids)))
+        await db.commit()
+    return len(ids)
@@ -0,0 +1,82 @@
+"""Versioned prompt variants and weighted traffic splitting.
+
+Every prompt the LLM service sends is a registered ``PromptVariant``. A
+variant has a purpose ("stories", "details", "replies"), a name and a
+version, and it carries its own template and sampling settings. Changing a
+prompt means registering a new version next to the old one and moving
+traffic with LLM_PROMPT_WEIGHTS, e.g.
+``{"stories": {"compact.v1": 0.9, "compact.v2": 0.1}}``. Per-variant metrics
+(see ``record_prompt_call``) show whether the new version is faster, and
+whether it parses as reliably as the old one.
+"""
+import random
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class PromptVariant:
+    purpose: str
+    name: str
+    version: int
+    build: Callable[..., str]
+    temperature: float
+    # None: the caller sizes the budget (e.g. by story count).
+    max_tokens: Optional[int] = None
+    # Default share of the purpose's traffic, unless LLM_PROMPT_WEIGHTS says otherwise.
+    weight: float = 1.0
+    # Output format the template asks for ("json" or "compact").
+    format: str = "json"
+    # Stream the completion, which makes time-to-first-token observable. The
+    # stories and details variants do; replies are short enough not to.
+    stream: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}.v{self.version}"
+
+
+class PromptRegistry:
+    def __init__(self):
+        self._variants: dict[str, dict[str, PromptVariant]] = {}
+
+    def register(self, variant: PromptVariant) -> PromptVariant:
+        variants = self._variants.setdefault(variant.purpose, {})
+        if variant.key in variants:
+            raise ValueError(f"Prompt variant {variant.purpose}/{variant.key} is already registered")
+        variants[variant.key] = variant
+        return variant
+
+    def variants(self, purpose: str) -> list[PromptVariant]:
+        return list(self._variants.get(purpose, {}).values())
+
+    def get(self, purpose: str, key: str) -> PromptVariant:
+        try:
+            return self._variants[purpose][key]
+        except KeyError:
+            raise KeyError(f"Unknown prompt variant {purpose}/{key}") from None
+
+    def weight(self, variant: PromptVariant) -> float:
+        overrides = settings.LLM_PROMPT_WEIGHTS.get(variant.purpose)
+        if overrides is None:
+            return variant.weight
+        return float(overrides.get(variant.key, 0.0))
+
+    def choose(self, purpose: str, format: Optional[str] = None, rng: random.Random = random) -> PromptVariant:
+        """Pick a variant for one request, in proportion to the weights.
+
+        With ``format``, only variants in that output format are considered,
+        unless none of them has any traffic.
+        """
+        variants = self.variants(purpose)
+        if not variants:
+            raise KeyError(f"No prompt variants registered for {purpose}")
+        weighted = [(v, self.weight(v)) for v in variants]
+        weighted = [(v, w) for v, w in weighted if w > 0] or [(variants[0], 1.0)]
+        if format is not None:
+            weighted = [(v, w) for v, w in weighted if v.format == format] or weighted
+        if len(weighted) == 1:
+            return weighted[0][0]
+        return rng.choices([v for v, _ in weighted], weights=[w for _, w in weighted])[0]
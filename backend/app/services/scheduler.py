@@ -0,0 +1,129 @@
+"""Priority scheduling of LLM calls.
+
+Every completion takes one of LLM_MAX_CONCURRENCY slots. Callers belong to
+one of three classes: paid interactive, free interactive, and background
+work such as prefetch or cache warming. The class comes from the
+``llm_priority`` context variable, which the request or job handler sets
+once, so the LLM helpers below it need no extra parameter.
+
+When a slot frees up, the next waiter is chosen as follows:
+1. A class still running fewer calls than its reserved share
+   (LLM_PRIORITY_SHARES × capacity) goes first.
+2. Otherwise the class with the best score goes first. The score is the
+   class rank plus the age of its oldest waiter divided by
+   LLM_PRIORITY_AGING_SECONDS. An old free or background request
+   eventually outranks fresh paid traffic, so no class starves.
+
+Idle capacity can be borrowed by any class, and running calls are never
+preempted. A capacity of 0 turns the limit off.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import Context, ContextVar
+from typing import Iterable
+
+from app.core.config import settings
+from app.core.metrics import record_llm_queue_wait
+
+PRIORITY_CLASSES = ("paid", "free", "background")
+_RANK = {"paid": 2, "free": 1, "background": 0}
+
+llm_priority: ContextVar[str] = ContextVar("llm_priority", default="free")
+
+
+@contextmanager
+def priority_class(name: str):
+    """Run LLM calls made inside the block under priority class ``name``."""
+    token = llm_priority.set(name)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+def shared_priority_context(contexts: Iterable[Context]) -> Context:
+    """A fresh context under the highest priority class among ``contexts``.
+
+    For work done on behalf of several callers at once, such as a batched
+    completion, so it waits no longer than its most urgent caller would.
+    """
+    names = [ctx.get(llm_priority, "free") for ctx in contexts]
+    context = Context()
+    context.run(llm_priority.set, max(names, key=lambda name: _RANK.get(name, _RANK["free"]), default="free"))
+    return context
+
+
+class PriorityScheduler:
+    def __init__(self, capacity: int, shares: dict[str, float], aging_seconds: float):
+        self.capacity = capacity
+        self.aging_seconds = aging_seconds
+        self.reserved = {c: max(1, int(capacity * shares.get(c, 0))) for c in PRIORITY_CLASSES}
+        self.running = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._in_use = 0
+        self._queues: dict[str, deque[tuple[float, asyncio.Future]]] = {c: deque() for c in PRIORITY_CLASSES}
+
+    @asynccontextmanager
+    async def slot(self, name: str | None = None):
+        name = name or llm_priority.get()
+        if name not in _RANK:
+            name = "free"
+        record_llm_queue_wait(name, await self._acquire(name))
+        try:
+            yield
+        finally:
+            self._release(name)
+
+    async def _acquire(self, name: str) -> float:
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._queues[name].append((started, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up: hand the slot on.
+                self._release(name)
+            raise
+        return time.monotonic() - started
+
+    def _grant(self, name: str):
+        self.running[name] += 1
+        self._in_use += 1
+
+    def _release(self, name: str):
+        self.running[name] -= 1
+        self._in_use -= 1
+        self._dispatch()
+
+    def _pick(self) -> str | None:
+        for queue in self._queues.values():
+            while queue and queue[0][1].done():
+                queue.popleft()
+        waiting = [c for c in PRIORITY_CLASSES if self._queues[c]]
+        if not waiting:
+            return None
+        starved = [c for c in waiting if self.running[c] < self.reserved[c]]
+        now = time.monotonic()
+        return max(
+            starved or waiting,
+            key=lambda c: _RANK[c] + (now - self._queues[c][0][0]) / self.aging_seconds,
+        )
+
+    def _dispatch(self):
+        while self.capacity <= 0 or self._in_use < self.capacity:
+            name = self._pick()
+            if name is None:
+                return
+            _, future = self._queues[name].popleft()
+            self._grant(name)
+            future.set_result(None)
+
+
+llm_scheduler = PriorityScheduler(
+    settings.LLM_MAX_CONCURRENCY,
+    settings.LLM_PRIORITY_SHARES,
+    settings.LLM_PRIORITY_AGING_SECONDS,
+)
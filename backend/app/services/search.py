@@ -0,0 +1,257 @@
+"""Full-text search over generated stories and their detail summaries.
+
+Two backends share one interface: a Postgres backend over the
+``generated_stories`` table with a GIN-indexed ``tsvector`` expression (the
+default on Postgres), and an in-process inverted index for SQLite and test
+runs. Both match CJK text on character bigrams, since it has no spaces
+between words.
+Both return newest matches first and paginate with a keyset cursor (the
+last returned document id), so deep pages cost the same as the first.
+"""
+import logging
+import re
+from array import array
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models import GeneratedStory
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+SNIPPET_CHARS = 200
+
+
+def _bigrams(word: str) -> list[str]:
+    if _CJK_RE.search(word) and len(word) > 1:
+        return [word[i:i + 2] for i in range(len(word) - 1)]
+    return [word]
+
+
+def tokenize(value: str) -> list[str]:
+    """Lowercased word tokens; runs of CJK text become character bigrams."""
+    return [token for word in _WORD_RE.findall(value.lower()) for token in _bigrams(word)]
+
+
+def cjk_bigrams(value: str) -> str:
+    """``value`` with each run of CJK text spelled out as its bigrams.
+
+    Postgres' parser keeps a CJK run as a single word, so stored text and
+    queries both go through this to match the way ``tokenize`` does.
+    Everything else, websearch syntax included, is left as it is.
+    """
+    return _WORD_RE.sub(lambda m: " ".join(_bigrams(m.group(0))), value)
+
+
+def _year_term(year: int) -> str:
+    return f"\x00y{year}"
+
+
+def _lang_term(lang: str) -> str:
+    return f"\x00l{lang}"
+
+
+@dataclass
+class SearchHit:
+    doc_id: int
+    year: int
+    lang: str
+    story_id: int
+    title: str
+    url: str
+    summary: Optional[str]
+
+    def to_dict(self) -> dict:
+        return {
+            "year": self.year,
+            "lang": self.lang,
+            "story_id": self.story_id,
+            "title": self.title,
+            "url": self.url,
+            "summary": self.summary[:SNIPPET_CHARS] if self.summary else None,
+        }
+
+
+class InMemorySearchIndex:
+    """Inverted index with sorted integer postings.
+
+    Year and language filters are indexed as pseudo-terms, so a filtered
+    query is just an intersection driven by the shortest postings list.
+    """
+
+    def __init__(self):
+        self._docs: list[SearchHit] = []
+        self._postings: dict[str, array] = {}
+        self._by_title: dict[tuple[int, str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _index(self, doc_id: int, terms):
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if postings is None:
+                self._postings[term] = array("q", [doc_id])
+            elif postings[-1] < doc_id:
+                postings.append(doc_id)
+            else:
+                i = bisect_left(postings, doc_id)
+                if i == len(postings) or postings[i] != doc_id:
+                    insort(postings, doc_id)
+
+    def add_story(self, year: int, lang: str, story: dict) -> int:
+        doc_id = len(self._docs)
+        title = story.get("title", "")
+        self._docs.append(SearchHit(doc_id, year, lang, story.get("id", 0), title, story.get("url", ""), None))
+        self._by_title[(year, lang, title)] = doc_id
+        self._index(doc_id, [*tokenize(title), _year_term(year), _lang_term(lang)])
+        return doc_id
+
+    async def add_page(self, year: int, lang: str, stories: list[dict]):
+        for story in stories:
+            self.add_story(year, lang, story)
+
+    async def add_summary(self, year: int, lang: str, story: dict, summary: str):
+        doc_id = self._by_title.get((year, lang, story.get("title", "")))
+        if doc_id is None:
+            return
+        self._docs[doc_id].summary = summary
+        self._index(doc_id, tokenize(summary))
+
+    async def search(
+        self,
+        query: str,
+        year: Optional[int] = None,
+        lang: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = 20,
+    ) -> tuple[list[SearchHit], Optional[int]]:
+        terms = set(tokenize(query))
+        if not terms:
+            return [], None
+        if year is not None:
+            terms.add(_year_term(year))
+        if lang is not None:
+            terms.add(_lang_term(lang))
+
+        lists = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                return [], None
+            lists.append(postings)
+        lists.sort(key=len)
+        driver, others = lists[0], lists[1:]
+
+        hits = []
+        i = bisect_left(driver, cursor) - 1 if cursor is not None else len(driver) - 1
+        while i >= 0 and len(hits) <= limit:
+            doc_id = driver[i]
+            i -= 1
+            if all(_contains(other, doc_id) for other in others):
+                hits.append(self._docs[doc_id])
+
+        next_cursor = hits[limit - 1].doc_id if len(hits) > limit else None
+        return hits[:limit], next_cursor
+
+
+def _contains(postings: array, doc_id: int) -> bool:
+    i = bisect_left(postings, doc_id)
+    return i < len(postings) and postings[i] == doc_id
+
+
+class PostgresSearchIndex:
+    """Search over ``generated_stories`` using its GIN tsvector index."""
+
+    async def add_page(self, year: int, lang: str, stories: list[dict]):
+        async with async_session() as db:
+            db.add_all(
+                GeneratedStory(year=year, lang=lang, story_id=s.get("id", 0),
+                               title=s.get("title", ""), url=s.get("url", ""),
+                               search_text=cjk_bigrams(s.get("title", "")))
+                for s in stories
+            )
+            await db.commit()
+
+    async def add_summary(self, year: int, lang: str, story: dict, summary: str):
+        title = story.get("title", "")
+        async with async_session() as db:
+            await db.execute(
+                update(GeneratedStory)
+                .where(
+                    GeneratedStory.year == year,
+                    GeneratedStory.lang == lang,
+                    GeneratedStory.title == title,
+                    GeneratedStory.summary.is_(None),
+                )
+                .values(summary=summary, search_text=cjk_bigrams(f"{title} {summary}"))
+            )
+            await db.commit()
+
+    async def search(
+        self,
+        query: str,
+        year: Optional[int] = None,
+        lang: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = 20,
+    ) -> tuple[list[SearchHit], Optional[int]]:
+        matches = text(f"{GeneratedStory.SEARCH_VECTOR} @@ websearch_to_tsquery('simple', :q)")
+        stmt = (
+            select(GeneratedStory)
+            .where(matches.bindparams(q=cjk_bigrams(query)))
+            .order_by(GeneratedStory.id.desc())
+            .limit(limit + 1)
+        )
+        if year is not None:
+            stmt = stmt.where(GeneratedStory.year == year)
+        if lang is not None:
+            stmt = stmt.where(GeneratedStory.lang == lang)
+        if cursor is not None:
+            stmt = stmt.where(GeneratedStory.id < cursor)
+
+        async with async_session() as db:
+            rows = (await db.execute(stmt)).scalars().all()
+
+        hits = [SearchHit(r.id, r.year, r.lang, r.story_id, r.title, r.url, r.summary) for r in rows]
+        next_cursor = hits[limit - 1].doc_id if len(hits) > limit else None
+        return hits[:limit], next_cursor
+
+
+def search_backend() -> str:
+    """SEARCH_BACKEND, defaulting to the backend that matches DATABASE_URL."""
+    if settings.SEARCH_BACKEND:
+        return settings.SEARCH_BACKEND
+    return "postgres" if make_url(settings.DATABASE_URL).get_backend_name() == "postgresql" else "memory"
+
+
+def build_search_index():
+    if search_backend() == "postgres":
+        return PostgresSearchIndex()
+    return InMemorySearchIndex()
+
+
+search_index = build_search_index()
+
+
+async def index_page(year: int, lang: str, stories: list[dict]):
+    """Index a generated page; indexing failures never fail the request."""
+    try:
+        await search_index.add_page(year, lang, stories)
+    except Exception:
+        logger.exception("Failed to index generated stories")
+
+
+async def index_summary(year: int, lang: str, story: dict, summary: str):
+    try:
+        await search_index.add_summary(year, lang, story, summary)
+    except Exception:
+        logger.exception("Failed to index story summary")
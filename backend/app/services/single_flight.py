@@ -0,0 +1,239 @@
+"""Deduplication of identical expensive work across requests and replicas.
+
+``single_flight.run(key, call)`` runs ``call`` once per key at a time.
+Callers in the same process that arrive while it runs share its result.
+
+With SINGLE_FLIGHT_BACKEND=postgres, replicas coordinate as well. The node
+that takes the key's session-level advisory lock runs the work. It stores
+the result in ``single_flight_results`` for SINGLE_FLIGHT_RESULT_TTL_SECONDS
+and then releases the lock. The other nodes poll for the stored result.
+If the leader dies, Postgres drops its lock with its connection, and the
+next poller takes the lock and runs the work itself. A caller that has
+waited SINGLE_FLIGHT_TIMEOUT_SECONDS gives up and runs the work itself.
+So does one that finds every lock connection taken for a poll interval:
+the request is served without cross-replica deduplication rather than
+failed.
+
+Each caller's outcome is counted per kind of work (the key's prefix before
+the first ":"): led, waited, stored (the result was already there),
+timeout or unlocked (no lock connection was free).
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.metrics import record_single_flight
+from app.models import SingleFlightResult
+
+logger = logging.getLogger(__name__)
+
+Work = Callable[[], Awaitable[Any]]
+
+
+def advisory_lock_id(key: str) -> int:
+    """Signed 64-bit advisory lock id for ``key``."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def result_key(key: str) -> str:
+    """Primary key of ``key``'s stored result; keys of any length hash to 64 characters."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def lock_connections() -> int:
+    """Size of the advisory-lock pool (SINGLE_FLIGHT_LOCK_CONNECTIONS, 0 = derived).
+
+    Leaders hold a connection while their call waits for and then uses an LLM
+    slot, so the default covers LLM_MAX_CONCURRENCY calls running and as many
+    queued; pollers only borrow one for a moment.
+    """
+    if settings.SINGLE_FLIGHT_LOCK_CONNECTIONS > 0:
+        return settings.SINGLE_FLIGHT_LOCK_CONNECTIONS
+    return 2 * (settings.LLM_MAX_CONCURRENCY or 16)
+
+
+class LocalSingleFlight:
+    """Deduplicates within this process only."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    async def run(self, key: str, call: Work):
+        kind = key.partition(":")[0]
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(self._lead(key, call))
+            task.add_done_callback(lambda done: self._forget(key, done))
+            # The work outlives a cancelled first caller, as it does for the others.
+            result, outcome = await asyncio.shield(task)
+            record_single_flight(kind, outcome)
+            return result
+        try:
+            result, _ = await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            record_single_flight(kind, "timeout")
+            return await call()
+        record_single_flight(kind, "waited")
+        return result
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Every caller may have stopped waiting; don't warn about it.
+            task.exception()
+
+    async def _lead(self, key: str, call: Work) -> tuple[Any, str]:
+        return await call(), "led"
+
+    async def stored(self, key: str) -> Optional[Any]:
+        """The result another replica stored for ``key``, without running anything."""
+        return None
+
+    async def close(self):
+        pass
+
+
+class PostgresSingleFlight(LocalSingleFlight):
+    """Also deduplicates across processes, through Postgres advisory locks."""
+
+    def __init__(
+        self,
+        timeout: float,
+        ttl: float,
+        poll: float,
+        session_factory=async_session,
+        lock_engine: Optional[AsyncEngine] = None,
+    ):
+        super().__init__(timeout)
+        self.ttl = ttl
+        self.poll = poll
+        self.session_factory = session_factory
+        self._lock_engine = lock_engine
+
+    @property
+    def lock_engine(self) -> AsyncEngine:
+        # A lock is held for as long as the work runs, so locks get their own
+        # connections instead of tying up the request pool. Autocommit keeps
+        # those connections from sitting idle in a transaction. Checkout waits
+        # one poll interval at most; see _lead.
+        if self._lock_engine is None:
+            self._lock_engine = create_async_engine(
+                settings.DATABASE_URL,
+                isolation_level="AUTOCOMMIT",
+                pool_size=lock_connections(),
+                max_overflow=0,
+                pool_timeout=self.poll,
+            )
+        return self._lock_engine
+
+    async def _load(self, key: str):
+        async with self.session_factory() as db:
+            return (await db.execute(
+                select(SingleFlightResult.result).where(
+                    SingleFlightResult.key == result_key(key),
+                    SingleFlightResult.expires_at > datetime.utcnow(),
+                )
+            )).first()
+
+    async def stored(self, key: str) -> Optional[Any]:
+        row = await self._load(key)
+        return row.result if row is not None else None
+
+    async def _store(self, key: str, result):
+        now = datetime.utcnow()
+        values = {"result": result, "created_at": now, "expires_at": now + timedelta(seconds=self.ttl)}
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    pg_insert(SingleFlightResult)
+                    .values(key=result_key(key), **values)
+                    .on_conflict_do_update(index_elements=[SingleFlightResult.key], set_=values)
+                )
+                await db.commit()
+        except Exception:
+            # The leader still has its result; waiters will time out or retry.
+            logger.exception("Could not store the single-flight result for %s", key)
+
+    async def _unlock(self, conn, lock_id: int):
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+        except Exception:
+            # A connection that may still hold the lock must not be reused.
+            logger.exception("Could not release advisory lock %d", lock_id)
+            await conn.invalidate()
+
+    async def _lead(self, key: str, call: Work) -> tuple[Any, str]:
+        lock_id = advisory_lock_id(key)
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            stored = await self._load(key)
+            if stored is not None:
+                return stored.result, "waited" if waited else "stored"
+            try:
+                conn = await self.lock_engine.connect()
+            except PoolTimeout:
+                # Every lock connection is held by other work. Doing this work
+                # here too beats failing the request.
+                logger.warning("No single-flight lock connection free for %s; running it unlocked", key)
+                return await call(), "unlocked"
+            try:
+                locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id})).scalar()
+                if locked:
+                    try:
+                        # The previous holder may have stored its result since the check above.
+                        stored = await self._load(key)
+                        if stored is not None:
+                            return stored.result, "waited" if waited else "stored"
+                        result = await call()
+                        await self._store(key, result)
+                        return result, "led"
+                    finally:
+                        await self._unlock(conn, lock_id)
+            finally:
+                await conn.close()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return await call(), "timeout"
+            waited = True
+            await asyncio.sleep(min(self.poll, remaining))
+
+    async def close(self):
+        if self._lock_engine is not None:
+            await self._lock_engine.dispose()
+
+
+async def purge_single_flight_batch(db: AsyncSession, now: datetime, batch_size: int) -> int:
+    """Delete one batch of expired stored results."""
+    keys = (await db.execute(
+        select(SingleFlightResult.key).where(SingleFlightResult.expires_at <= now).limit(batch_size)
+    )).scalars().all()
+    if keys:
+        await db.execute(delete(SingleFlightResult).where(SingleFlightResult.key.in_(keys)))
+        await db.commit()
+    return len(keys)
+
+
+def build_single_flight() -> LocalSingleFlight:
+    if settings.SINGLE_FLIGHT_BACKEND == "postgres":
+        return PostgresSingleFlight(
+            settings.SINGLE_FLIGHT_TIMEOUT_SECONDS,
+            settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS,
+            settings.SINGLE_FLIGHT_POLL_SECONDS,
+        )
+    return LocalSingleFlight(settings.SINGLE_FLIGHT_TIMEOUT_SECONDS)
+
+
+single_flight = build_single_flight()
@@ -0,0 +1,48 @@
+"""Comment trees of story details.
+
+Every comment gets a path id: "2" is the second top-level comment and
+"2.1" is the first reply to it. A comment's ``replies`` list exists only
+once its thread has been expanded; ``expansions`` counts the batches of
+replies generated under it.
+"""
+from typing import Optional
+
+# Comments this deep ("1.1.1.1.1.1") get no further replies.
+MAX_THREAD_DEPTH = 6
+
+
+def number_comments(comments: list[dict], prefix: str = "", start: int = 1):
+    """Assign path ids to ``comments`` and any replies already attached."""
+    for n, comment in enumerate(comments, start=start):
+        comment["id"] = f"{prefix}{n}"
+        if isinstance(comment.get("replies"), list):
+            number_comments(comment["replies"], f"{comment['id']}.")
+
+
+def find_thread(comments: list[dict], comment_id: str) -> Optional[list[dict]]:
+    """The chain of comments from the top level down to ``comment_id``."""
+    thread = []
+    level = comments
+    for part in comment_id.split("."):
+        index = int(part) - 1
+        if not isinstance(level, list) or not 0 <= index < len(level):
+            return None
+        thread.append(level[index])
+        level = level[index].get("replies")
+    return thread
+
+
+def expansions(comment: dict) -> int:
+    """Reply batches generated under ``comment``; older trees count as one."""
+    if not isinstance(comment.get("replies"), list):
+        return 0
+    return comment.get("expansions") or 1
+
+
+def attach_replies(comment: dict, replies: list[dict]):
+    """Add a batch of replies under ``comment``, after any it already has."""
+    existing = comment.get("replies") if isinstance(comment.get("replies"), list) else []
+    number_comments(replies, f"{comment['id']}.", start=len(existing) + 1)
+    comment["expansions"] = expansions(comment) + 1
+    comment["replies"] = existing + replies
+    comment["reply_count"] = max(len(comment["replies"]), comment.get("reply_count") or 0)
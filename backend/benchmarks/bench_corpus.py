@@ -0,0 +1,75 @@
+"""Remix page assembly time against a large story corpus.
+
+Loads N synthetic stories into one (year, lang) bucket, then times
+``StoryCorpus.remix`` and, separately, deduplicated page insertion.
+
+Usage (from backend/):
+    python -m benchmarks.bench_corpus --stories 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from app.services.corpus import StoryCorpus
+
+WORDS = (
+    "quantum kernel fusion startup privacy compiler satellite battery robot browser database protocol "
+    "garden ledger vaccine railway keyboard orbit neural open source rust agent model launch court "
+    "climate mars genome telescope ipo funding release linux python postgres"
+).split()
+
+
+def _title(rng: random.Random) -> str:
+    prefix = rng.choice(["", "", "", "Show HN: ", "Ask HN: "])
+    return prefix + " ".join(rng.choice(WORDS) for _ in range(6)) + f" {rng.getrandbits(32):x}"
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stories", type=int, default=1_000_000)
+    parser.add_argument("--pages", type=int, default=2000, help="remixed pages to time")
+    parser.add_argument("--insert-pages", type=int, default=200, help="deduplicated 30-story pages to time")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    corpus = StoryCorpus()
+
+    started = time.perf_counter()
+    for i in range(args.stories):
+        # Bulk load skips dedupe; the insert timing below measures it separately.
+        corpus.add(2035, "en", _title(rng), f"https://s{i}.dev", dedupe=False)
+    print(f"loaded {len(corpus):,} stories in {time.perf_counter() - started:.1f}s")
+
+    timings = []
+    for seed in range(args.pages):
+        started = time.perf_counter()
+        page = corpus.remix(2035, "en", seed=seed)
+        timings.append(time.perf_counter() - started)
+        assert len(page) == 30
+    print(f"remix x{args.pages}: p50={statistics.median(timings) * 1e3:.2f}ms "
+          f"p99={_percentile(timings, 0.99) * 1e3:.2f}ms max={max(timings) * 1e3:.2f}ms")
+
+    timings = asyncio.run(_time_inserts(corpus, rng, args.insert_pages))
+    print(f"deduplicated add_page x{args.insert_pages}: p50={statistics.median(timings) * 1e3:.2f}ms "
+          f"p99={_percentile(timings, 0.99) * 1e3:.2f}ms")
+
+
+async def _time_inserts(corpus: StoryCorpus, rng: random.Random, pages: int) -> list[float]:
+    timings = []
+    for _ in range(pages):
+        page = [{"title": _title(rng), "url": "https://x.dev"} for _ in range(30)]
+        started = time.perf_counter()
+        await corpus.add_page(2036, "en", page)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Offline replay of prompt variants against the fake LLM server.
+
+Starts benchmarks.fake_llm on a local port and points the LLM service at
+it. For each registered variant of a purpose, it sends the same requests
+through the real service code with all traffic pinned to that variant.
+It then prints, per variant, the numbers production reports: output tokens,
+time to first token, latency, parse-failure rate and, for stories, stories
+per response. These are read back from the Prometheus metrics.
+
+Usage (from backend/):
+    python -m benchmarks.bench_prompts --purpose stories --requests 20
+    python -m benchmarks.bench_prompts --purpose details --tps 80 --malformed 0.05
+
+Variants run streamed (--no-stream to send them as configured), so time to
+first token is always measured. The model's speed is the fake server's
+serving model; see fake_llm.py for the knobs.
+"""
+import argparse
+import asyncio
+import dataclasses
+import random
+import socket
+import statistics
+import time
+from unittest.mock import patch
+
+import uvicorn
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.core.metrics import TOOL_SLUG
+from app.services import llm
+from benchmarks import fake_llm
+
+LANGS = ["en", "zh", "ja", "de", "fr", "ko", "es"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, {"tool": TOOL_SLUG, **labels}) or 0.0
+
+
+def _mean(name: str, **labels) -> float | None:
+    count = _sample(f"{name}_count", **labels)
+    return _sample(f"{name}_sum", **labels) / count if count else None
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _call(purpose: str, rng: random.Random):
+    year, lang = rng.randint(2030, 2040), rng.choice(LANGS)
+    story = {"id": 1, "title": f"Fusion plant number {rng.randint(1, 99)} goes online", "url": "https://f.dev"}
+    if purpose == "stories":
+        return llm.generate_stories(year, lang)
+    if purpose == "details":
+        return llm._generate_single_details(story)
+    thread = [{"author": "a", "text": "Finally."}, {"author": "b", "text": "Every decade, finally."}]
+    return llm.generate_comment_replies(story, "A plant reached net output.", thread, settings.LLM_REPLIES_PER_EXPAND)
+
+
+async def _replay(variant, requests: int) -> dict:
+    purpose, key = variant.purpose, variant.key
+    latencies = []
+    rng = random.Random(1)
+    with patch.object(llm.prompt_registry, "choose", return_value=variant):
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                await _call(purpose, rng)
+            except ValueError:
+                # Counted as a parse failure; the row shows the rate.
+                pass
+            latencies.append(time.perf_counter() - started)
+
+    labels = {"purpose": purpose, "variant": key}
+    ok = _sample("llm_prompt_calls_total", outcome="ok", **labels)
+    parse_errors = _sample("llm_prompt_calls_total", outcome="parse_error", **labels)
+    return {
+        "calls": ok + parse_errors,
+        "parse_fail": parse_errors / (ok + parse_errors) if ok + parse_errors else 0.0,
+        "tokens": _mean("llm_prompt_output_tokens", **labels),
+        "ttft": _mean("llm_prompt_ttft_seconds", **labels),
+        "p50": statistics.median(latencies),
+        "p99": _percentile(latencies, 0.99),
+        "stories": _mean("llm_prompt_stories_returned", variant=key) if purpose == "stories" else None,
+    }
+
+
+def _fmt(value, spec: str, unit: str = "") -> str:
+    return "-" if value is None else format(value, spec) + unit
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--purpose", choices=["stories", "details", "replies"], default="stories")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--no-stream", action="store_true", help="send variants as configured")
+    fake_llm.add_arguments(parser)
+    args = parser.parse_args()
+
+    port = _free_port()
+    app = fake_llm.create_app(args.ttft, args.prefill_tps, args.tps, args.malformed, args.seed)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    settings.LLM_PROXY_URL = f"http://127.0.0.1:{port}/v1"
+    settings.LLM_PROXY_KEY = "fake"
+    results = {}
+    try:
+        for variant in llm.prompt_registry.variants(args.purpose):
+            if not args.no_stream:
+                variant = dataclasses.replace(variant, stream=True)
+            results[variant.key] = await _replay(variant, args.requests)
+    finally:
+        server.should_exit = True
+        await serving
+
+    print(f"{'variant':<20}{'calls':>6}{'parse fail':>12}{'out tokens':>12}{'ttft':>9}"
+          f"{'p50':>9}{'p99':>9}{'stories':>9}")
+    for key, r in results.items():
+        print(f"{key:<20}{r['calls']:>6.0f}{r['parse_fail']:>12.1%}{_fmt(r['tokens'], '.0f'):>12}"
+              f"{_fmt(r['ttft'], '.2f', 's'):>9}{r['p50']:>8.2f}s{r['p99']:>8.2f}s{_fmt(r['stories'], '.1f'):>9}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""Story search latency at scale.
+
+Indexes N synthetic stories (titles for all, summaries for a fraction)
+across every year and language, then times a mix of queries: single and
+multi-term, with and without year/lang filters, and a deep keyset page.
+
+Usage (from backend/):
+    python -m benchmarks.bench_search --stories 1000000
+
+With --postgres the same queries run against generated_stories through the
+tsvector/GIN backend. DATABASE_URL must point at a Postgres; add
+--seed-postgres once to create and fill generated_stories:
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_search \
+        --postgres --seed-postgres --stories 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import insert, text
+
+from app.core.database import Base, engine
+from app.models import GeneratedStory
+from app.services.search import InMemorySearchIndex, PostgresSearchIndex
+
+LANGS = ["en", "zh", "ja", "de", "fr", "ko", "es"]
+COMMON = "ai model open source startup launch new the of for with in".split()
+TOPICAL = (
+    "fusion quantum kernel rust compiler satellite battery robot browser database protocol vaccine "
+    "railway keyboard orbit neural genome telescope climate mars privacy ledger garden reactor tokamak "
+    "superconductor exoplanet lidar drone wasm postgres linux python"
+).split()
+
+QUERIES = [
+    ("fusion", {}),
+    ("fusion", {"year": 2037}),
+    ("fusion reactor", {"year": 2037, "lang": "en"}),
+    ("ai", {}),
+    ("ai model", {"lang": "en"}),
+    ("open source", {"year": 2033}),
+    ("tokamak exoplanet", {}),
+    ("quantum", {"year": 2040, "lang": "ko"}),
+]
+
+
+def _title(rng: random.Random) -> str:
+    words = rng.sample(TOPICAL, 2) + rng.sample(COMMON, 3)
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _fill_memory(index: InMemorySearchIndex, stories: int, summary_ratio: float):
+    rng = random.Random(1)
+    for i in range(stories):
+        year, lang = rng.randint(2030, 2040), rng.choice(LANGS)
+        story = {"id": i % 30 + 1, "title": _title(rng), "url": f"https://s{i}.dev"}
+        index.add_story(year, lang, story)
+        if rng.random() < summary_ratio:
+            summary = " ".join(rng.choice(TOPICAL + COMMON) for _ in range(40))
+            await index.add_summary(year, lang, story, summary)
+
+
+async def _seed_postgres(stories: int, summary_ratio: float):
+    """Create generated_stories if needed and fill it in bulk."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[GeneratedStory.__table__])
+    rng = random.Random(1)
+    batch = 10_000
+    for start in range(0, stories, batch):
+        rows = []
+        for i in range(start, min(start + batch, stories)):
+            rows.append({
+                "year": rng.randint(2030, 2040),
+                "lang": rng.choice(LANGS),
+                "story_id": i % 30 + 1,
+                "title": _title(rng),
+                "url": f"https://s{i}.dev",
+                "summary": " ".join(rng.choice(TOPICAL + COMMON) for _ in range(40))
+                if rng.random() < summary_ratio else None,
+            })
+        async with engine.begin() as conn:
+            await conn.execute(insert(GeneratedStory), rows)
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE generated_stories"))
+
+
+async def _run_queries(index, repeat: int):
+    all_timings = []
+    for query, filters in QUERIES:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hits, cursor = await index.search(query, limit=20, **filters)
+            timings.append(time.perf_counter() - started)
+        # One deep page via the keyset cursor.
+        for _ in range(5):
+            if cursor is None:
+                break
+            started = time.perf_counter()
+            hits, cursor = await index.search(query, limit=20, cursor=cursor, **filters)
+            timings.append(time.perf_counter() - started)
+        all_timings.extend(timings)
+        label = f"{query!r} {filters or ''}"
+        print(f"{label:<48} p50={statistics.median(timings) * 1e3:6.2f}ms "
+              f"p95={_percentile(timings, 0.95) * 1e3:6.2f}ms")
+    print(f"{'all queries':<48} p50={statistics.median(all_timings) * 1e3:6.2f}ms "
+          f"p95={_percentile(all_timings, 0.95) * 1e3:6.2f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stories", type=int, default=1_000_000)
+    parser.add_argument("--summary-ratio", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--postgres", action="store_true")
+    parser.add_argument("--seed-postgres", action="store_true")
+    args = parser.parse_args()
+
+    if args.postgres:
+        if args.seed_postgres:
+            started = time.perf_counter()
+            await _seed_postgres(args.stories, args.summary_ratio)
+            print(f"seeded {args.stories:,} stories in {time.perf_counter() - started:.1f}s")
+        index = PostgresSearchIndex()
+    else:
+        index = InMemorySearchIndex()
+        started = time.perf_counter()
+        await _fill_memory(index, args.stories, args.summary_ratio)
+        print(f"indexed {len(index):,} stories in {time.perf_counter() - started:.1f}s")
+
+    await _run_queries(index, args.repeat)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
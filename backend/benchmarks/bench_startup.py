@@ -0,0 +1,94 @@
+"""Import time and time-to-ready of the backend.
+
+Import time: ``import app.main`` in a fresh interpreter, N times.
+Time-to-ready: start uvicorn in a subprocess and poll /health and /ready
+until each first succeeds.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_startup --runs 5
+
+Without DATABASE_URL a throwaway SQLite file is used. The LLM proxy is
+pointed at a closed local port unless LLM_PROXY_URL is set, so the LLM
+warm-up step fails fast instead of depending on the network.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+
+def _import_time(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, deadline: float) -> float | None:
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.monotonic()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def _time_to_ready(env: dict, timeout: float) -> tuple[float, float]:
+    port = _free_port()
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = started + timeout
+        live = _wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        ready = _wait_for(f"http://127.0.0.1:{port}/ready", deadline)
+        if live is None or ready is None:
+            raise RuntimeError("server did not become ready in time")
+        return live - started, ready - started
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    tmpdir = tempfile.mkdtemp()
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tmpdir}/startup.db")
+    env.setdefault("LLM_PROXY_URL", "http://127.0.0.1:9")
+
+    imports = [_import_time(env) for _ in range(args.runs)]
+    print(f"import app.main: p50={statistics.median(imports) * 1e3:.0f}ms min={min(imports) * 1e3:.0f}ms")
+
+    for create_schema in ("true", "false"):
+        env["DB_CREATE_SCHEMA"] = create_schema
+        results = [_time_to_ready(env, args.timeout) for _ in range(args.runs)]
+        live = statistics.median(r[0] for r in results)
+        ready = statistics.median(r[1] for r in results)
+        print(f"DB_CREATE_SCHEMA={create_schema}: /health after {live * 1e3:.0f}ms, "
+              f"/ready after {ready * 1e3:.0f}ms (median of {args.runs})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare output tokens and estimated generation latency of the story formats.
+
+Replays stories responses in the legacy JSON format, re-encodes each one in
+the compact format (all fields, and only the title/url columns the model
+writes now that metadata is synthesized server-side), and reports output
+tokens, the estimated decode time at a given generation speed, and parse
+time for each.
+
+Usage (from backend/):
+    python -m benchmarks.bench_wire_format
+    python -m benchmarks.bench_wire_format --responses my_responses.json --tokens-per-second 180
+
+The responses file is a JSON list of {"year", "lang", "content"} objects,
+where content is the raw completion text. Token counts use tiktoken's
+o200k_base encoding when it is installed and a ~4 chars/token estimate
+otherwise.
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from app.services.llm import JSON_STORIES_MAX_TOKENS, LLM_STORY_FIELDS, STORIES_PER_PAGE, _extract_json
+from app.services.wire import STORY_FIELDS, decode_compact, encode_compact, story_token_budget
+
+FIXTURE = Path(__file__).parent / "fixtures" / "stories_responses.json"
+
+
+def _token_counter():
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken/o200k_base"
+    except ImportError:
+        return lambda text: max(1, round(len(text.encode("utf-8")) / 4)), "approx (4 bytes/token)"
+
+
+def _time_parse(fn, text: str, repeat: int = 200) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=Path, default=FIXTURE)
+    parser.add_argument("--tokens-per-second", type=float, default=150.0,
+                        help="model decode speed used to estimate generation time")
+    args = parser.parse_args()
+
+    count_tokens, counter_name = _token_counter()
+    responses = json.loads(args.responses.read_text())
+
+    formats = {
+        "json": (None, _extract_json, JSON_STORIES_MAX_TOKENS),
+        "compact/all": (STORY_FIELDS, decode_compact, story_token_budget(STORIES_PER_PAGE, STORY_FIELDS)),
+        "compact/title+url": (LLM_STORY_FIELDS, decode_compact,
+                              story_token_budget(STORIES_PER_PAGE, LLM_STORY_FIELDS)),
+    }
+
+    print(f"token counter: {counter_name}, decode speed: {args.tokens_per_second:.0f} tok/s")
+    print(f"{'response':<12}{'format':<20}{'max_tokens':>11}{'tokens':>8}{'saved':>8}{'gen s':>8}{'parse µs':>10}")
+    savings = {name: [] for name in formats}
+    for response in responses:
+        label = f"{response['year']}/{response['lang']}"
+        stories = _extract_json(response["content"])
+        baseline = count_tokens(response["content"])
+        for name, (fields, parse, budget) in formats.items():
+            text = response["content"] if fields is None else encode_compact(stories, fields)
+            assert len(parse(text)) == len(stories)
+            tokens = count_tokens(text)
+            savings[name].append(1 - tokens / baseline)
+            print(f"{label:<12}{name:<20}{budget:>11}{tokens:>8}{1 - tokens / baseline:>8.0%}"
+                  f"{tokens / args.tokens_per_second:>8.1f}{_time_parse(parse, text) * 1e6:>10.0f}")
+
+    for name, values in savings.items():
+        print(f"median saving {name}: {statistics.median(values):.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""OpenAI-compatible fake LLM server for offline benchmarks.
+
+Answers ``/v1/chat/completions``, streamed or not, with synthetic but
+well-formed answers to the app's prompts. It recognises stories pages in
+the compact or JSON format, single and batched details, and replies. The
+answer's size follows what the prompt asks for, and its timing follows a
+simple serving model:
+
+    time to first token = --ttft + prompt tokens / --prefill-tps
+    then output tokens at --tps, cut off at the request's max_tokens
+
+So a shorter prompt or a terser output format is measurably faster, the
+way it would be against a real model. --malformed answers that fraction
+of requests with prose instead of the requested format.
+
+Usage (from backend/):
+    python -m benchmarks.fake_llm --port 8399 --tps 120
+    LLM_PROXY_URL=http://127.0.0.1:8399/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.wire import encode_compact
+
+WORDS = (
+    "fusion quantum kernel rust compiler satellite battery robot browser database protocol vaccine "
+    "railway keyboard orbit neural genome telescope climate mars privacy ledger reactor lidar drone "
+    "wasm postgres linux python agent model chip"
+).split()
+OPENERS = ["Show HN:", "Ask HN:", "", "", "", "Launch HN:"]
+SENTENCES = [
+    "This has been a long time coming and the benchmarks look real.",
+    "I worked on something similar in the thirties and the hard part was never the hardware.",
+    "The regulatory angle is more interesting than the tech here.",
+    "Curious how this holds up outside the lab.",
+    "Everyone said the same thing about the last three attempts.",
+]
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, round(len(text.encode("utf-8")) / 4))
+
+
+def _story(rng: random.Random) -> dict:
+    words = rng.sample(WORDS, 3)
+    title = " ".join([rng.choice(OPENERS), words[0].capitalize(), *words[1:], "in", str(rng.randint(2030, 2040))])
+    return {"title": title.strip(), "url": f"https://{words[0]}{rng.randint(1, 999)}.dev/{words[1]}"}
+
+
+def _comment(rng: random.Random) -> dict:
+    return {
+        "author": f"{rng.choice(WORDS)}{rng.randint(1, 99)}",
+        "text": " ".join(rng.sample(SENTENCES, 2)),
+        "score": rng.randint(1, 200),
+        "time": f"{rng.randint(1, 20)} hours ago",
+        "reply_count": rng.randint(0, 40),
+    }
+
+
+def _details(rng: random.Random, comments: int) -> dict:
+    summary = "\n\n".join(" ".join(rng.choices(SENTENCES, k=4)) for _ in range(3))
+    return {"summary": summary, "comments": [_comment(rng) for _ in range(comments)]}
+
+
+def answer(prompt: str, rng: random.Random, malformed: float = 0.0) -> str:
+    """The content a well-behaved model would return for one of the app's prompts."""
+    if rng.random() < malformed:
+        return "I'm sorry, here are some thoughts about the future of technology instead."
+    comments = int((re.search(r"array of the (\d+) highest-ranked", prompt) or [0, 3])[1])
+
+    if stories := re.search(r"(\d+)(?: plausible)? Hacker News front page stories", prompt):
+        page = [_story(rng) for _ in range(int(stories[1]))]
+        if "tab-separated" in prompt:
+            return encode_compact(page, ["title", "url"])
+        return json.dumps(page, indent=2, ensure_ascii=False)
+    if replies := re.search(r"Write (\d+) replies", prompt):
+        return json.dumps([_comment(rng) for _ in range(int(replies[1]))], indent=2)
+    if batch := re.search(r"For each of these (\d+) Hacker News stories", prompt):
+        items = [{"n": n, **_details(rng, comments)} for n in range(1, int(batch[1]) + 1)]
+        return json.dumps(items, indent=2)
+    return json.dumps(_details(rng, comments), indent=2)
+
+
+def create_app(ttft: float, prefill_tps: float, tps: float, malformed: float, seed: int | None = None) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+        content = answer(prompt, rng, malformed)
+
+        # Cut the answer at max_tokens, keeping whole characters.
+        prompt_tokens, output_tokens = _count_tokens(prompt), _count_tokens(content)
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and output_tokens > max_tokens:
+            content = content.encode("utf-8")[: max_tokens * 4].decode("utf-8", "ignore")
+            output_tokens, finish_reason = max_tokens, "length"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": output_tokens,
+            "total_tokens": prompt_tokens + output_tokens,
+        }
+        first_token = ttft + prompt_tokens / prefill_tps
+        per_token = 1 / tps
+        common = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": body.get("model")}
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token + output_tokens * per_token)
+            return JSONResponse({
+                **common,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+
+        async def events():
+            def chunk(delta: dict, finish: str | None = None, **extra) -> str:
+                choices = [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else []
+                payload = {**common, "object": "chat.completion.chunk", "choices": choices, **extra}
+                return f"data: {json.dumps(payload)}\n\n"
+
+            await asyncio.sleep(first_token)
+            # About four characters per token, sent a few tokens at a time.
+            step = 16
+            for start in range(0, len(content), step):
+                yield chunk({"content": content[start:start + step]})
+                await asyncio.sleep(per_token * step / 4)
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--prefill-tps", type=float, default=5000, help="prompt tokens processed per second")
+    parser.add_argument("--tps", type=float, default=120, help="output tokens per second")
+    parser.add_argument("--malformed", type=float, default=0.0, help="fraction of answers in the wrong format")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8399)
+    add_arguments(parser)
+    args = parser.parse_args()
+    app = create_app(args.ttft, args.prefill_tps, args.tps, args.malformed, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
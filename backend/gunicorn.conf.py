@@ -0,0 +1,28 @@
+"""Gunicorn settings for running several Uvicorn workers.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Metrics run in Prometheus multiprocess mode: workers share
+PROMETHEUS_MULTIPROC_DIR, which is wiped when the master starts, and a
+worker's share of the in-progress request gauge is removed when it exits.
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+from app.core.metrics import mark_worker_dead, prepare_multiprocess_dir  # noqa: E402
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# LLM calls can take a minute; don't let the arbiter kill busy workers.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def on_starting(server):
+    prepare_multiprocess_dir()
+
+
+def child_exit(server, worker):
+    mark_worker_dead(worker.pid)
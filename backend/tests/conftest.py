@@ -0,0 +1,92 @@
+"""Shared test fixtures."""
+import os
+from datetime import datetime, timedelta
+
+# The suite runs without Postgres; DATABASE_URL keeps its Postgres default.
+os.environ.setdefault("SEARCH_BACKEND", "memory")
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base, get_db
+from app.main import app
+from app.models import GenerationToken
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.fixture
+async def session_factory():
+    """Session factory bound to a fresh in-memory SQLite database."""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db_client(session_factory):
+    """HTTP client whose requests use the in-memory database."""
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.fixture
+def make_token():
+    """Builds unsaved GenerationTokens; extra keyword arguments set columns."""
+
+    def make(remaining=3, expires_in_days=100, device_id="dev", now=None, **columns):
+        token = GenerationToken.create_token("future_hn_pack_3", 3, device_id=device_id)
+        token.remaining_generations = remaining
+        token.expires_at = (now or datetime.utcnow()) + timedelta(days=expires_in_days)
+        for name, value in columns.items():
+            setattr(token, name, value)
+        return token
+
+    return make
+
+
+@pytest.fixture
+def add_rows(session_factory):
+    """Commits rows to the in-memory database."""
+
+    async def add(*rows):
+        async with session_factory() as db:
+            db.add_all(rows)
+            await db.commit()
+
+    return add
+
+
+@pytest.fixture
+def remaining_generations(session_factory):
+    """Reads the remaining generations of every token, by token."""
+
+    async def remaining() -> dict[str, int]:
+        async with session_factory() as db:
+            rows = (await db.execute(select(GenerationToken.token, GenerationToken.remaining_generations))).all()
+        return dict(rows)
+
+    return remaining
@@ -0,0 +1,27 @@
+"""Test doubles shared by the test modules."""
+from types import SimpleNamespace
+
+
+class FakeCompletion:
+    """A chat completion that can also be read as a stream.
+
+    Set ``choices[0].message.content`` (and optionally ``finish_reason`` and
+    ``usage``) as on the SDK's response. Iterating yields the same answer
+    as the chunks the SDK returns for ``stream=True``, split in two.
+    """
+
+    def __init__(self, content=None, finish_reason="stop", usage=None):
+        self.choices = [SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)]
+        self.usage = usage
+
+    async def __aiter__(self):
+        choice = self.choices[0]
+        content = choice.message.content or ""
+        half = len(content) // 2
+        for piece in (content[:half], content[half:]):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)])
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=choice.finish_reason)]
+        )
+        if self.usage is not None:
+            yield SimpleNamespace(choices=[], usage=self.usage)
@@ -0,0 +1,158 @@
+"""Tests for micro-batching of story details."""
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.batching import MicroBatcher
+from app.services.scheduler import llm_priority, priority_class, shared_priority_context
+from app.services.llm import generate_story_details
+from tests.fakes import FakeCompletion
+
+
+def _batcher(run_batch, run_single, **kwargs):
+    kwargs.setdefault("window", 0.01)
+    return MicroBatcher(AsyncMock(side_effect=run_batch), AsyncMock(side_effect=run_single), **kwargs)
+
+
+@pytest.mark.anyio
+async def test_window_coalesces_concurrent_requests():
+    batcher = _batcher(lambda items: {i: f"batch:{x}" for i, x in enumerate(items)},
+                       lambda x: f"single:{x}")
+
+    results = await asyncio.gather(*(batcher.submit(x) for x in "abc"))
+
+    assert results == ["batch:a", "batch:b", "batch:c"]
+    batcher.run_batch.assert_awaited_once_with(["a", "b", "c"])
+    batcher.run_single.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_single_request_skips_batch_prompt():
+    batcher = _batcher(lambda items: {}, lambda x: f"single:{x}")
+
+    assert await batcher.submit("a") == "single:a"
+    batcher.run_batch.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_partial_batch_retries_only_missing():
+    batcher = _batcher(lambda items: {0: "batch:a", 2: "batch:c"}, lambda x: f"single:{x}")
+
+    results = await asyncio.gather(*(batcher.submit(x) for x in "abc"))
+
+    assert results == ["batch:a", "single:b", "batch:c"]
+    batcher.run_single.assert_awaited_once_with("b")
+
+
+@pytest.mark.anyio
+async def test_failed_batch_falls_back_to_singles():
+    def boom(items):
+        raise ValueError("bad json")
+
+    batcher = _batcher(boom, lambda x: f"single:{x}")
+
+    assert await asyncio.gather(batcher.submit("a"), batcher.submit("b")) == ["single:a", "single:b"]
+
+
+@pytest.mark.anyio
+async def test_max_size_flushes_without_waiting():
+    batcher = _batcher(lambda items: dict(enumerate(items)), lambda x: x, max_size=2, window=60)
+
+    results = await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 1)
+
+    assert results == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_idle_batcher_sends_without_waiting_the_window():
+    batcher = _batcher(lambda items: dict(enumerate(items)), lambda x: x, window=60)
+
+    assert await asyncio.wait_for(batcher.submit("a"), 1) == "a"
+
+
+@pytest.mark.anyio
+async def test_window_applies_while_earlier_work_runs():
+    release = asyncio.Event()
+
+    async def single(x):
+        if x == "slow":
+            await release.wait()
+        return x
+
+    batcher = _batcher(lambda items: dict(enumerate(items)), single, window=0.02)
+    slow = asyncio.ensure_future(batcher.submit("slow"))
+    await asyncio.sleep(0.001)
+    assert len(batcher._tasks) == 1
+
+    first = asyncio.ensure_future(batcher.submit("a"))
+    await asyncio.sleep(0.005)
+    second = asyncio.ensure_future(batcher.submit("b"))
+    assert await asyncio.gather(first, second) == ["a", "b"]
+    batcher.run_batch.assert_awaited_once_with(["a", "b"])
+    release.set()
+    await slow
+    assert not batcher._tasks
+
+
+@pytest.mark.anyio
+async def test_work_does_not_run_in_the_flushing_callers_context():
+    seen = []
+
+    async def run_batch(items):
+        seen.append(("batch", llm_priority.get()))
+        return {}
+
+    async def run_single(x):
+        seen.append((x, llm_priority.get()))
+        return x
+
+    batcher = MicroBatcher(run_batch, run_single, max_size=2, window=60, batch_context=shared_priority_context)
+
+    async def submit(item, name):
+        with priority_class(name):
+            return await batcher.submit(item)
+
+    assert await asyncio.gather(submit("a", "free"), submit("b", "paid")) == ["a", "b"]
+    # The batch runs for its most urgent caller; retries run for their own.
+    assert sorted(seen) == [("a", "free"), ("b", "paid"), ("batch", "paid")]
+
+
+@pytest.mark.anyio
+async def test_single_failure_propagates_to_its_caller_only():
+    def single(x):
+        if x == "b":
+            raise RuntimeError("llm down")
+        return x
+
+    batcher = _batcher(lambda items: {0: "a"}, single)
+
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert results[0] == "a"
+    assert isinstance(results[1], RuntimeError)
+
+
+@pytest.mark.anyio
+async def test_story_details_share_one_completion():
+    batch_details = [
+        {"n": 2, "summary": "Second", "comments": []},
+        {"n": 1, "summary": "First", "comments": []},
+    ]
+    mock_response = FakeCompletion()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = json.dumps(batch_details)
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+    with patch("app.services.llm.get_client", return_value=mock_client):
+        first, second = await asyncio.gather(
+            generate_story_details({"title": "One"}),
+            generate_story_details({"title": "Two"}),
+        )
+
+    assert first == {"summary": "First", "comments": []}
+    assert second == {"summary": "Second", "comments": []}
+    assert mock_client.chat.completions.create.await_count == 1
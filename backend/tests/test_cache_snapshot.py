@@ -0,0 +1,167 @@
+"""Tests for the cache snapshot written on shutdown and reloaded on startup."""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.cache_snapshot import MAGIC, RestorableCache, SnapshotStore
+from app.services.metadata import StoryPage
+
+PAGE = [{"id": 1, "title": "Fusion at last", "url": "https://fusion.dev"}]
+DETAILS = {"summary": "It finally works.", "comments": [{"author": "a", "text": "hi"}]}
+
+
+def _fill(store: SnapshotStore, path, details=DETAILS):
+    stories = RestorableCache("stories", store=store)
+    details_cache = RestorableCache("details", store=store)
+    stories["2035_en"] = PAGE
+    stories["2036_ja"] = PAGE
+    details_cache["2035_en_Fusion at last"] = details
+    store.save(str(path), {"stories": stories, "details": details_cache})
+
+
+async def _reload(path) -> tuple[SnapshotStore, RestorableCache, RestorableCache]:
+    store = SnapshotStore()
+    await store.load(str(path))
+    return store, RestorableCache("stories", store=store), RestorableCache("details", store=store)
+
+
+@pytest.mark.anyio
+async def test_round_trip_is_lazy(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    _fill(SnapshotStore(), path)
+
+    store, stories, details = await _reload(path)
+
+    assert len(store.reader) == 3
+    assert dict(stories) == {}
+    assert stories.get("2035_en") == PAGE
+    assert dict(stories) == {"2035_en": PAGE}
+    assert details["2035_en_Fusion at last"] == DETAILS
+    assert stories.get("2099_en") is None
+
+
+@pytest.mark.anyio
+async def test_warm_decodes_one_cache_up_front(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    _fill(SnapshotStore(), path)
+    store, stories, details = await _reload(path)
+
+    assert stories.warm() == 2
+    assert dict(stories) == {"2035_en": PAGE, "2036_ja": PAGE}
+    assert dict(details) == {}
+    assert stories.warm() == 0
+
+
+@pytest.mark.anyio
+async def test_unread_records_survive_the_next_snapshot(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    _fill(SnapshotStore(), path)
+    store, stories, details = await _reload(path)
+    stories.get("2035_en")
+    stories["2040_de"] = PAGE
+
+    store.save(str(path), {"stories": stories, "details": details})
+
+    store, stories, details = await _reload(path)
+    assert len(store.reader) == 4
+    assert stories.get("2036_ja") == PAGE
+    assert details.get("2035_en_Fusion at last") == DETAILS
+
+
+@pytest.mark.anyio
+async def test_corrupt_record_is_skipped(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    _fill(SnapshotStore(), path, details={"summary": "x" * 500, "comments": []})
+    data = bytearray(path.read_bytes())
+    data[-10] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    store, stories, details = await _reload(path)
+
+    assert stories.get("2035_en") == PAGE
+    assert details.get("2035_en_Fusion at last") is None
+
+
+@pytest.mark.anyio
+async def test_truncated_and_foreign_files(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    _fill(SnapshotStore(), path)
+    path.write_bytes(path.read_bytes()[:-7])
+    store, stories, _ = await _reload(path)
+    assert len(store.reader) == 2
+    assert stories.get("2036_ja") == PAGE
+
+    path.write_bytes(b"not a snapshot at all")
+    store, stories, _ = await _reload(path)
+    assert len(store.reader) == 0
+
+    path.write_bytes(b"")
+    store, stories, _ = await _reload(path)
+    assert stories.get("2035_en") is None
+
+    store, _, _ = await _reload(tmp_path / "missing")
+    assert store.reader is None
+
+
+@pytest.mark.anyio
+async def test_bounded_cache_evicts_oldest_and_limits_carry_over(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    store = SnapshotStore()
+    cache = RestorableCache("details", max_entries=3, store=store)
+    for n in range(4):
+        cache[str(n)] = {"n": n}
+    assert list(cache) == ["1", "2", "3"]
+    store.save(str(path), {"details": cache})
+
+    store = SnapshotStore()
+    await store.load(str(path))
+    cache = RestorableCache("details", max_entries=2, store=store)
+    cache["new"] = {"n": 9}
+    store.save(str(path), {"details": cache})
+
+    store = SnapshotStore()
+    await store.load(str(path))
+    assert len(store.reader) == 2
+    assert path.read_bytes().startswith(MAGIC)
+
+
+def test_bounded_cache_evicts_least_recently_used():
+    cache = RestorableCache("details", max_entries=3, store=SnapshotStore())
+    for n in range(3):
+        cache[str(n)] = {"n": n}
+    assert cache["0"] == {"n": 0}
+    assert cache.get("1") == {"n": 1}
+    cache["3"] = {"n": 3}
+
+    assert list(cache) == ["0", "1", "3"]
+
+
+@pytest.mark.anyio
+async def test_story_page_keeps_seed_and_variant(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    store = SnapshotStore()
+    stories = RestorableCache("stories", store=store)
+    stories["2035_en"] = StoryPage(PAGE, seed=42, prompt_variant="compact.v1")
+    store.save(str(path), {"stories": stories})
+
+    _, stories, _ = await _reload(path)
+    page = stories["2035_en"]
+
+    assert isinstance(page, StoryPage)
+    assert page == PAGE
+    assert (page.seed, page.prompt_variant) == (42, "compact.v1")
+
+
+@pytest.mark.anyio
+async def test_details_are_served_from_cache(client):
+    from app.routes.api import _details_cache, _stories_cache
+
+    story = {"id": 3, "title": "A cached thread", "url": "https://t.dev"}
+    with patch.dict(_stories_cache, {"2035_en": [story]}), \
+         patch("app.routes.api.generate_story_details", AsyncMock(return_value=DETAILS)) as mock_det:
+        first = await client.get("/api/story/3/details?year=2035&lang=en")
+        second = await client.get("/api/story/3/details?year=2035&lang=en")
+
+    assert first.json() == second.json() == {"story_id": 3, **DETAILS}
+    assert mock_det.await_count == 1
+    _details_cache.pop("2035_en_A cached thread", None)
@@ -0,0 +1,127 @@
+"""Tests for the story corpus and remix engine."""
+import asyncio
+import random
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.corpus import StoryCorpus, classify_topic, estimate_similarity, minhash
+
+
+WORDS = ["quantum", "kernel", "fusion", "startup", "privacy", "compiler", "satellite", "battery", "robot",
+         "browser", "database", "protocol", "garden", "ledger", "vaccine", "railway", "keyboard", "orbit"]
+
+
+def _stories(n, prefix="Story"):
+    rng = random.Random(n)
+    return [{"title": f"{prefix} {rng.choice(WORDS)} {rng.getrandbits(64):x} {rng.choice(WORDS)}",
+             "url": f"https://s{i}.dev"}
+            for i in range(n)]
+
+
+def test_classify_topic():
+    assert classify_topic("Ask HN: Who is hiring? (March 2035)") == "ask"
+    assert classify_topic("Show HN: A tiny kernel") == "show"
+    assert classify_topic("New LLM runs on a watch") == "ai"
+    assert classify_topic("Fusion plant reaches net energy") == "science"
+    assert classify_topic("The joy of handwritten letters") == "culture"
+
+
+def test_minhash_similarity():
+    a = minhash("Rust 3.0 released with async closures")
+    b = minhash("Rust 3.0 released, with async closures!")
+    c = minhash("Lab-grown coffee is now cheaper than the real thing")
+    assert estimate_similarity(a, b) > 0.8
+    assert estimate_similarity(a, c) < 0.3
+
+
+def test_near_duplicates_are_dropped():
+    corpus = StoryCorpus()
+    assert corpus.add(2035, "en", "Rust 3.0 released with async closures", "https://a")
+    assert not corpus.add(2035, "en", "Rust 3.0 Released With Async Closures!", "https://b")
+    # Dedupe is scoped per year and language.
+    assert corpus.add(2036, "en", "Rust 3.0 released with async closures", "https://a")
+    assert corpus.size(2035, "en") == 1
+
+
+@pytest.mark.anyio
+async def test_remix_needs_enough_stories():
+    corpus = StoryCorpus()
+    await corpus.add_page(2035, "en", _stories(20))
+    assert corpus.remix(2035, "en") is None
+    assert corpus.remix(2035, "en", count=10) is not None
+
+
+@pytest.mark.anyio
+async def test_remix_page():
+    corpus = StoryCorpus()
+    assert await corpus.add_page(2035, "en", _stories(100)) == 100
+
+    page = corpus.remix(2035, "en", seed=5)
+
+    assert [s["id"] for s in page] == list(range(1, 31))
+    assert len({s["title"] for s in page}) == 30
+    assert all({"score", "comments", "author", "time", "domain"} <= s.keys() for s in page)
+    assert page == corpus.remix(2035, "en", seed=5)
+    assert page.seed == 5
+
+
+def test_full_corpus_replaces_random_stories():
+    corpus = StoryCorpus(max_per_scope=50, seed=1)
+    stories = _stories(200)
+    for story in stories:
+        assert corpus.add(2035, "en", story["title"], story["url"])
+
+    assert corpus.size(2035, "en") == 50
+    kept = {s["title"] for s in corpus.remix(2035, "en", count=50, seed=1)}
+    # Replacement is uniform, not oldest-first: early stories survive too.
+    assert kept & {s["title"] for s in stories[:100]}
+    # Evicted titles leave the dedupe index with them.
+    evicted = next(s for s in stories if s["title"] not in kept)
+    assert corpus.add(2035, "en", evicted["title"], evicted["url"])
+    assert sum(len(bucket) for bucket in corpus._dedupe._buckets[(2035, "en")].values()) == 50 * 8
+
+
+@pytest.mark.anyio
+async def test_add_page_hashes_off_the_event_loop():
+    corpus = StoryCorpus()
+    with patch("app.services.corpus.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+        assert await corpus.add_page(2035, "en", _stories(30) + [{"title": "  "}]) == 30
+    to_thread.assert_awaited_once()
+    # A near-duplicate of a stored title is still caught with precomputed signatures.
+    assert await corpus.add_page(2035, "en", [{"title": _stories(30)[0]["title"] + "!"}]) == 0
+
+
+@pytest.mark.anyio
+async def test_free_trial_served_from_corpus(db_client):
+    corpus = StoryCorpus()
+    await corpus.add_page(2035, "en", _stories(120))
+
+    with patch("app.routes.api.story_corpus", corpus), \
+         patch("app.routes.api.check_and_use_free_trial", AsyncMock(return_value=True)), \
+         patch("app.routes.api.generate_stories", new_callable=AsyncMock) as mock_gen:
+        response = await db_client.post("/api/generate", json={"year": 2035, "lang": "en", "device_id": "d1"})
+
+    assert response.status_code == 200
+    assert len(response.json()["stories"]) == 30
+    mock_gen.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_generated_pages_feed_corpus_and_back_failures(db_client):
+    corpus = StoryCorpus()
+    stories = _stories(30, prefix="Fresh")
+
+    with patch("app.routes.api.story_corpus", corpus), \
+         patch("app.routes.api.check_and_use_token", AsyncMock(return_value=True)), \
+         patch("app.routes.api.generate_stories", AsyncMock(return_value=stories)):
+        response = await db_client.post("/api/generate", json={"year": 2035, "token": "tok"})
+    assert response.status_code == 200
+    assert corpus.size(2035, "en") == 30
+
+    with patch("app.routes.api.story_corpus", corpus), \
+         patch("app.routes.api.check_and_use_token", AsyncMock(return_value=True)), \
+         patch("app.routes.api.generate_stories", AsyncMock(side_effect=RuntimeError("llm down"))):
+        response = await db_client.post("/api/generate", json={"year": 2035, "token": "tok"})
+    assert response.status_code == 200
+    assert {s["title"] for s in response.json()["stories"]} == {s["title"] for s in stories}
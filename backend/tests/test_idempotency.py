@@ -0,0 +1,267 @@
+"""Tests for Idempotency-Key handling."""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models import FreeTrialTracking, IdempotencyKey
+from app.schemas.payment import CreateCheckoutResponse
+from app.services.idempotency import IdempotencyConflict, IdempotencyStore
+from app.services.maintenance import run_maintenance
+
+STORIES = [{"id": 1, "title": "Fusion at last", "url": "https://fusion.dev"}]
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+needs_postgres = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+def _store(**kwargs):
+    return IdempotencyStore(**{"ttl": 60, "lease": 60, "wait": 5, "poll": 0.01, **kwargs})
+
+
+@pytest.fixture
+def store():
+    store = _store()
+    with patch("app.services.idempotency.idempotency_store", store):
+        yield store
+
+
+async def _run(store, session_factory, key, call, fingerprint="fp"):
+    async with session_factory() as db:
+        return await store.run(db, key, fingerprint, call)
+
+
+@pytest.mark.anyio
+async def test_concurrent_retry_waits_for_first_run(store, session_factory):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"page": 1}
+
+    first, second = await asyncio.gather(
+        _run(store, session_factory, "k", call), _run(store, session_factory, "k", call)
+    )
+
+    assert first == ({"page": 1}, False)
+    assert second == ({"page": 1}, True)
+    assert len(calls) == 1
+    assert await _run(store, session_factory, "k", call) == ({"page": 1}, True)
+
+
+@pytest.mark.anyio
+async def test_client_errors_are_replayed_server_errors_are_not(store, session_factory):
+    payment_required = AsyncMock(side_effect=HTTPException(status_code=402, detail="pay"))
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            await _run(store, session_factory, "a", payment_required)
+        assert (error.value.status_code, error.value.detail) == (402, "pay")
+    assert payment_required.await_count == 1
+
+    flaky = AsyncMock(side_effect=[RuntimeError("llm down"), "page"])
+    with pytest.raises(RuntimeError):
+        await _run(store, session_factory, "b", flaky)
+    assert await _run(store, session_factory, "b", flaky) == ("page", False)
+
+
+@pytest.mark.anyio
+async def test_waiter_runs_again_when_first_run_is_cancelled(store, session_factory):
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    first = asyncio.create_task(_run(store, session_factory, "k", slow))
+    await started.wait()
+    second = asyncio.create_task(_run(store, session_factory, "k", AsyncMock(return_value="page")))
+    await asyncio.sleep(0.05)
+    first.cancel()
+
+    assert await second == ("page", False)
+
+
+@pytest.mark.anyio
+async def test_conflict_and_expiry(store, session_factory):
+    await _run(store, session_factory, "k", AsyncMock(return_value="page"))
+    with pytest.raises(IdempotencyConflict):
+        await _run(store, session_factory, "k", AsyncMock(), fingerprint="other")
+
+    async with session_factory() as db:
+        await db.execute(update(IdempotencyKey).values(expires_at=IdempotencyKey.created_at))
+        await db.commit()
+    assert await _run(store, session_factory, "k", AsyncMock(return_value="new"), fingerprint="other") == (
+        "new", False
+    )
+
+
+@pytest.mark.anyio
+async def test_another_worker_waits_for_the_run(session_factory):
+    workers = [_store(), _store()]
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow():
+        started.set()
+        await release.wait()
+        return "page"
+
+    first = asyncio.create_task(_run(workers[0], session_factory, "k", slow))
+    await started.wait()
+    second = asyncio.create_task(_run(workers[1], session_factory, "k", AsyncMock()))
+    await asyncio.sleep(0.05)
+    assert not second.done()
+    release.set()
+
+    assert await first == ("page", False)
+    assert await second == ("page", True)
+
+
+@pytest.mark.anyio
+async def test_dead_worker_is_taken_over_after_its_lease(session_factory):
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.Event().wait()
+
+    dead_store = _store(lease=0.1)
+    # A dead worker stops renewing its lease.
+    dead_store._renew_lease = AsyncMock()
+    dead = asyncio.create_task(_run(dead_store, session_factory, "k", hang))
+    await started.wait()
+    survivor = _store()
+
+    assert await _run(survivor, session_factory, "k", AsyncMock(return_value="page")) == ("page", False)
+    dead.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await dead
+
+
+@pytest.mark.anyio
+async def test_a_long_run_keeps_its_lease(session_factory):
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return "page"
+
+    first = asyncio.create_task(_run(_store(lease=0.1, session_factory=session_factory), session_factory, "k", slow))
+    # Three leases' worth.
+    await asyncio.sleep(0.3)
+    second = asyncio.create_task(_run(_store(), session_factory, "k", AsyncMock(return_value="other")))
+    await asyncio.sleep(0.05)
+    assert not second.done()
+    release.set()
+
+    assert await first == ("page", False)
+    assert await second == ("page", True)
+
+
+@pytest.mark.anyio
+async def test_generate_retry_is_not_charged_twice(store, db_client):
+    body = {"year": 2035, "device_id": "dev"}
+    headers = {"Idempotency-Key": "retry-1"}
+
+    async def slow_generate(year, lang):
+        await asyncio.sleep(0.01)
+        return STORIES
+
+    with patch("app.routes.api.generate_stories", AsyncMock(side_effect=slow_generate)) as mock_gen, \
+         patch("app.routes.api.story_corpus.remix", return_value=None):
+        first, concurrent = await asyncio.gather(
+            db_client.post("/api/generate", json=body, headers=headers),
+            db_client.post("/api/generate", json=body, headers=headers),
+        )
+        later = await db_client.post("/api/generate", json=body, headers=headers)
+        unkeyed = await db_client.post("/api/generate", json=body)
+        reused = await db_client.post("/api/generate", json={**body, "year": 2036}, headers=headers)
+
+    assert first.status_code == concurrent.status_code == later.status_code == 200
+    assert first.json() == concurrent.json() == later.json()
+    assert later.headers["Idempotent-Replayed"] == "true"
+    assert mock_gen.await_count == 1
+    # The free trial was spent once; a new request without a key is refused.
+    assert unkeyed.status_code == 402
+    assert reused.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_retry_after_failed_generation_is_not_charged_again(store, db_client, session_factory):
+    body = {"year": 2035, "device_id": "dev"}
+    headers = {"Idempotency-Key": "retry-2"}
+    generate = AsyncMock(side_effect=[RuntimeError("llm down"), STORIES])
+
+    with patch("app.routes.api.generate_stories", generate), \
+         patch("app.routes.api.story_corpus.remix", return_value=None), \
+         patch("app.routes.api.settings.FREE_TRIAL_LIMIT", 3):
+        with pytest.raises(RuntimeError):
+            await db_client.post("/api/generate", json=body, headers=headers)
+        retry = await db_client.post("/api/generate", json=body, headers=headers)
+
+    assert retry.status_code == 200
+    assert generate.await_count == 2
+    async with session_factory() as db:
+        uses = (await db.execute(select(FreeTrialTracking.uses_count))).scalar_one()
+        charged = (await db.execute(select(IdempotencyKey.credits_charged))).scalar_one()
+    assert uses == charged == 1
+
+
+@pytest.mark.anyio
+async def test_checkout_retry_reuses_session(store, db_client):
+    checkout = CreateCheckoutResponse(checkout_url="https://pay.example/s1", session_id="s1")
+    body = {"product_sku": "future_hn_pack_3", "device_id": "dev", "success_url": "https://app.example/ok",
+            "cancel_url": "https://app.example/cancel"}
+
+    with patch("app.api.payment._create_checkout", AsyncMock(return_value=checkout)) as mock_create:
+        responses = [
+            await db_client.post("/api/payment/create-checkout", json=body, headers={"Idempotency-Key": "c1"})
+            for _ in range(2)
+        ]
+
+    assert [r.json()["session_id"] for r in responses] == ["s1", "s1"]
+    assert mock_create.await_count == 1
+
+
+@pytest.mark.anyio
+async def test_maintenance_purges_expired_keys(session_factory):
+    now = datetime(2036, 6, 1)
+    async with session_factory() as db:
+        for key, expires_at in (("old", now - timedelta(seconds=1)), ("fresh", now + timedelta(hours=1))):
+            db.add(IdempotencyKey(key=key, fingerprint="fp", expires_at=expires_at))
+        await db.commit()
+
+    result = await run_maintenance(session_factory, now=now)
+
+    assert result["idempotency_keys"] == 1
+    async with session_factory() as db:
+        assert await db.get(IdempotencyKey, "fresh") is not None
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_replicas_race_for_one_key():
+    engine = create_async_engine(POSTGRES_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[IdempotencyKey.__table__])
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    key = f"pg:{uuid.uuid4()}"
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "page"
+
+    results = await asyncio.gather(*(_run(_store(), session_factory, key, call) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+    await engine.dispose()
@@ -0,0 +1,174 @@
+"""Tests for queued generation jobs."""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import func, select
+
+from app.api.jobs import refund_generation_job
+from app.models import FreeTrialTracking, GenerationJob, GenerationToken
+from app.services.jobs import ClaimedJob, JobWorkerPool
+
+STORIES = [{"id": 1, "title": "Fusion at last", "url": "https://fusion.dev"}]
+
+
+async def _handler(job):
+    return {"stories": STORIES, "seed": 7, "prompt_variant": "compact.v1", "page_id": "page-1"}
+
+
+async def _add_job(session_factory, **values) -> uuid.UUID:
+    job = GenerationJob(year=2035, lang="en", **values)
+    async with session_factory() as db:
+        db.add(job)
+        await db.commit()
+    return job.id
+
+
+async def _get(session_factory, job_id):
+    async with session_factory() as db:
+        return await db.get(GenerationJob, job_id)
+
+
+@pytest.mark.anyio
+async def test_create_job_debits_and_queues(session_factory, db_client):
+    response = await db_client.post("/api/jobs", json={"year": 2035, "device_id": "dev"})
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] == "queued"
+
+    job = await _get(session_factory, uuid.UUID(body["job_id"]))
+    assert job.status == "queued" and not job.paid
+    async with session_factory() as db:
+        tracking = (await db.execute(select(FreeTrialTracking))).scalar_one()
+    assert tracking.uses_count == 1
+
+
+@pytest.mark.anyio
+async def test_create_job_without_credit_queues_nothing(session_factory, db_client):
+    response = await db_client.post("/api/jobs", json={"year": 2035, "token": "tok_missing"})
+    assert response.status_code == 402
+    async with session_factory() as db:
+        assert await db.scalar(select(func.count()).select_from(GenerationJob)) == 0
+
+
+@pytest.mark.anyio
+async def test_worker_stores_result_and_get_returns_it(session_factory, db_client):
+    pool = JobWorkerPool(_handler, session_factory)
+    job_id = await _add_job(session_factory)
+
+    with patch("app.api.jobs.job_workers", pool):
+        pending = await db_client.get(f"/api/jobs/{job_id}")
+        assert pending.status_code == 202
+        assert await pool.run_one()
+        assert not await pool.run_one()
+        done = await db_client.get(f"/api/jobs/{job_id}")
+
+    assert done.status_code == 200
+    body = done.json()
+    assert body["status"] == "done"
+    assert body["result"] == {
+        "year": 2035, "stories": STORIES, "seed": 7, "prompt_variant": "compact.v1", "page_id": "page-1",
+    }
+
+
+@pytest.mark.anyio
+async def test_long_poll_returns_when_job_finishes(session_factory, db_client):
+    pool = JobWorkerPool(_handler, session_factory)
+    job_id = await _add_job(session_factory)
+
+    async def finish_later():
+        await asyncio.sleep(0.05)
+        await pool.run_one()
+
+    with patch("app.api.jobs.job_workers", pool):
+        worker = asyncio.create_task(finish_later())
+        response = await db_client.get(f"/api/jobs/{job_id}", params={"wait": 5})
+        await worker
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+
+
+@pytest.mark.anyio
+async def test_unknown_job(db_client):
+    response = await db_client.get(f"/api/jobs/{uuid.uuid4()}")
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_expired_lease_is_reclaimed(session_factory):
+    now = datetime.utcnow()
+    stale = await _add_job(session_factory, status="running", attempts=1,
+                           lease_expires_at=now - timedelta(seconds=1))
+    await _add_job(session_factory, status="running", attempts=1,
+                   lease_expires_at=now + timedelta(minutes=5))
+    pool = JobWorkerPool(_handler, session_factory)
+
+    claimed = await pool.claim()
+
+    assert claimed.id == stale and claimed.attempts == 2
+    assert await pool.claim() is None
+
+
+@pytest.mark.anyio
+async def test_stale_worker_cannot_overwrite_result(session_factory):
+    pool = JobWorkerPool(_handler, session_factory)
+    job_id = await _add_job(session_factory)
+    first = await pool.claim()
+    async with session_factory() as db:
+        (await db.get(GenerationJob, job_id)).lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+        await db.commit()
+    second = await pool.claim()
+
+    await pool._finish(second, "done", result={"stories": STORIES, "seed": 1})
+    await pool._finish(first, "failed", error="late")
+
+    job = await _get(session_factory, job_id)
+    assert job.status == "done" and job.error is None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("payer", ["token", "wallet", "trial"])
+async def test_failed_job_is_refunded(session_factory, db_client, payer):
+    token = GenerationToken.create_token("future_hn_pack_3", 1, device_id="dev")
+    async with session_factory() as db:
+        db.add(token)
+        await db.commit()
+    body = {
+        "token": {"token": token.token},
+        "wallet": {"device_id": "dev", "use_wallet": True},
+        "trial": {"device_id": "dev"},
+    }[payer]
+    response = await db_client.post("/api/jobs", json={"year": 2035, **body})
+    assert response.status_code == 202
+    pool = JobWorkerPool(AsyncMock(side_effect=RuntimeError("llm down")), session_factory, refund_generation_job)
+
+    assert await pool.run_one()
+    # A late finish from a worker whose lease was taken over refunds nothing.
+    job = await _get(session_factory, uuid.UUID(response.json()["job_id"]))
+    await pool._finish(ClaimedJob(job.id, job.year, job.lang, job.paid, job.attempts, job.payer), "failed")
+
+    assert job.status == "failed" and job.payer
+    async with session_factory() as db:
+        remaining = await db.scalar(select(GenerationToken.remaining_generations))
+        uses = await db.scalar(select(FreeTrialTracking.uses_count))
+    assert remaining == 1 and (uses or 0) == 0
+
+
+@pytest.mark.anyio
+async def test_failures_and_attempt_limit(session_factory):
+    pool = JobWorkerPool(AsyncMock(side_effect=RuntimeError("llm down")), session_factory)
+    failing = await _add_job(session_factory)
+    exhausted = await _add_job(session_factory, status="running", attempts=3,
+                               lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+    with patch("app.services.jobs.settings.JOB_MAX_ATTEMPTS", 3):
+        assert await pool.run_one()
+        assert await pool.run_one()
+
+    assert (await _get(session_factory, failing)).status == "failed"
+    job = await _get(session_factory, exhausted)
+    assert job.status == "failed" and job.attempts == 4
+    assert pool.handler.await_count == 1
@@ -0,0 +1,57 @@
+"""Tests for lenient JSON decoding of LLM output."""
+import json
+
+import pytest
+
+from app.services.json_repair import loads_lenient, repair_json
+
+
+def test_valid_json_untouched():
+    assert loads_lenient('[{"title": "a"}]') == [{"title": "a"}]
+
+
+def test_truncated_array_keeps_complete_elements():
+    text = '[{"title": "One", "url": "https://1.dev"}, {"title": "Two", "url": "https://2.dev"}, {"title": "Thr'
+    repaired, truncated = repair_json(text)
+    assert truncated
+    assert json.loads(repaired) == [
+        {"title": "One", "url": "https://1.dev"},
+        {"title": "Two", "url": "https://2.dev"},
+    ]
+
+
+def test_truncated_nested_array_in_object():
+    text = '{"summary": "It works.", "comments": [{"author": "a", "text": "hi"}, {"author": "b", "te'
+    assert loads_lenient(text) == {"summary": "It works.", "comments": [{"author": "a", "text": "hi"}]}
+
+
+def test_trailing_commas():
+    assert loads_lenient('[{"title": "a", "url": "u",}, {"title": "b"},\n]') == [
+        {"title": "a", "url": "u"},
+        {"title": "b"},
+    ]
+
+
+def test_smart_quote_delimiters():
+    assert loads_lenient('[{“title”: “Fusion at last”, “url”: “https://f.dev”}]') == [
+        {"title": "Fusion at last", "url": "https://f.dev"}
+    ]
+
+
+def test_smart_quotes_inside_strings_are_content():
+    assert loads_lenient('[{"title": "The “last” compiler",}]') == [{"title": "The “last” compiler"}]
+
+
+def test_raw_newlines_and_escapes_in_strings():
+    assert loads_lenient('{"summary": "line one\nline \\"two\\"",}') == {"summary": 'line one\nline "two"'}
+
+
+def test_trailing_prose_ignored():
+    assert loads_lenient('[1, 2,] Hope this helps!') == [1, 2]
+
+
+def test_nothing_recoverable():
+    with pytest.raises(ValueError):
+        loads_lenient('{"summary": "cut off before any comm')
+    with pytest.raises(ValueError):
+        loads_lenient("no json at all")
@@ -5,6 +5,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 
 from app.services.llm import _extract_json, generate_stories, generate_story_details, get_client
+from tests.fakes import FakeCompletion
 
 
 def test_extract_json_plain_array():
@@ -64,7 +65,7 @@ async def test_generate_stories():
         for i in range(1, 31)
     ]
 
-    mock_response = MagicMock()
+    mock_response = FakeCompletion()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = json.dumps(mock_stories)
 
@@ -82,7 +83,7 @@ async def test_generate_stories():
 async def test_generate_stories_with_lang():
     mock_stories = [{"id": 1, "title": "未来ストーリー"}] * 30
 
-    mock_response = MagicMock()
+    mock_response = FakeCompletion()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = json.dumps(mock_stories)
 
@@ -100,10 +101,10 @@ async def test_generate_stories_with_lang():
 
 @pytest.mark.anyio
 async def test_generate_stories_defaults():
-    """Test that missing fields get defaults."""
+    """Test that metadata is synthesized for stories with only a title."""
     mock_stories = [{"title": f"Story {i}"} for i in range(30)]
 
-    mock_response = MagicMock()
+    mock_response = FakeCompletion()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = json.dumps(mock_stories)
 
@@ -114,9 +115,33 @@ async def test_generate_stories_defaults():
         result = await generate_stories(2035)
         assert len(result) == 30
         assert result[0]["id"] == 1
-        assert result[0]["score"] == 100
-        assert result[0]["author"] == "anonymous"
+        assert result[0]["url"] == "https://example.com"
         assert result[0]["domain"] == "example.com"
+        assert isinstance(result[0]["score"], int)
+        assert isinstance(result[0]["comments"], int)
+        assert result[0]["author"]
+        assert result[0]["time"].endswith("ago")
+
+
+@pytest.mark.anyio
+async def test_generate_stories_reproducible_from_seed():
+    """The same titles and seed give the same page; the seed is recorded."""
+    mock_stories = [{"title": f"Story {i}", "url": f"https://www.s{i}.dev/post", "score": 1} for i in range(30)]
+
+    mock_response = FakeCompletion()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = json.dumps(mock_stories)
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+    with patch("app.services.llm.get_client", return_value=mock_client):
+        first = await generate_stories(2035, seed=1234)
+        second = await generate_stories(2035, seed=1234)
+
+    assert first == second
+    assert first.seed == 1234
+    assert first[3]["domain"] == "s3.dev"
 
 
 @pytest.mark.anyio
@@ -124,7 +149,7 @@ async def test_generate_stories_truncates_to_30():
     """Test that results are truncated to 30."""
     mock_stories = [{"id": i, "title": f"Story {i}"} for i in range(50)]
 
-    mock_response = MagicMock()
+    mock_response = FakeCompletion()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = json.dumps(mock_stories)
 
@@ -146,7 +171,7 @@ async def test_generate_story_details():
         ],
     }
 
-    mock_response = MagicMock()
+    mock_response = FakeCompletion()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = json.dumps(mock_details)
 
@@ -166,7 +191,7 @@ async def test_generate_story_details_minimal_story():
     """Test with a story that has minimal fields."""
     mock_details = {"summary": "Test", "comments": []}
 
-    mock_response = MagicMock()
+    mock_response = FakeCompletion()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = json.dumps(mock_details)
 
@@ -185,7 +210,7 @@ async def test_generate_stories_code_block_response():
     """Test handling of code block wrapped response."""
     mock_stories = [{"id": 1, "title": "Test Story"}] * 30
 
-    mock_response = MagicMock()
+    mock_response = FakeCompletion()
     mock_response.choices = [MagicMock()]
     mock_response.choices[0].message.content = f"```json\n{json.dumps(mock_stories)}\n```"
 
@@ -202,7 +227,7 @@ async def test_generate_stories_all_languages():
     """Test that all supported languages work."""
     for lang in ["en", "zh", "ja", "de", "fr", "ko", "es"]:
         mock_stories = [{"id": 1, "title": f"Story in {lang}"}] * 30
-        mock_response = MagicMock()
+        mock_response = FakeCompletion()
         mock_response.choices = [MagicMock()]
         mock_response.choices[0].message.content = json.dumps(mock_stories)
 
@@ -212,3 +237,100 @@ async def test_generate_stories_all_languages():
         with patch("app.services.llm.get_client", return_value=mock_client):
             result = await generate_stories(2035, lang)
             assert len(result) == 30
+
+
+@pytest.mark.anyio
+async def test_generate_stories_compact_format():
+    """Compact responses are expanded and the prompt uses the smaller budget."""
+    rows = "\n".join(f"Story {i}\thttps://s{i}.dev" for i in range(1, 31))
+    mock_response = FakeCompletion()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = "title\turl\n" + rows
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+    with patch("app.services.llm.get_client", return_value=mock_client):
+        result = await generate_stories(2035)
+
+    assert len(result) == 30
+    assert result[4]["title"] == "Story 5"
+    assert result[4]["domain"] == "s5.dev"
+    call_kwargs = mock_client.chat.completions.create.call_args.kwargs
+    assert call_kwargs["max_tokens"] < 8000
+    assert "tab-separated" in call_kwargs["messages"][0]["content"]
+
+
+@pytest.mark.anyio
+async def test_generate_stories_falls_back_to_json_prompt():
+    """An unparseable compact response triggers one request in the JSON format."""
+    bad_response = FakeCompletion()
+    bad_response.choices = [MagicMock()]
+    bad_response.choices[0].message.content = "Sorry, here are some stories without structure."
+
+    good_response = FakeCompletion()
+    good_response.choices = [MagicMock()]
+    good_response.choices[0].message.content = json.dumps([{"title": f"Story {i}"} for i in range(30)])
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(side_effect=[bad_response, good_response])
+
+    with patch("app.services.llm.get_client", return_value=mock_client):
+        result = await generate_stories(2035)
+
+    assert len(result) == 30
+    second_call = mock_client.chat.completions.create.call_args_list[1].kwargs
+    assert second_call["max_tokens"] == 8000
+    assert "JSON array" in second_call["messages"][0]["content"]
+
+
+def _response(content, finish_reason="stop"):
+    response = FakeCompletion()
+    response.choices = [MagicMock()]
+    response.choices[0].message.content = content
+    response.choices[0].finish_reason = finish_reason
+    return response
+
+
+@pytest.mark.anyio
+async def test_generate_stories_salvages_truncated_json_and_tops_up():
+    """A truncated page keeps its complete stories and asks only for the rest."""
+    complete = [{"title": f"Story {i}", "url": f"https://s{i}.dev"} for i in range(27)]
+    truncated = json.dumps(complete)[:-1] + ', {"title": "Story 27", "url": "https://s2'
+    top_up = json.dumps([{"title": "Story 3"}] + [{"title": f"Extra {i}"} for i in range(5)])
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(
+        side_effect=[_response(truncated, "length"), _response(top_up)]
+    )
+
+    with patch("app.services.llm.settings.LLM_STORY_FORMAT", "json"), \
+         patch("app.services.llm.get_client", return_value=mock_client):
+        result = await generate_stories(2035)
+
+    titles = [s["title"] for s in result]
+    assert len(result) == 30
+    assert titles[:27] == [f"Story {i}" for i in range(27)]
+    # The duplicate of an existing title is skipped.
+    assert titles[27:] == ["Extra 0", "Extra 1", "Extra 2"]
+    assert [s["id"] for s in result] == list(range(1, 31))
+
+    prompt = mock_client.chat.completions.create.call_args_list[1].kwargs["messages"][0]["content"]
+    assert "exactly 3 Hacker News" in prompt
+    assert "- Story 26" in prompt
+
+
+@pytest.mark.anyio
+async def test_generate_stories_short_page_when_top_up_fails():
+    rows = "\n".join(f"Story {i}\thttps://s{i}.dev" for i in range(28))
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(
+        side_effect=[_response("title\turl\n" + rows), RuntimeError("llm down")]
+    )
+
+    with patch("app.services.llm.get_client", return_value=mock_client):
+        result = await generate_stories(2035)
+
+    assert len(result) == 28
+    top_up_call = mock_client.chat.completions.create.call_args_list[1].kwargs
+    assert "exactly 2 stories" in top_up_call["messages"][0]["content"]
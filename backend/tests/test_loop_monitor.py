@@ -0,0 +1,81 @@
+"""Tests for loop-lag sampling, stall detection, the profiler endpoint and parse offloading."""
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.core.loop_monitor import LoopMonitor
+from app.core.profiler import sample_stacks
+from app.services.llm import _parse_off_loop
+
+
+async def blocking_handler():
+    time.sleep(0.3)
+
+
+@pytest.mark.anyio
+async def test_stall_is_logged_with_blocking_coroutine():
+    monitor = LoopMonitor(interval=0.01, stall_threshold=0.1)
+    with patch("app.core.loop_monitor.logger") as mock_logger, \
+         patch("app.core.loop_monitor.record_loop_lag") as mock_lag, \
+         patch("app.core.loop_monitor.record_loop_stall") as mock_stall:
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert mock_stall.call_count == 1
+    message = mock_logger.warning.call_args.args[0] % mock_logger.warning.call_args.args[1:]
+    assert "blocking_handler" in message
+    assert max(c.args[0] for c in mock_lag.call_args_list) >= 0.2
+
+
+def test_sample_stacks_collapsed_format():
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_worker, name="busy worker")
+    thread.start()
+    try:
+        collapsed = sample_stacks(0.1, 0.005)
+    finally:
+        stop.set()
+        thread.join()
+
+    lines = [line for line in collapsed.splitlines() if line.startswith("busy_worker;")]
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert "busy_worker (test_loop_monitor.py:" in stack
+    assert int(count) > 0
+
+
+@pytest.mark.anyio
+async def test_profile_endpoint_requires_admin_token(client):
+    assert (await client.get("/api/admin/profile")).status_code == 404
+    with patch("app.api.admin.settings.ADMIN_TOKEN", "secret"):
+        assert (await client.get("/api/admin/profile", headers={"X-Admin-Token": "nope"})).status_code == 403
+        response = await client.get(
+            "/api/admin/profile", params={"seconds": 0.05}, headers={"X-Admin-Token": "secret"}
+        )
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].endswith('filename="profile.collapsed"')
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in response.text.splitlines())
+
+
+@pytest.mark.anyio
+async def test_large_responses_are_parsed_off_loop():
+    loop_thread = threading.get_ident()
+
+    def parse(content):
+        return threading.get_ident()
+
+    with patch("app.services.llm.settings.PARSE_OFFLOAD_BYTES", 10):
+        assert await _parse_off_loop(parse, "short") == loop_thread
+        assert await _parse_off_loop(parse, "x" * 11) != loop_thread
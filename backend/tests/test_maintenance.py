@@ -0,0 +1,98 @@
+"""Tests for the table maintenance job."""
+from datetime import datetime, timedelta
+from functools import partial
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import (
+    FreeTrialArchive,
+    FreeTrialTracking,
+    GenerationToken,
+    GenerationTokenArchive,
+    PaymentTransaction,
+    PaymentTransactionArchive,
+)
+from app.services.maintenance import run_maintenance
+
+NOW = datetime(2036, 6, 1)
+OLD = NOW - timedelta(days=60)
+
+
+@pytest.fixture
+def old_token(make_token):
+    """Tokens last touched at OLD, expiring relative to NOW."""
+    return partial(make_token, now=NOW, created_at=OLD, updated_at=OLD)
+
+
+def _transaction(token, n):
+    return PaymentTransaction(
+        token_id=token.id, product_sku="future_hn_pack_3", provider_transaction_id=f"ch_{n}",
+        amount_cents=799, currency="usd", status="succeeded", device_id=token.device_id, created_at=OLD,
+    )
+
+
+async def _count(session_factory, model):
+    async with session_factory() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+@pytest.mark.anyio
+async def test_archives_dead_tokens_with_transactions(session_factory, old_token, add_rows):
+    live = old_token()
+    exhausted = old_token(remaining=0)
+    expired = old_token(expires_in_days=-1)
+    recently_exhausted = old_token(remaining=0, updated_at=NOW - timedelta(days=1))
+    tokens = [live, exhausted, expired, recently_exhausted]
+    await add_rows(*tokens)
+    await add_rows(*(_transaction(t, i) for i, t in enumerate(tokens)))
+
+    result = await run_maintenance(session_factory, now=NOW)
+
+    assert result["generation_tokens"] == 2
+    async with session_factory() as db:
+        remaining = set((await db.execute(select(GenerationToken.id))).scalars())
+        archived = set((await db.execute(select(GenerationTokenArchive.id))).scalars())
+        archived_tx = set((await db.execute(select(PaymentTransactionArchive.token_id))).scalars())
+    assert remaining == {live.id, recently_exhausted.id}
+    assert archived == archived_tx == {exhausted.id, expired.id}
+    assert await _count(session_factory, PaymentTransaction) == 2
+
+
+@pytest.mark.anyio
+async def test_batches_are_bounded(session_factory, old_token, add_rows):
+    await add_rows(*(old_token(remaining=0) for _ in range(7)))
+
+    with patch("app.services.maintenance.settings.MAINTENANCE_BATCH_SIZE", 3), \
+         patch("app.services.maintenance.settings.MAINTENANCE_MAX_BATCHES", 2), \
+         patch("app.services.maintenance.settings.MAINTENANCE_BATCH_PAUSE_SECONDS", 0):
+        result = await run_maintenance(session_factory, now=NOW)
+
+    assert result["generation_tokens"] == 6
+    assert await _count(session_factory, GenerationToken) == 1
+
+
+@pytest.mark.anyio
+async def test_compacted_trial_is_restored_on_next_visit(session_factory, db_client):
+    async with session_factory() as db:
+        db.add(FreeTrialTracking(device_id="old-device", uses_count=1, created_at=OLD - timedelta(days=100),
+                                 updated_at=OLD - timedelta(days=100)))
+        db.add(FreeTrialTracking(device_id="recent-device", uses_count=1, updated_at=NOW))
+        await db.commit()
+
+    result = await run_maintenance(session_factory, now=NOW)
+
+    assert result["free_trial_tracking"] == 1
+    assert await _count(session_factory, FreeTrialArchive) == 1
+
+    # The compacted device must not get a second free trial.
+    response = await db_client.get("/api/trial-status/old-device")
+    assert response.json() == {"has_free_trial": False, "uses_remaining": 0}
+    response = await db_client.post("/api/generate", json={"year": 2035, "device_id": "old-device"})
+    assert response.status_code == 402
+
+    assert await _count(session_factory, FreeTrialArchive) == 0
+    async with session_factory() as db:
+        devices = set((await db.execute(select(FreeTrialTracking.device_id))).scalars())
+    assert devices == {"old-device", "recent-device"}
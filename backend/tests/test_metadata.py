@@ -0,0 +1,55 @@
+"""Tests for story metadata synthesis."""
+import statistics
+
+from app.services.metadata import (
+    GRAVITY,
+    domain_from_url,
+    format_age,
+    synthesize_columns,
+    synthesize_metadata,
+)
+
+
+def test_domain_from_url():
+    assert domain_from_url("https://www.nature.com/articles/x") == "nature.com"
+    assert domain_from_url("https://blog.rust-lang.org/2035") == "blog.rust-lang.org"
+    assert domain_from_url("github.com/foo/bar") == "github.com"
+
+
+def test_format_age():
+    assert format_age(0.5) == "30 minutes ago"
+    assert format_age(1.2) == "1 hour ago"
+    assert format_age(5.9) == "5 hours ago"
+    assert format_age(30) == "1 day ago"
+
+
+def test_same_seed_same_columns():
+    assert synthesize_columns(30, 42) == synthesize_columns(30, 42)
+    assert synthesize_columns(30, 42) != synthesize_columns(30, 43)
+
+
+def test_distributions_look_like_hn():
+    columns = synthesize_columns(5000, 7)
+    scores = columns["score"]
+    # Heavy tail: the mean sits well above the median.
+    assert statistics.mean(scores) > statistics.median(scores) * 1.2
+    assert 80 < statistics.median(scores) < 250
+
+
+def test_rows_follow_ranking_order():
+    columns = synthesize_columns(30, 3)
+    ranks = [(s - 1) / (a + 2) ** GRAVITY for s, a in zip(columns["score"], columns["age_hours"])]
+    assert ranks == sorted(ranks, reverse=True)
+
+
+def test_comments_track_score_and_ask_hn_runs_hot():
+    stories = [{"title": "Ask HN: x" if i % 2 else "Show HN: y", "url": "https://a.dev"} for i in range(2000)]
+    synthesize_metadata(stories, 11)
+
+    ask = [s["comments"] / s["score"] for s in stories if s["title"].startswith("Ask")]
+    show = [s["comments"] / s["score"] for s in stories if s["title"].startswith("Show")]
+    assert statistics.median(ask) > statistics.median(show) * 1.5
+
+    top = sorted(stories, key=lambda s: s["score"])[-200:]
+    bottom = sorted(stories, key=lambda s: s["score"])[:200]
+    assert statistics.mean(s["comments"] for s in top) > statistics.mean(s["comments"] for s in bottom)
@@ -0,0 +1,69 @@
+"""Multiprocess metrics: values from several worker processes merge into one scrape."""
+import glob
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from app.core.metrics import TOOL_SLUG, mark_worker_dead, merged_registry, prepare_multiprocess_dir
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+WORKER = """
+import os
+from prometheus_client import Gauge
+from app.core.metrics import record_generation, record_llm_call
+
+for _ in range({n}):
+    record_generation("paid")
+    record_llm_call("m", "stories", "ok", latency=1.0)
+# Declared as prometheus_fastapi_instrumentator declares it.
+Gauge("http_requests_inprogress", "In progress", ["method", "handler"], multiprocess_mode="livesum").labels("GET", "/").inc()
+print(os.getpid())
+"""
+
+
+def _run_worker(path, n: int) -> int:
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(path)}
+    out = subprocess.run(
+        [sys.executable, "-c", WORKER.format(n=n)],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    return int(out.stdout.strip())
+
+
+def test_counters_and_histograms_sum_across_workers(tmp_path):
+    for n in (1, 2, 3):
+        _run_worker(tmp_path, n)
+
+    registry = merged_registry(str(tmp_path))
+    assert registry.get_sample_value("generation_total", {"tool": TOOL_SLUG, "type": "paid"}) == 6
+    assert registry.get_sample_value(
+        "llm_call_latency_seconds_count", {"tool": TOOL_SLUG, "model": "m", "purpose": "stories"}
+    ) == 6
+
+
+def test_dead_worker_gauge_files_are_removed(tmp_path):
+    first, second = _run_worker(tmp_path, 1), _run_worker(tmp_path, 1)
+    assert merged_registry(str(tmp_path)).get_sample_value("http_requests_inprogress", {"method": "GET", "handler": "/"}) == 2
+
+    mark_worker_dead(first, str(tmp_path))
+
+    assert not glob.glob(str(tmp_path / f"gauge_livesum_{first}.db"))
+    assert glob.glob(str(tmp_path / f"gauge_livesum_{second}.db"))
+    registry = merged_registry(str(tmp_path))
+    assert registry.get_sample_value("http_requests_inprogress", {"method": "GET", "handler": "/"}) == 1
+    # Counters of the dead worker still count.
+    assert registry.get_sample_value("generation_total", {"tool": TOOL_SLUG, "type": "paid"}) == 2
+
+
+def test_prepare_wipes_previous_run(tmp_path):
+    _run_worker(tmp_path, 1)
+    (tmp_path / "keep.txt").write_text("x")
+
+    prepare_multiprocess_dir(str(tmp_path))
+
+    assert not glob.glob(str(tmp_path / "*.db"))
+    assert (tmp_path / "keep.txt").exists()
+    prepare_multiprocess_dir(str(tmp_path / "new"))
+    assert (tmp_path / "new").is_dir()
@@ -0,0 +1,123 @@
+"""Tests for the index migrations applied to existing databases."""
+import os
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.database import Base
+from app.core.migrations import migrate
+from app.models import GeneratedStory, GenerationToken, PaymentTransaction
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+needs_postgres = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.mark.anyio
+async def test_other_databases_are_left_alone(session_factory):
+    assert await migrate(session_factory.kw["bind"]) == []
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_old_schema_gets_the_new_indexes():
+    schema = f"migrate_{uuid.uuid4().hex[:8]}"
+    admin = create_async_engine(POSTGRES_URL)
+    async with admin.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_async_engine(POSTGRES_URL, connect_args={"server_settings": {"search_path": schema}})
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all,
+                tables=[GenerationToken.__table__, PaymentTransaction.__table__, GeneratedStory.__table__],
+            )
+            # The schema as it was before the live-token index.
+            await conn.execute(text("DROP INDEX ix_generation_tokens_device_live"))
+            await conn.execute(text("DROP INDEX ix_payment_transactions_token_id"))
+            await conn.execute(text("CREATE INDEX ix_generation_tokens_device_id ON generation_tokens (device_id)"))
+            # Left behind by an interrupted CONCURRENTLY build.
+            await conn.execute(text("CREATE INDEX ix_payment_transactions_token_id ON payment_transactions (token_id)"))
+            await conn.execute(text(
+                "UPDATE pg_index SET indisvalid = false WHERE indexrelid = 'ix_payment_transactions_token_id'::regclass"
+            ))
+
+        applied = await migrate(engine)
+
+        assert [statement.split(" ON ")[0] for statement in applied] == [
+            "CREATE INDEX CONCURRENTLY ix_generation_tokens_device_live",
+            "DROP INDEX CONCURRENTLY ix_payment_transactions_token_id",
+            "CREATE INDEX CONCURRENTLY ix_payment_transactions_token_id",
+            "DROP INDEX CONCURRENTLY ix_generation_tokens_device_id",
+        ]
+        async with engine.connect() as conn:
+            indexes = dict((await conn.execute(text(
+                "SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = :schema AND NOT i.indisprimary"
+            ), {"schema": schema})).all())
+        assert indexes["ix_generation_tokens_device_live"] and indexes["ix_payment_transactions_token_id"]
+        assert "ix_generation_tokens_device_id" not in indexes
+        assert await migrate(engine) == []
+    finally:
+        await engine.dispose()
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await admin.dispose()
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_old_jobs_table_gets_the_payer_column():
+    schema = f"migrate_{uuid.uuid4().hex[:8]}"
+    admin = create_async_engine(POSTGRES_URL)
+    async with admin.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_async_engine(POSTGRES_URL, connect_args={"server_settings": {"search_path": schema}})
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text("ALTER TABLE generation_jobs DROP COLUMN payer"))
+
+        assert await migrate(engine) == ["ALTER TABLE generation_jobs ADD COLUMN payer VARCHAR(300)"]
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT payer FROM generation_jobs"))
+        assert await migrate(engine) == []
+    finally:
+        await engine.dispose()
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await admin.dispose()
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_old_search_index_is_replaced():
+    schema = f"migrate_{uuid.uuid4().hex[:8]}"
+    admin = create_async_engine(POSTGRES_URL)
+    async with admin.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_async_engine(POSTGRES_URL, connect_args={"server_settings": {"search_path": schema}})
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            # The table as it was before search_text; its index goes with the column.
+            await conn.execute(text("ALTER TABLE generated_stories DROP COLUMN search_text"))
+            await conn.execute(text(
+                "CREATE INDEX ix_generated_stories_search ON generated_stories "
+                "USING gin (to_tsvector('simple', title || ' ' || coalesce(summary, '')))"
+            ))
+
+        applied = await migrate(engine)
+
+        assert [statement.split(" ON ")[0] for statement in applied] == [
+            "ALTER TABLE generated_stories ADD COLUMN search_text TEXT",
+            "CREATE INDEX CONCURRENTLY ix_generated_stories_search_text",
+            "DROP INDEX CONCURRENTLY ix_generated_stories_search",
+        ]
+        assert await migrate(engine) == []
+    finally:
+        await engine.dispose()
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await admin.dispose()
@@ -0,0 +1,120 @@
+"""Tests for model routing and circuit breaking."""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.llm import generate_story_details
+from app.services.model_router import ModelRouter, parse_endpoint
+from tests.fakes import FakeCompletion
+
+
+def _router(*specs, **kwargs):
+    return ModelRouter([parse_endpoint(s, i) for i, s in enumerate(specs)], **kwargs)
+
+
+def test_parse_endpoint_with_proxy():
+    endpoint = parse_endpoint("gpt-4o-mini@https://backup-proxy.example", 2)
+    assert endpoint.model == "gpt-4o-mini"
+    assert endpoint.base_url == "https://backup-proxy.example"
+    assert endpoint.position == 2
+    assert parse_endpoint("gemini-2.5-flash").base_url is None
+
+
+def test_priority_order_by_default():
+    router = _router("primary", "backup")
+    assert [e.model for e in router.candidates("stories")] == ["primary", "backup"]
+
+
+def test_circuit_opens_after_threshold():
+    router = _router("primary", "backup", failure_threshold=2)
+    primary = router.endpoints[0]
+
+    router.record_failure(primary)
+    assert [e.model for e in router.candidates("stories")] == ["primary", "backup"]
+
+    router.record_failure(primary)
+    assert [e.model for e in router.candidates("stories")] == ["backup"]
+
+
+def test_circuit_half_open_after_reset():
+    router = _router("primary", "backup", failure_threshold=1, reset_seconds=10)
+    primary = router.endpoints[0]
+
+    with patch("app.services.model_router.time.monotonic", return_value=100.0):
+        router.record_failure(primary)
+    with patch("app.services.model_router.time.monotonic", return_value=105.0):
+        assert [e.model for e in router.candidates("stories")] == ["backup"]
+    with patch("app.services.model_router.time.monotonic", return_value=111.0):
+        assert [e.model for e in router.candidates("stories")] == ["primary", "backup"]
+        # A failed trial re-opens the circuit immediately.
+        router.record_failure(primary)
+        assert [e.model for e in router.candidates("stories")] == ["backup"]
+
+    router.record_success(primary, 1.0)
+    assert primary.opened_at is None
+
+
+def test_half_open_lets_one_trial_through():
+    router = _router("primary", "backup", failure_threshold=1, reset_seconds=10)
+    primary = router.endpoints[0]
+
+    with patch("app.services.model_router.time.monotonic", return_value=100.0):
+        router.record_failure(primary)
+    with patch("app.services.model_router.time.monotonic", return_value=111.0):
+        assert router.begin_call(primary)
+        # Concurrent callers skip it while the trial is in flight.
+        assert not router.begin_call(primary)
+        assert [e.model for e in router.candidates("stories")] == ["backup"]
+        assert router.begin_call(router.endpoints[1])
+    with patch("app.services.model_router.time.monotonic", return_value=121.0):
+        # A trial that never reported back stops blocking the endpoint.
+        assert [e.model for e in router.candidates("stories")] == ["primary", "backup"]
+        assert router.begin_call(primary)
+
+    router.record_success(primary, 1.0)
+    assert router.begin_call(primary) and router.begin_call(primary)
+
+
+def test_all_open_returns_least_recently_tripped():
+    router = _router("primary", "backup", failure_threshold=1)
+    with patch("app.services.model_router.time.monotonic", return_value=100.0):
+        router.record_failure(router.endpoints[1])
+    with patch("app.services.model_router.time.monotonic", return_value=101.0):
+        router.record_failure(router.endpoints[0])
+        assert [e.model for e in router.candidates("stories")] == ["backup"]
+
+
+def test_fastest_routing():
+    router = _router("primary", "fast", routing={"details": "fastest"})
+    router.record_success(router.endpoints[0], 4.0)
+    router.record_success(router.endpoints[1], 1.0)
+
+    assert [e.model for e in router.candidates("details")] == ["fast", "primary"]
+    # Stories keep the configured order.
+    assert [e.model for e in router.candidates("stories")] == ["primary", "fast"]
+
+
+@pytest.mark.anyio
+async def test_llm_falls_back_to_next_model():
+    router = _router("primary", "backup")
+
+    mock_response = FakeCompletion()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"summary": "ok", "comments": []}'
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(side_effect=[RuntimeError("503"), mock_response])
+
+    with patch("app.services.llm.model_router", router), \
+         patch("app.services.llm.get_client", return_value=mock_client), \
+         patch("app.services.llm.record_llm_call") as mock_record:
+        result = await generate_story_details({"title": "Test"})
+
+    assert result["summary"] == "ok"
+    models = [c.kwargs["model"] for c in mock_client.chat.completions.create.call_args_list]
+    assert models == ["primary", "backup"]
+    assert router.endpoints[0].consecutive_failures == 1
+    assert [c.args[:3] for c in mock_record.call_args_list] == [
+        ("primary", "details", "error"),
+        ("backup", "details", "ok"),
+    ]
@@ -0,0 +1,136 @@
+"""Tests for the prompt registry and per-variant metrics."""
+import random
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.metrics import TOOL_SLUG
+from app.services.llm import _complete, _extract_json, generate_stories, prompt_registry
+from app.services.prompts import PromptRegistry, PromptVariant
+from app.services.wire import encode_compact
+from tests.fakes import FakeCompletion
+
+
+def _variant(name, weight=1.0, format="json", stream=False, purpose="stories"):
+    return PromptVariant(purpose, name, 1, lambda *a: "prompt", 0.5, max_tokens=100,
+                         weight=weight, format=format, stream=stream)
+
+
+def _calls(variant, outcome, purpose="stories"):
+    labels = {"tool": TOOL_SLUG, "purpose": purpose, "variant": variant, "outcome": outcome}
+    return REGISTRY.get_sample_value("llm_prompt_calls_total", labels) or 0
+
+
+def test_registry_rejects_duplicate_versions():
+    registry = PromptRegistry()
+    registry.register(_variant("a"))
+    with pytest.raises(ValueError):
+        registry.register(_variant("a"))
+    assert registry.get("stories", "a.v1").name == "a"
+
+
+def test_choose_splits_traffic_by_weight():
+    registry = PromptRegistry()
+    registry.register(_variant("a", weight=3))
+    registry.register(_variant("b", weight=1))
+    registry.register(_variant("off", weight=0))
+    rng = random.Random(0)
+
+    picks = [registry.choose("stories", rng=rng).key for _ in range(2000)]
+
+    assert picks.count("off.v1") == 0
+    assert 0.7 < picks.count("a.v1") / len(picks) < 0.8
+
+
+def test_weights_override_and_format_filter():
+    registry = PromptRegistry()
+    registry.register(_variant("a", format="compact"))
+    registry.register(_variant("b", weight=0, format="compact"))
+    registry.register(_variant("c"))
+
+    with patch("app.services.prompts.settings.LLM_PROMPT_WEIGHTS", {"stories": {"b.v1": 1, "c.v1": 1}}):
+        assert registry.choose("stories", format="compact").key == "b.v1"
+    assert registry.choose("stories", format="compact").key == "a.v1"
+    assert registry.choose("stories", format="json").key == "c.v1"
+
+
+def _client(content, usage=None):
+    response = FakeCompletion()
+    response.choices = [MagicMock()]
+    response.choices[0].message.content = content
+    response.choices[0].finish_reason = "stop"
+    response.usage = usage
+    client = AsyncMock()
+    client.chat.completions.create.return_value = response
+    return client
+
+
+@pytest.mark.anyio
+async def test_page_records_its_variant():
+    content = encode_compact([{"title": f"Story {i}", "url": f"https://s{i}.dev"} for i in range(30)], ["title", "url"])
+    client = _client(content, usage=SimpleNamespace(completion_tokens=420))
+    labels = {"tool": TOOL_SLUG, "purpose": "stories", "variant": "compact.v1"}
+    tokens_before = REGISTRY.get_sample_value("llm_prompt_output_tokens_sum", labels) or 0
+    ttft_before = REGISTRY.get_sample_value("llm_prompt_ttft_seconds_count", labels) or 0
+    calls_before = _calls("compact.v1", "ok")
+
+    with patch("app.services.llm.get_client", return_value=client):
+        page = await generate_stories(2035, "en")
+
+    assert page.prompt_variant == "compact.v1"
+    assert _calls("compact.v1", "ok") == calls_before + 1
+    assert REGISTRY.get_sample_value("llm_prompt_output_tokens_sum", labels) == tokens_before + 420
+    # Stories are streamed, so production pages report time to first token.
+    assert REGISTRY.get_sample_value("llm_prompt_ttft_seconds_count", labels) == ttft_before + 1
+
+
+@pytest.mark.anyio
+async def test_unparseable_compact_page_is_recorded_and_retried_as_json():
+    client = _client("Sorry, no stories today.")
+    client.chat.completions.create.side_effect = [
+        client.chat.completions.create.return_value,
+        _client('[{"title": "Fusion", "url": "https://f.dev"}]').chat.completions.create.return_value,
+    ]
+    failures_before = _calls("compact.v1", "parse_error")
+
+    with patch("app.services.llm.get_client", return_value=client), \
+         patch("app.services.llm._top_up_stories", AsyncMock(return_value=[])):
+        page = await generate_stories(2035, "en")
+
+    assert _calls("compact.v1", "parse_error") == failures_before + 1
+    assert page.prompt_variant == "json.v1"
+
+
+async def _stream(*pieces):
+    for piece in pieces:
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)])
+    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason="stop")])
+    yield SimpleNamespace(choices=[], usage=SimpleNamespace(completion_tokens=7))
+
+
+@pytest.mark.anyio
+async def test_streamed_variant_reports_time_to_first_token():
+    variant = _variant("streamed", stream=True, purpose="details")
+    client = AsyncMock()
+    client.chat.completions.create.return_value = _stream('{"summary": ', '"ok", "comments": []}')
+    labels = {"tool": TOOL_SLUG, "purpose": "details", "variant": "streamed.v1"}
+
+    with patch("app.services.llm.get_client", return_value=client):
+        result = await _complete(variant, "prompt", _extract_json)
+
+    assert result == {"summary": "ok", "comments": []}
+    kwargs = client.chat.completions.create.call_args.kwargs
+    assert kwargs["stream"] is True and kwargs["stream_options"] == {"include_usage": True}
+    assert REGISTRY.get_sample_value("llm_prompt_ttft_seconds_count", labels) == 1
+    assert REGISTRY.get_sample_value("llm_prompt_output_tokens_sum", labels) == 7
+
+
+def test_stories_and_details_are_streamed():
+    assert all(v.stream for purpose in ("stories", "details") for v in prompt_registry.variants(purpose))
+
+
+def test_every_purpose_has_a_variant_with_traffic():
+    for purpose in ("stories", "details", "replies"):
+        assert any(prompt_registry.weight(v) > 0 for v in prompt_registry.variants(purpose))
@@ -0,0 +1,107 @@
+"""Per-request query counting, and query budgets for the hot endpoints."""
+import hashlib
+import hmac
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.metrics import TOOL_SLUG
+from app.core.query_stats import assert_max_queries, track_queries
+
+STORIES = [{"id": 1, "title": "Fusion at last", "url": "https://fusion.dev"}]
+
+
+@pytest.fixture
+def mock_generation():
+    with patch("app.routes.api.generate_stories", AsyncMock(return_value=STORIES)), \
+         patch("app.routes.api.story_corpus.remix", return_value=None):
+        yield
+
+
+@pytest.mark.anyio
+async def test_nested_tracking_and_failed_statements(session_factory):
+    async with session_factory() as db:
+        with track_queries() as outer:
+            with track_queries() as inner:
+                await db.execute(text("SELECT 1"))
+            await db.execute(text("SELECT 2"))
+            with pytest.raises(Exception):
+                await db.execute(text("SELECT * FROM no_such_table"))
+            await db.rollback()
+            await db.execute(text("SELECT 3"))
+
+    assert inner.count == 1
+    assert outer.count == 3
+    assert outer.seconds > 0
+
+
+@pytest.mark.anyio
+async def test_assert_max_queries_fails_over_budget(session_factory):
+    with pytest.raises(AssertionError, match="at most 1 queries, got 2"):
+        async with session_factory() as db:
+            with assert_max_queries(1):
+                await db.execute(text("SELECT 1"))
+                await db.execute(text("SELECT 2"))
+
+
+@pytest.mark.anyio
+async def test_route_metrics(db_client):
+    labels = {"tool": TOOL_SLUG, "route": "/api/trial-status/{device_id}"}
+    before = REGISTRY.get_sample_value("http_request_db_queries_count", labels) or 0
+
+    with patch("app.core.query_stats.settings.DB_QUERY_BUDGET", 1), \
+         patch("app.core.query_stats.logger") as mock_logger:
+        await db_client.get("/api/trial-status/dev")
+
+    assert REGISTRY.get_sample_value("http_request_db_queries_count", labels) == before + 1
+    assert REGISTRY.get_sample_value("http_request_db_queries_sum", labels) >= 2
+    mock_logger.warning.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_free_trial_generate_query_budget(db_client, mock_generation):
+    # Each budget includes the INSERT that stores the page.
+    with assert_max_queries(4):
+        response = await db_client.post("/api/generate", json={"year": 2035, "device_id": "dev"})
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_token_generate_query_budget(db_client, mock_generation, make_token, add_rows):
+    token = make_token()
+    await add_rows(token)
+    with assert_max_queries(3):
+        response = await db_client.post("/api/generate", json={"year": 2035, "token": token.token})
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_wallet_generate_query_budget(db_client, mock_generation, make_token, add_rows):
+    await add_rows(make_token())
+    with assert_max_queries(2):
+        response = await db_client.post("/api/generate", json={"year": 2035, "device_id": "dev", "use_wallet": True})
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_webhook_query_budget(db_client):
+    payload = json.dumps({
+        "eventType": "checkout.completed",
+        "object": {
+            "id": "ch_1",
+            "metadata": {"product_sku": "future_hn_pack_3", "device_id": "dev", "generations": "3"},
+            "order": {"amount": 799, "currency": "usd"},
+            "customer": {"email": "a@b.c"},
+        },
+    }).encode()
+    signature = hmac.new(settings.CREEM_WEBHOOK_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+
+    with assert_max_queries(2):
+        response = await db_client.post(
+            "/api/webhooks/creem", content=payload, headers={"creem-signature": signature}
+        )
+    assert response.status_code == 200
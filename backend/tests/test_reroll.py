@@ -0,0 +1,255 @@
+"""Tests for re-rolling individual stories on an existing page."""
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import select
+
+from app.models import FreeTrialTracking, RerollAllowance, StoredPage
+from app.services.llm import reroll_stories
+from app.services.maintenance import run_maintenance
+from app.services.metadata import StoryPage
+from app.services.pages import load_page, save_page
+from app.services.wire import encode_compact
+from tests.fakes import FakeCompletion
+
+
+def _page():
+    stories = [
+        {"id": i, "title": f"Story {i}", "url": f"https://s{i}.dev", "domain": f"s{i}.dev", "score": 100 - i}
+        for i in range(1, 6)
+    ]
+    return StoryPage(stories, seed=7, prompt_variant="compact.v1")
+
+
+async def _banked(session_factory, payer):
+    async with session_factory() as db:
+        return (await db.execute(select(RerollAllowance.stories).where(RerollAllowance.payer == payer))).scalar()
+
+
+async def _stored_page(session_factory) -> str:
+    async with session_factory() as db:
+        page_id = save_page(db, 2035, "en", _page())
+        await db.commit()
+    return page_id
+
+
+@pytest.mark.anyio
+async def test_reroll_edits_the_page_generate_returned(
+    session_factory, db_client, make_token, add_rows, remaining_generations
+):
+    token = make_token()
+    await add_rows(token)
+    stories = {}
+    details = {"2035_en_Story 2": {"summary": "old"}, "2035_en_Fresh take": {"summary": "fresh"}}
+    new = AsyncMock(side_effect=[
+        [{"title": "Fresh take", "url": "https://fresh.dev/x"}],
+        [{"title": "Another one", "url": "https://a.dev"}],
+    ])
+
+    with patch("app.routes.api._stories_cache", stories), \
+         patch("app.routes.api._details_cache", details), \
+         patch("app.routes.api.generate_stories", AsyncMock(return_value=_page())), \
+         patch("app.routes.api.story_corpus.add_page", AsyncMock()), \
+         patch("app.routes.api.index_page", AsyncMock()) as index, \
+         patch("app.routes.api.reroll_stories", new):
+        generated = await db_client.post("/api/generate", json={"year": 2035, "token": token.token})
+        page_id = generated.json()["page_id"]
+        shared = stories["2035_en"]
+        response = await db_client.post(
+            "/api/reroll", json={"year": 2035, "token": token.token, "story_ids": [2], "page_id": page_id}
+        )
+        opened = await db_client.get(f"/api/story/2/details?year=2035&lang=en&page_id={page_id}")
+        shared_details = await db_client.get("/api/story/2/details?year=2035&lang=en")
+        again = await db_client.post(
+            "/api/reroll", json={"year": 2035, "token": token.token, "story_ids": [3], "page_id": page_id}
+        )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["page_id"] == page_id
+    assert body["rerolled"] == [2] and body["credits_charged"] == 1
+    assert [s["title"] for s in body["stories"]] == ["Story 1", "Fresh take", "Story 3", "Story 4", "Story 5"]
+    # The slot keeps its id and position metadata; the domain follows the new url.
+    assert body["stories"][1] == {"id": 2, "title": "Fresh take", "url": "https://fresh.dev/x",
+                                  "domain": "fresh.dev", "score": 98}
+    keep, replace = new.call_args_list[0].args[2:]
+    assert keep == ["Story 1", "Story 3", "Story 4", "Story 5"] and replace == ["Story 2"]
+    # The latest page in memory stays as generated, details included.
+    assert stories["2035_en"] is shared and shared[1]["title"] == "Story 2"
+    assert opened.json()["summary"] == "fresh" and shared_details.json()["summary"] == "old"
+    assert details["2035_en_Story 2"] == {"summary": "old"}
+    assert [s["title"] for s in index.call_args.args[2]] == ["Another one"]
+    # The second re-roll builds on the first, from the database, and is paid
+    # from the re-rolls the first generation bought.
+    assert again.json()["page_id"] == page_id and again.json()["credits_charged"] == 0
+    async with session_factory() as db:
+        stored = await load_page(db, 2035, "en", page_id)
+    assert [s["title"] for s in stored][1:3] == ["Fresh take", "Another one"]
+    assert stored.seed == 7 and stored.prompt_variant == "compact.v1"
+    assert (await remaining_generations())[token.token] == 1
+    assert await _banked(session_factory, f"token:{token.token}") == 8
+
+
+@pytest.mark.anyio
+async def test_reroll_charges_per_block_of_stories(
+    session_factory, db_client, make_token, add_rows, remaining_generations
+):
+    token = make_token()
+    await add_rows(token)
+    new = AsyncMock(return_value=[{"title": f"New {i}", "url": "https://n.dev"} for i in range(3)])
+
+    page_id = await _stored_page(session_factory)
+
+    with patch("app.routes.api.index_page", AsyncMock()), \
+         patch("app.routes.api.reroll_stories", new), \
+         patch("app.routes.api.settings.REROLL_STORIES_PER_CREDIT", 2):
+        response = await db_client.post(
+            "/api/reroll", json={"year": 2035, "token": token.token, "story_ids": [1, 3, 5], "page_id": page_id}
+        )
+
+    assert response.json()["credits_charged"] == 2
+    assert (await remaining_generations())[token.token] == 1
+    assert await _banked(session_factory, f"token:{token.token}") == 1
+
+
+@pytest.mark.anyio
+async def test_short_answer_is_charged_for_the_stories_added(
+    session_factory, db_client, make_token, add_rows, remaining_generations
+):
+    token = make_token()
+    await add_rows(token)
+    new = AsyncMock(return_value=[{"title": "Only one", "url": "https://n.dev"}])
+
+    page_id = await _stored_page(session_factory)
+
+    with patch("app.routes.api.index_page", AsyncMock()), \
+         patch("app.routes.api.reroll_stories", new), \
+         patch("app.routes.api.settings.REROLL_STORIES_PER_CREDIT", 2):
+        response = await db_client.post(
+            "/api/reroll", json={"year": 2035, "token": token.token, "story_ids": [1, 3, 5], "page_id": page_id}
+        )
+
+    assert response.json()["rerolled"] == [1] and response.json()["credits_charged"] == 1
+    assert (await remaining_generations())[token.token] == 2
+    assert await _banked(session_factory, f"token:{token.token}") == 1
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("use_wallet", [False, True])
+async def test_failed_reroll_is_refunded(
+    session_factory, db_client, use_wallet, make_token, add_rows, remaining_generations
+):
+    token = make_token()
+    await add_rows(token)
+    page_id = await _stored_page(session_factory)
+    body = {"year": 2035, "device_id": "dev", "use_wallet": use_wallet, "story_ids": [2], "page_id": page_id}
+
+    with patch("app.routes.api.reroll_stories", AsyncMock(side_effect=RuntimeError("llm down"))), \
+         patch("app.routes.api.settings.FREE_TRIAL_LIMIT", 3):
+        with pytest.raises(RuntimeError):
+            await db_client.post("/api/reroll", json=body)
+
+    async with session_factory() as db:
+        uses = (await db.execute(select(FreeTrialTracking.uses_count))).scalar()
+    assert (uses or 0) == 0
+    assert (await remaining_generations())[token.token] == 3
+    assert await _banked(session_factory, f"{'wallet' if use_wallet else 'trial'}:dev") == 0
+
+
+@pytest.mark.anyio
+async def test_failed_reroll_returns_the_last_wallet_credit(
+    session_factory, db_client, make_token, add_rows, remaining_generations
+):
+    token = make_token(remaining=1)
+    await add_rows(token)
+    page_id = await _stored_page(session_factory)
+    body = {"year": 2035, "device_id": "dev", "use_wallet": True, "story_ids": [2], "page_id": page_id}
+
+    with patch("app.routes.api.reroll_stories", AsyncMock(side_effect=RuntimeError("llm down"))):
+        with pytest.raises(RuntimeError):
+            await db_client.post("/api/reroll", json=body)
+
+    assert (await remaining_generations())[token.token] == 1
+    assert await _banked(session_factory, "wallet:dev") == 0
+
+
+@pytest.mark.anyio
+async def test_reroll_without_page_or_with_unknown_ids_is_not_charged(
+    session_factory, db_client, make_token, add_rows, remaining_generations
+):
+    token = make_token()
+    await add_rows(token)
+    page_id = await _stored_page(session_factory)
+    body = {"year": 2035, "token": token.token, "page_id": page_id}
+    new = AsyncMock()
+
+    with patch("app.routes.api._stories_cache", {"2035_en": _page()}), \
+         patch("app.routes.api.reroll_stories", new):
+        no_id = await db_client.post("/api/reroll", json={**body, "page_id": None, "story_ids": [1]})
+        other_year = await db_client.post("/api/reroll", json={**body, "year": 2036, "story_ids": [1]})
+        unknown = await db_client.post("/api/reroll", json={**body, "story_ids": [1, 42]})
+        repeated = await db_client.post("/api/reroll", json={**body, "story_ids": [1, 1]})
+
+    assert [r.status_code for r in (no_id, other_year, unknown, repeated)] == [422, 404, 404, 422]
+    new.assert_not_awaited()
+    assert (await remaining_generations())[token.token] == 3
+
+
+@pytest.mark.anyio
+async def test_token_without_enough_generations_is_refused(
+    session_factory, db_client, make_token, add_rows, remaining_generations
+):
+    token = make_token(remaining=1)
+    await add_rows(token)
+
+    page_id = await _stored_page(session_factory)
+
+    with patch("app.routes.api.settings.REROLL_STORIES_PER_CREDIT", 1):
+        response = await db_client.post(
+            "/api/reroll", json={"year": 2035, "token": token.token, "story_ids": [1, 2], "page_id": page_id}
+        )
+
+    assert response.status_code == 402
+    assert (await remaining_generations())[token.token] == 1
+
+
+@pytest.mark.anyio
+async def test_maintenance_purges_expired_pages(session_factory):
+    page_id = await _stored_page(session_factory)
+    later = datetime.utcnow() + timedelta(days=31)
+
+    result = await run_maintenance(session_factory, now=later)
+
+    assert result["story_pages"] == 1
+    async with session_factory() as db:
+        assert await db.get(StoredPage, page_id) is None
+
+
+@pytest.mark.anyio
+async def test_reroll_asks_only_for_the_replaced_stories():
+    response = FakeCompletion()
+    response.choices = [MagicMock()]
+    response.choices[0].message.content = encode_compact(
+        [{"title": "Story 3", "url": "https://dup.dev"}, {"title": "Orbital data centres", "url": "https://o.dev"}],
+        ["title", "url"],
+    )
+    response.choices[0].finish_reason = "stop"
+    response.usage = None
+    client = AsyncMock()
+    client.chat.completions.create.return_value = response
+
+    with patch("app.services.llm.get_client", return_value=client), \
+         patch("app.services.llm._top_up_stories", AsyncMock(return_value=[])) as top_up, \
+         patch("app.services.llm.settings.REROLL_PROMPT_TITLES", 1):
+        stories = await reroll_stories(2035, "en", ["Story 1", "Story 3"], ["Story 2", "Story 4"])
+
+    # A repeat of a kept title is dropped, even one the prompt left out, and
+    # the missing story topped up.
+    assert stories == [{"title": "Orbital data centres", "url": "https://o.dev"}]
+    assert top_up.call_args.args[3] == 1
+    kwargs = client.chat.completions.create.call_args.kwargs
+    prompt = kwargs["messages"][-1]["content"]
+    assert "Generate exactly 2 Hacker News" in prompt
+    assert all(f"- Story {i}" in prompt for i in (1, 2, 4)) and "Story 3" not in prompt
+    assert kwargs["max_tokens"] < 500
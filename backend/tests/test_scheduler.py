@@ -0,0 +1,182 @@
+"""Tests for priority scheduling of LLM calls."""
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models import GenerationToken
+from app.services.scheduler import PriorityScheduler, llm_priority, priority_class
+
+SHARES = {"paid": 0.5, "free": 0.25, "background": 0.25}
+
+
+async def _hold(scheduler, name, order, release: asyncio.Event):
+    async with scheduler.slot(name):
+        order.append(name)
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.anyio
+async def test_paid_waiter_jumps_the_queue():
+    scheduler = PriorityScheduler(1, SHARES, aging_seconds=60)
+    order, gate = [], asyncio.Event()
+    holder = asyncio.create_task(_hold(scheduler, "free", order, asyncio.Event()))
+    await _settle()
+    waiters = [asyncio.create_task(_hold(scheduler, name, order, gate))
+               for name in ("background", "free", "paid")]
+    await _settle()
+
+    holder.cancel()
+    await _settle()
+    assert order == ["free", "paid"]
+    gate.set()
+    await asyncio.gather(*waiters)
+    assert order == ["free", "paid", "free", "background"]
+    assert scheduler._in_use == 0
+
+
+@pytest.mark.anyio
+async def test_reserved_share_beats_rank():
+    scheduler = PriorityScheduler(4, SHARES, aging_seconds=60)
+    order, gate = [], asyncio.Event()
+    paid = [asyncio.create_task(_hold(scheduler, "paid", order, gate)) for _ in range(4)]
+    await _settle()
+    queued = [asyncio.create_task(_hold(scheduler, name, order, gate)) for name in ("paid", "free")]
+    await _settle()
+
+    paid[0].cancel()
+    await _settle()
+    # Free runs nothing and is below its reserved slot, so it goes before paid.
+    assert order[-1] == "free"
+    gate.set()
+    await asyncio.gather(*paid[1:], *queued)
+
+
+@pytest.mark.parametrize("waited,expected", [(5.0, "paid"), (25.0, "background")])
+@pytest.mark.anyio
+async def test_aging_prevents_starvation(waited, expected):
+    # Every class already runs its reserved share, so rank and age decide.
+    scheduler = PriorityScheduler(3, SHARES, aging_seconds=10)
+    order, gate = [], asyncio.Event()
+    now = [100.0]
+    with patch("app.services.scheduler.time.monotonic", side_effect=lambda: now[0]):
+        holders = [asyncio.create_task(_hold(scheduler, name, order, asyncio.Event()))
+                   for name in ("paid", "paid", "background")]
+        await _settle()
+        old = asyncio.create_task(_hold(scheduler, "background", order, gate))
+        await _settle()
+        now[0] += waited
+        fresh = asyncio.create_task(_hold(scheduler, "paid", order, gate))
+        await _settle()
+
+        holders[0].cancel()
+        await _settle()
+        assert order[-1] == expected
+        for holder in holders[1:]:
+            holder.cancel()
+        gate.set()
+        await asyncio.gather(old, fresh)
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = PriorityScheduler(1, SHARES, aging_seconds=60)
+    order = []
+    holder = asyncio.create_task(_hold(scheduler, "paid", order, asyncio.Event()))
+    await _settle()
+    waiter = asyncio.create_task(_hold(scheduler, "free", order, asyncio.Event()))
+    await _settle()
+    waiter.cancel()
+    holder.cancel()
+    await _settle()
+
+    assert scheduler._in_use == 0
+    async with scheduler.slot("background"):
+        assert scheduler.running["background"] == 1
+
+
+def test_priority_class_context():
+    assert llm_priority.get() == "free"
+    with priority_class("paid"):
+        assert llm_priority.get() == "paid"
+    assert llm_priority.get() == "free"
+
+
+@pytest.mark.anyio
+async def test_llm_calls_use_caller_priority():
+    from app.services.llm import _chat
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(return_value=MagicMock())
+    scheduler = PriorityScheduler(4, SHARES, aging_seconds=60)
+
+    with patch("app.services.llm.llm_scheduler", scheduler), \
+         patch("app.services.llm.get_client", return_value=mock_client), \
+         patch("app.services.scheduler.record_llm_queue_wait") as mock_record:
+        with priority_class("paid"):
+            await _chat("stories", messages=[])
+        await _chat("details", messages=[])
+
+    assert [c.args[0] for c in mock_record.call_args_list] == ["paid", "free"]
+
+
+def _details_recorder(classes):
+    async def details(story):
+        classes.append((story["title"], llm_priority.get()))
+        return {"summary": "s", "comments": [{"author": "a", "text": "t"}]}
+    return details
+
+
+@pytest.mark.anyio
+async def test_details_and_replies_run_in_the_callers_class(session_factory, db_client):
+    token = GenerationToken.create_token("future_hn_pack_3", 3, device_id="dev")
+    token.expires_at = datetime.utcnow() + timedelta(days=30)
+    spent = GenerationToken.create_token("future_hn_pack_3", 0, device_id="dev")
+    spent.expires_at = datetime.utcnow() + timedelta(days=30)
+    async with session_factory() as db:
+        db.add_all([token, spent])
+        await db.commit()
+    page = [{"id": 1, "title": "Paid story"}, {"id": 2, "title": "Free story"}, {"id": 3, "title": "Spent story"}]
+    classes = []
+
+    async def replies(story, summary, thread, count):
+        classes.append(("replies", llm_priority.get()))
+        return [{"author": "b", "text": "r"}]
+
+    with patch("app.routes.api._stories_cache", {"2035_en": page}), \
+         patch("app.routes.api._details_cache", {}), \
+         patch("app.routes.api.generate_story_details", _details_recorder(classes)), \
+         patch("app.routes.api.generate_comment_replies", replies):
+        paid = {"X-Generation-Token": token.token}
+        await db_client.get("/api/story/1/details?year=2035&lang=en", headers=paid)
+        await db_client.get("/api/story/2/details?year=2035&lang=en", headers={"X-Generation-Token": "unknown"})
+        await db_client.get(
+            "/api/story/3/details?year=2035&lang=en", headers={"X-Generation-Token": spent.token}
+        )
+        await db_client.get("/api/story/1/comments/1/replies?year=2035&lang=en", headers=paid)
+
+    assert classes == [
+        ("Paid story", "paid"), ("Free story", "free"), ("Spent story", "free"), ("replies", "paid"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_prefetched_details_run_in_the_background_class():
+    from app.routes.api import _prefetch_tasks, prefetch_details
+
+    classes = []
+    details = {}
+    with patch("app.routes.api._details_cache", details), \
+         patch("app.routes.api.generate_story_details", _details_recorder(classes)):
+        with priority_class("paid"):
+            prefetch_details(2035, "en", [{"id": 1, "title": "A"}, {"id": 2, "title": "B"}])
+        await asyncio.gather(*_prefetch_tasks)
+
+    assert classes == [("A", "background"), ("B", "background")]
+    assert set(details) == {"2035_en_A", "2035_en_B"}
@@ -0,0 +1,149 @@
+"""Tests for full-text story search."""
+import os
+import uuid
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models import GeneratedStory
+from app.services.search import InMemorySearchIndex, PostgresSearchIndex, cjk_bigrams, search_backend, tokenize
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+needs_postgres = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+def test_tokenize():
+    assert tokenize("Fusion power, at LAST!") == ["fusion", "power", "at", "last"]
+    assert tokenize("核聚变发电") == ["核聚", "聚变", "变发", "发电"]
+
+
+def test_cjk_bigrams_keep_the_rest_of_the_query():
+    assert cjk_bigrams('"核聚变" or Fusion -東京') == '"核聚 聚变" or Fusion -東京'
+
+
+def test_backend_follows_the_database():
+    with patch("app.services.search.settings") as settings:
+        settings.SEARCH_BACKEND = ""
+        settings.DATABASE_URL = "postgresql+asyncpg://u:p@db:5432/app"
+        assert search_backend() == "postgres"
+        settings.DATABASE_URL = "sqlite+aiosqlite:///./app.db"
+        assert search_backend() == "memory"
+        settings.SEARCH_BACKEND = "memory"
+        settings.DATABASE_URL = "postgresql+asyncpg://u:p@db:5432/app"
+        assert search_backend() == "memory"
+
+
+@pytest.fixture
+async def index():
+    index = InMemorySearchIndex()
+    await index.add_page(2037, "en", [
+        {"id": 1, "title": "Fusion plant powers Boston for a week", "url": "https://a.dev"},
+        {"id": 2, "title": "Show HN: A fusion reactor simulator in Rust", "url": "https://b.dev"},
+        {"id": 3, "title": "Rust 4.0 released", "url": "https://c.dev"},
+    ])
+    await index.add_page(2036, "en", [{"id": 1, "title": "Fusion startup raises $2B", "url": "https://d.dev"}])
+    await index.add_page(2037, "zh", [{"id": 1, "title": "核聚变发电站并网", "url": "https://e.dev"}])
+    return index
+
+
+@pytest.mark.anyio
+async def test_search_newest_first_with_filters(index):
+    hits, _ = await index.search("fusion")
+    assert [h.title for h in hits] == [
+        "Fusion startup raises $2B",
+        "Show HN: A fusion reactor simulator in Rust",
+        "Fusion plant powers Boston for a week",
+    ]
+
+    hits, _ = await index.search("fusion", year=2037)
+    assert len(hits) == 2
+    hits, _ = await index.search("fusion rust", year=2037, lang="en")
+    assert [h.story_id for h in hits] == [2]
+    hits, _ = await index.search("聚变", lang="zh")
+    assert [h.title for h in hits] == ["核聚变发电站并网"]
+    assert await index.search("fusion", lang="de") == ([], None)
+    assert await index.search("tokamak") == ([], None)
+
+
+@pytest.mark.anyio
+async def test_keyset_pagination(index):
+    page1, cursor = await index.search("fusion", limit=2)
+    assert len(page1) == 2 and cursor is not None
+    page2, cursor2 = await index.search("fusion", limit=2, cursor=cursor)
+    assert [h.title for h in page2] == ["Fusion plant powers Boston for a week"]
+    assert cursor2 is None
+
+
+@pytest.mark.anyio
+async def test_summary_is_searchable(index):
+    await index.add_summary(2037, "en", {"title": "Rust 4.0 released"}, "The borrow checker gains effects.")
+
+    hits, _ = await index.search("borrow checker")
+    assert [h.title for h in hits] == ["Rust 4.0 released"]
+    assert hits[0].to_dict()["summary"].startswith("The borrow checker")
+
+
+@pytest.mark.anyio
+async def test_search_endpoint(client, index):
+    with patch("app.routes.api.search_index", index):
+        response = await client.get("/api/search", params={"q": "fusion", "year": 2037, "limit": 1})
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["story_id"] for r in data["results"]] == [2]
+
+        response = await client.get("/api/search", params={"q": "fusion", "year": 2037, "cursor": data["next_cursor"]})
+        assert [r["story_id"] for r in response.json()["results"]] == [1]
+
+
+@pytest.mark.anyio
+async def test_details_summary_gets_indexed(client):
+    index = InMemorySearchIndex()
+    story = {"id": 4, "title": "Quantum sensors in every phone", "url": "https://q.dev"}
+    await index.add_page(2035, "en", [story])
+
+    with patch("app.routes.api.search_index", index), \
+         patch("app.services.search.search_index", index), \
+         patch("app.routes.api._stories_cache", {"2035_en": [story]}), \
+         patch("app.routes.api.generate_story_details",
+               AsyncMock(return_value={"summary": "Magnetometers shrink.", "comments": []})):
+        await client.get("/api/story/4/details?year=2035&lang=en")
+
+    hits, _ = await index.search("magnetometers")
+    assert [h.story_id for h in hits] == [4]
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_postgres_matches_cjk_on_bigrams():
+    schema = f"search_{uuid.uuid4().hex[:8]}"
+    admin = create_async_engine(POSTGRES_URL)
+    async with admin.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_async_engine(POSTGRES_URL, connect_args={"server_settings": {"search_path": schema}})
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[GeneratedStory.__table__])
+        index = PostgresSearchIndex()
+        with patch("app.services.search.async_session", async_sessionmaker(engine, class_=AsyncSession)):
+            await index.add_page(2035, "zh", [
+                {"id": 1, "title": "核聚变发电站并网", "url": "https://f.cn"},
+                {"id": 2, "title": "量子计算机上市", "url": "https://q.cn"},
+            ])
+            await index.add_summary(2035, "zh", {"title": "量子计算机上市"}, "东京的工厂开始量产。")
+            in_title, _ = await index.search("核聚变")
+            in_summary, _ = await index.search("量产 计算")
+            phrase, _ = await index.search('"聚变发电"', lang="zh")
+            missing, _ = await index.search("聚发")
+    finally:
+        await engine.dispose()
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await admin.dispose()
+
+    assert [h.story_id for h in in_title] == [1]
+    assert [h.story_id for h in in_summary] == [2]
+    assert [h.story_id for h in phrase] == [1]
+    assert missing == []
@@ -0,0 +1,227 @@
+"""Tests for deduplication of identical work across requests and replicas."""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.core.metrics import TOOL_SLUG
+from app.models import SingleFlightResult
+from app.services.maintenance import run_maintenance
+from app.services.single_flight import LocalSingleFlight, PostgresSingleFlight, advisory_lock_id
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+needs_postgres = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+def _outcomes(kind):
+    return {
+        outcome: REGISTRY.get_sample_value(
+            "single_flight_requests_total", {"tool": TOOL_SLUG, "kind": kind, "outcome": outcome}
+        ) or 0
+        for outcome in ("led", "waited", "stored", "timeout", "unlocked")
+    }
+
+
+def _slow(result, delay=0.05):
+    async def work(*args):
+        await asyncio.sleep(delay)
+        return result
+    return AsyncMock(side_effect=work)
+
+
+@pytest.mark.anyio
+async def test_concurrent_callers_share_one_run():
+    flight = LocalSingleFlight(timeout=5)
+    work = _slow({"summary": "once"})
+    before = _outcomes("share")
+
+    results = await asyncio.gather(*(flight.run("share:key", work) for _ in range(5)))
+
+    assert results == [{"summary": "once"}] * 5
+    assert work.await_count == 1
+    after = _outcomes("share")
+    assert after["led"] - before["led"] == 1
+    assert after["waited"] - before["waited"] == 4
+
+
+@pytest.mark.anyio
+async def test_waiter_times_out_and_runs_the_work_itself():
+    flight = LocalSingleFlight(timeout=0.01)
+    slow, fast = _slow("leader", delay=0.2), AsyncMock(return_value="own")
+    before = _outcomes("slow")
+
+    leader = asyncio.ensure_future(flight.run("slow:key", slow))
+    await asyncio.sleep(0)
+    assert await flight.run("slow:key", fast) == "own"
+    assert await leader == "leader"
+    assert _outcomes("slow")["timeout"] - before["timeout"] == 1
+
+
+@pytest.mark.anyio
+async def test_failed_run_is_not_remembered():
+    flight = LocalSingleFlight(timeout=5)
+    work = AsyncMock(side_effect=[RuntimeError("llm down"), "ok"])
+
+    with pytest.raises(RuntimeError):
+        await flight.run("fail:key", work)
+    assert await flight.run("fail:key", work) == "ok"
+
+
+@pytest.mark.anyio
+async def test_cancelled_first_caller_does_not_cancel_the_work():
+    flight = LocalSingleFlight(timeout=5)
+    work = _slow("done")
+
+    first = asyncio.ensure_future(flight.run("cancel:key", work))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flight.run("cancel:key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+    assert work.await_count == 1
+
+
+@pytest.mark.anyio
+async def test_story_details_generated_once_for_concurrent_requests(client):
+    story = {"id": 3, "title": "A viral launch", "url": "https://v.dev"}
+    generate = _slow({"summary": "S", "comments": []})
+    with patch("app.routes.api._stories_cache", {"2035_en": [story]}), \
+         patch("app.routes.api._details_cache", {}), \
+         patch("app.routes.api.index_summary", AsyncMock()), \
+         patch("app.routes.api.generate_story_details", generate):
+        responses = await asyncio.gather(*(client.get("/api/story/3/details") for _ in range(3)))
+
+    assert [r.json()["summary"] for r in responses] == ["S"] * 3
+    assert generate.await_count == 1
+
+
+@pytest.mark.anyio
+async def test_maintenance_purges_expired_results(session_factory):
+    now = datetime(2036, 6, 1)
+    async with session_factory() as db:
+        db.add(SingleFlightResult(key="old", result={}, expires_at=now - timedelta(seconds=1)))
+        db.add(SingleFlightResult(key="fresh", result={}, expires_at=now + timedelta(hours=1)))
+        await db.commit()
+
+    result = await run_maintenance(session_factory, now=now)
+
+    assert result["single_flight_results"] == 1
+    async with session_factory() as db:
+        assert await db.get(SingleFlightResult, "fresh") is not None
+
+
+@pytest.fixture
+async def pg_session_factory():
+    engine = create_async_engine(POSTGRES_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[SingleFlightResult.__table__])
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def _node(session_factory, timeout=10, **pool):
+    """One replica: its own in-process layer and lock connections."""
+    return PostgresSingleFlight(timeout, ttl=60, poll=0.05, session_factory=session_factory,
+                                lock_engine=create_async_engine(POSTGRES_URL, isolation_level="AUTOCOMMIT", **pool))
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_replicas_share_one_run(pg_session_factory):
+    key = f"pg:{uuid.uuid4()}"
+    nodes = [_node(pg_session_factory) for _ in range(3)]
+    work = _slow({"summary": "stored"}, delay=0.3)
+    before = _outcomes("pg")
+
+    results = await asyncio.gather(*(node.run(key, work) for node in nodes))
+
+    assert results == [{"summary": "stored"}] * 3
+    assert work.await_count == 1
+    after = _outcomes("pg")
+    assert after["led"] - before["led"] == 1
+    assert after["waited"] - before["waited"] == 2
+    # Later callers read the stored result without waiting.
+    assert await _node(pg_session_factory).run(key, work) == {"summary": "stored"}
+    assert _outcomes("pg")["stored"] - after["stored"] == 1
+    assert await nodes[0].stored(key) == {"summary": "stored"}
+    assert await nodes[0].stored(f"pg:{uuid.uuid4()}") is None
+    for node in nodes:
+        await node.close()
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_long_keys_are_stored_and_shared(pg_session_factory):
+    key = f"long:{uuid.uuid4()}:" + "標題" * 300
+    nodes = [_node(pg_session_factory) for _ in range(2)]
+    work = _slow({"summary": "long"}, delay=0.2)
+
+    results = await asyncio.gather(*(node.run(key, work) for node in nodes))
+
+    assert results == [{"summary": "long"}] * 2
+    assert work.await_count == 1
+    assert await nodes[0].stored(key) == {"summary": "long"}
+    for node in nodes:
+        await node.close()
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_full_lock_pool_runs_the_work_unlocked(pg_session_factory):
+    node = _node(pg_session_factory, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    keys = [f"full:{uuid.uuid4()}" for _ in range(3)]
+    work = _slow({"summary": "ok"}, delay=0.3)
+    before = _outcomes("full")
+
+    results = await asyncio.gather(*(node.run(key, work) for key in keys))
+
+    assert results == [{"summary": "ok"}] * 3
+    after = _outcomes("full")
+    assert (after["led"] - before["led"], after["unlocked"] - before["unlocked"]) == (1, 2)
+    await node.close()
+
+
+HOLD_LOCK = """
+import asyncio, sys, asyncpg
+
+async def main():
+    conn = await asyncpg.connect(sys.argv[1])
+    await conn.execute("SELECT pg_advisory_lock($1)", int(sys.argv[2]))
+    print("locked", flush=True)
+    await asyncio.sleep(3600)
+
+asyncio.run(main())
+"""
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_lock_is_released_when_the_leader_crashes(pg_session_factory):
+    key = f"crash:{uuid.uuid4()}"
+    leader = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", HOLD_LOCK, POSTGRES_URL.replace("+asyncpg", ""), str(advisory_lock_id(key)),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    assert (await leader.stdout.readline()).strip() == b"locked"
+
+    node = _node(pg_session_factory)
+    work = AsyncMock(return_value={"summary": "taken over"})
+    waiting = asyncio.ensure_future(node.run(key, work))
+    await asyncio.sleep(0.3)
+    assert not waiting.done()
+    work.assert_not_awaited()
+
+    leader.kill()
+    await leader.wait()
+
+    assert await asyncio.wait_for(waiting, 10) == {"summary": "taken over"}
+    work.assert_awaited_once()
+    await node.close()
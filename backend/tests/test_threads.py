@@ -0,0 +1,188 @@
+"""Tests for lazily generated comment threads."""
+import asyncio
+import copy
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.llm import generate_comment_replies
+from app.services.single_flight import LocalSingleFlight
+from app.services.threads import MAX_THREAD_DEPTH, attach_replies, find_thread, number_comments
+
+
+def _comments():
+    comments = [
+        {"author": "a", "text": "first", "replies": [{"author": "c", "text": "nested"}]},
+        {"author": "b", "text": "second", "reply_count": 4},
+    ]
+    number_comments(comments)
+    return comments
+
+
+def test_number_comments_assigns_path_ids():
+    comments = _comments()
+    assert [c["id"] for c in comments] == ["1", "2"]
+    assert comments[0]["replies"][0]["id"] == "1.1"
+
+
+def test_find_thread_returns_chain():
+    comments = _comments()
+    assert [c["text"] for c in find_thread(comments, "1.1")] == ["first", "nested"]
+    assert find_thread(comments, "3") is None
+    assert find_thread(comments, "2.1") is None
+
+
+def test_attach_replies_numbers_under_parent():
+    comment = _comments()[1]
+    attach_replies(comment, [{"text": "x"}, {"text": "y"}])
+    assert [r["id"] for r in comment["replies"]] == ["2.1", "2.2"]
+    assert comment["reply_count"] == 4
+
+
+@pytest.mark.anyio
+async def test_generate_comment_replies_sends_chain_and_summary():
+    response = MagicMock()
+    response.choices = [MagicMock()]
+    response.choices[0].message.content = '[{"author": "d", "text": "reply"}, {"author": "e"}]'
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create.return_value = response
+
+    thread = _comments()[0:1] + _comments()[0]["replies"]
+    with patch("app.services.llm.get_client", return_value=mock_client):
+        replies = await generate_comment_replies({"title": "Fusion"}, "Net gain at last.", thread, 3)
+
+    assert replies == [{"author": "d", "text": "reply"}]
+    prompt = mock_client.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+    assert "Net gain at last." in prompt
+    assert "a: first" in prompt and "c: nested" in prompt
+
+
+def _cached(story, comments):
+    return patch("app.routes.api._stories_cache", {"2035_en": [story]}), \
+        patch("app.routes.api._details_cache", {f"2035_en_{story['title']}": {"summary": "S", "comments": comments}})
+
+
+@pytest.mark.anyio
+async def test_replies_generated_once_and_cached(client):
+    story = {"id": 1, "title": "Fusion"}
+    comments = _comments()
+    stories_patch, details_patch = _cached(story, comments)
+
+    async def slow_replies(*args):
+        await asyncio.sleep(0.01)
+        return [{"author": "d", "text": "reply"}]
+
+    generate = AsyncMock(side_effect=slow_replies)
+    with stories_patch, details_patch, patch("app.routes.api.generate_comment_replies", generate):
+        first, second = await asyncio.gather(
+            client.get("/api/story/1/comments/2/replies?year=2035&lang=en"),
+            client.get("/api/story/1/comments/2/replies?year=2035&lang=en"),
+        )
+        again = await client.get("/api/story/1/comments/2/replies?year=2035&lang=en")
+
+    assert generate.await_count == 1
+    assert first.json() == second.json() == again.json()
+    assert first.json()["replies"] == [{"author": "d", "text": "reply", "id": "2.1"}]
+    assert [c["text"] for c in generate.await_args.args[2]] == ["second"]
+    assert comments[1]["replies"][0]["id"] == "2.1"
+
+
+@pytest.mark.anyio
+async def test_expanded_replies_returned_without_llm_call(client):
+    stories_patch, details_patch = _cached({"id": 1, "title": "Fusion"}, _comments())
+    generate = AsyncMock()
+    with stories_patch, details_patch, patch("app.routes.api.generate_comment_replies", generate):
+        response = await client.get("/api/story/1/comments/1/replies?year=2035&lang=en")
+
+    assert response.json()["replies"][0]["text"] == "nested"
+    generate.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_deepest_comment_gets_no_replies(client):
+    comment = {"text": "deep"}
+    root = comment
+    for _ in range(MAX_THREAD_DEPTH - 1):
+        comment["replies"] = [{"text": "deeper"}]
+        comment = comment["replies"][0]
+    comments = [root]
+    number_comments(comments)
+    stories_patch, details_patch = _cached({"id": 1, "title": "Fusion"}, comments)
+    generate = AsyncMock()
+    with stories_patch, details_patch, patch("app.routes.api.generate_comment_replies", generate):
+        response = await client.get(f"/api/story/1/comments/{comment['id']}/replies")
+
+    assert response.status_code == 200
+    assert response.json()["replies"] == []
+    generate.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_replies_not_found(client):
+    stories_patch, details_patch = _cached({"id": 1, "title": "Fusion"}, _comments())
+    with stories_patch, details_patch:
+        unknown_comment = await client.get("/api/story/1/comments/7/replies")
+        unknown_story = await client.get("/api/story/2/comments/1/replies")
+        bad_id = await client.get("/api/story/1/comments/1..2/replies")
+
+    assert unknown_comment.status_code == 404
+    assert unknown_story.status_code == 404
+    assert bad_id.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_more_replies_until_the_cap(client):
+    stories_patch, details_patch = _cached({"id": 1, "title": "Fusion"}, _comments())
+    batches = iter(["x", "y", "z"])
+    generate = AsyncMock(side_effect=lambda *args: [{"author": "d", "text": next(batches)}])
+    url = "/api/story/1/comments/2/replies?year=2035&lang=en"
+
+    with stories_patch, details_patch, patch("app.routes.api.generate_comment_replies", generate), \
+         patch("app.routes.api.settings.LLM_REPLIES_MAX_EXPANDS", 2):
+        first = await client.get(url)
+        reopened = await client.get(url)
+        more = await client.get(f"{url}&more=true")
+        capped = await client.get(f"{url}&more=true")
+
+    assert first.json()["has_more"] and first.json() == reopened.json()
+    assert [(r["id"], r["text"]) for r in more.json()["replies"]] == [("2.1", "x"), ("2.2", "y")]
+    assert capped.json() == {**more.json(), "has_more": False}
+    assert generate.await_count == 2
+
+
+class _SharedStore(LocalSingleFlight):
+    """Stands in for the Postgres store that replicas share."""
+
+    def __init__(self):
+        super().__init__(timeout=5)
+        self.results = {}
+
+    async def _lead(self, key, call):
+        if key not in self.results:
+            self.results[key] = copy.deepcopy(await call())
+            return copy.deepcopy(self.results[key]), "led"
+        return copy.deepcopy(self.results[key]), "stored"
+
+    async def stored(self, key):
+        return copy.deepcopy(self.results.get(key))
+
+
+@pytest.mark.anyio
+async def test_thread_continues_on_another_replica(client):
+    story = {"id": 1, "title": "Fusion"}
+    store = _SharedStore()
+    store.results["details:2035_en_Fusion"] = {"summary": "S", "comments": _comments()}
+    generate = AsyncMock(side_effect=[[{"author": "d", "text": "reply"}], [{"author": "e", "text": "deeper"}]])
+
+    with patch("app.routes.api._stories_cache", {"2035_en": [story]}), \
+         patch("app.routes.api.single_flight", store), \
+         patch("app.routes.api.generate_comment_replies", generate):
+        with patch("app.routes.api._details_cache", {}):
+            await client.get("/api/story/1/comments/2/replies?year=2035&lang=en")
+        # A replica that has seen neither the details nor the replies.
+        with patch("app.routes.api._details_cache", {}):
+            response = await client.get("/api/story/1/comments/2.1/replies?year=2035&lang=en")
+
+    assert response.status_code == 200
+    assert response.json()["replies"] == [{"author": "e", "text": "deeper", "id": "2.1.1"}]
+    assert [c["text"] for c in generate.await_args.args[2]] == ["second", "reply"]
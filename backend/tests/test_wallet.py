@@ -0,0 +1,134 @@
+"""Tests for device-wallet credit consumption."""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models import GenerationToken
+from app.routes.api import check_and_use_wallet
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+needs_postgres = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.mark.anyio
+async def test_wallet_spends_earliest_expiring_token(session_factory, make_token, add_rows, remaining_generations):
+    late = make_token(expires_in_days=300)
+    soon = make_token(expires_in_days=10, remaining=1)
+    empty = make_token(expires_in_days=1, remaining=0)
+    expired = make_token(expires_in_days=-1)
+    other_device = make_token(device_id="other", expires_in_days=2)
+    await add_rows(late, soon, empty, expired, other_device)
+
+    async with session_factory() as db:
+        assert await check_and_use_wallet("dev", db)
+        assert await check_and_use_wallet("dev", db)
+
+    remaining = await remaining_generations()
+    assert remaining[soon.token] == 0
+    assert remaining[late.token] == 2
+    assert remaining[expired.token] == 3
+    assert remaining[other_device.token] == 3
+
+
+@pytest.mark.anyio
+async def test_wallet_empty(session_factory, make_token, add_rows):
+    await add_rows(make_token(remaining=0))
+    async with session_factory() as db:
+        assert not await check_and_use_wallet("dev", db)
+        assert not await check_and_use_wallet("unknown", db)
+
+
+@pytest.mark.anyio
+async def test_wallet_balance_endpoint(db_client, make_token, add_rows):
+    soon = make_token(expires_in_days=10, remaining=1)
+    await add_rows(soon, make_token(remaining=3), make_token(remaining=0), make_token(expires_in_days=-1))
+
+    response = await db_client.get("/api/tokens/wallet/dev")
+    data = response.json()
+    assert data["remaining_generations"] == 4
+    assert data["token_count"] == 2
+    assert data["next_expiry"] == soon.expires_at.isoformat()
+
+    response = await db_client.get("/api/tokens/wallet/nobody")
+    assert response.json() == {"device_id": "nobody", "remaining_generations": 0, "token_count": 0,
+                               "next_expiry": None}
+
+
+@pytest.mark.anyio
+async def test_generate_with_wallet(db_client, make_token, add_rows):
+    await add_rows(make_token(remaining=1))
+
+    stories = [{"id": 1, "title": "Paid story", "url": "https://p.dev"}]
+    with patch("app.routes.api.generate_stories", AsyncMock(return_value=stories)):
+        request = {"year": 2035, "device_id": "dev", "use_wallet": True}
+        response = await db_client.post("/api/generate", json=request)
+        assert response.status_code == 200
+        response = await db_client.post("/api/generate", json=request)
+        assert response.status_code == 402
+
+
+@pytest.mark.anyio
+async def test_wallet_queries_use_live_token_index(session_factory):
+    """The debit picks its token through the partial (device_id, expires_at) index."""
+    now = datetime.utcnow()
+    pick = (
+        select(GenerationToken.id)
+        .where(
+            GenerationToken.device_id == "dev",
+            GenerationToken.remaining_generations > 0,
+            GenerationToken.expires_at > now,
+        )
+        .order_by(GenerationToken.expires_at)
+        .limit(1)
+    )
+    async with session_factory() as db:
+        compiled = pick.compile(db.bind, compile_kwargs={"literal_binds": True})
+        plan = (await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+
+    detail = " ".join(row[-1] for row in plan)
+    assert "ix_generation_tokens_device_live" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+@needs_postgres
+@pytest.mark.anyio
+async def test_debit_waits_for_a_locked_token(make_token):
+    engine = create_async_engine(POSTGRES_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[GenerationToken.__table__])
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    device = f"dev-{uuid.uuid4()}"
+    token = make_token(device_id=device, remaining=2)
+    async with session_factory() as db:
+        db.add(token)
+        await db.commit()
+
+    async with session_factory() as holder:
+        # A concurrent debit holds the device's only token until it commits.
+        await holder.execute(
+            select(GenerationToken.id).where(GenerationToken.token == token.token).with_for_update()
+        )
+        async with session_factory() as db:
+            second = asyncio.create_task(check_and_use_wallet(device, db))
+            await asyncio.sleep(0.2)
+            assert not second.done()
+            await holder.execute(
+                GenerationToken.__table__.update()
+                .where(GenerationToken.token == token.token)
+                .values(remaining_generations=1)
+            )
+            await holder.commit()
+            assert await second is True
+
+    async with session_factory() as db:
+        assert await check_and_use_wallet(device, db) is False
+        await db.execute(GenerationToken.__table__.delete().where(GenerationToken.token == token.token))
+        await db.commit()
+    await engine.dispose()
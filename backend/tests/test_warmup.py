@@ -0,0 +1,94 @@
+"""Tests for start-up warm-up and the readiness probe."""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import warmup
+from app.core.warmup import Readiness
+from app.main import app, lifespan
+
+
+@pytest.mark.anyio
+async def test_ready_fails_until_warm(client):
+    with patch("app.main.readiness", Readiness()) as state:
+        response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["ready"] is False
+
+        state.mark_ready()
+        response = await client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+
+
+@pytest.mark.anyio
+async def test_warm_up_opens_db_and_llm():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    state = Readiness()
+    warm_llm = AsyncMock()
+
+    with patch.object(warmup, "engine", engine), patch.object(warmup, "readiness", state), \
+         patch.object(warmup, "_warm_llm", warm_llm):
+        await warmup.warm_up()
+
+    assert state.ready
+    assert state.steps == {"db": "ok", "llm": "ok"}
+    warm_llm.assert_awaited_once()
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_warm_up_survives_llm_failure():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    state = Readiness()
+
+    with patch.object(warmup, "engine", engine), patch.object(warmup, "readiness", state), \
+         patch.object(warmup, "_warm_llm", AsyncMock(side_effect=RuntimeError("proxy down"))):
+        await warmup.warm_up()
+
+    assert state.ready
+    assert state.steps["llm"].startswith("skipped")
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_warm_up_retries_db_until_available():
+    state = Readiness()
+    engine = create_async_engine("sqlite+aiosqlite://")
+
+    class FlakyEngine:
+        calls = 0
+
+        def connect(self):
+            FlakyEngine.calls += 1
+            if FlakyEngine.calls == 1:
+                raise ConnectionRefusedError("db starting")
+            return engine.connect()
+
+    with patch.object(warmup, "engine", FlakyEngine()), patch.object(warmup, "readiness", state), \
+         patch.object(warmup, "DB_RETRY_SECONDS", 0), patch.object(warmup, "_warm_llm", AsyncMock()), \
+         patch.object(warmup.settings, "DB_WARM_CONNECTIONS", 1):
+        await warmup.warm_up()
+
+    assert state.ready
+    assert FlakyEngine.calls == 2
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_metrics_are_exposed_and_startup_warms_story_pages(client):
+    restore = AsyncMock()
+    with patch("app.main.warm_up", AsyncMock()), patch("app.main.restore_caches", restore), \
+         patch("app.main.settings.CACHE_SNAPSHOT_PATH", "cache.snapshot"), \
+         patch("app.main.settings.DB_CREATE_SCHEMA", False), \
+         patch("app.main.settings.JOB_WORKERS", 0), patch("app.main.settings.MAINTENANCE_INTERVAL_SECONDS", 0), \
+         patch("app.main.settings.LOOP_LAG_INTERVAL_SECONDS", 0), \
+         patch("app.main.snapshot_store.save"):
+        async with lifespan(app):
+            await client.get("/health")
+            response = await client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert b"http_requests_total" in response.content
+    restore.assert_awaited_once_with("cache.snapshot")
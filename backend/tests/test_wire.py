@@ -0,0 +1,36 @@
+"""Tests for the compact story wire format."""
+import pytest
+
+from app.services.wire import STORY_FIELDS, decode_compact, encode_compact, story_token_budget
+
+
+def test_round_trip():
+    stories = [
+        {"title": "Show HN: A fusion reactor in a shoebox", "url": "https://shoebox.energy",
+         "domain": "shoebox.energy", "score": 1204, "author": "plasma_pat", "time": "3 hours ago",
+         "comments": 312},
+        {"title": "Ask HN: Is anyone still writing YAML?", "url": "https://news.ycombinator.com/item?id=9",
+         "domain": "news.ycombinator.com", "score": 88, "author": "yamlhater", "time": "1 hour ago",
+         "comments": 140},
+    ]
+    assert decode_compact(encode_compact(stories)) == stories
+
+
+def test_decode_code_block_and_loose_ints():
+    text = "```tsv\ntitle\turl\tscore\nFoo\thttps://foo.dev\t1,204 points\n```"
+    assert decode_compact(text) == [{"title": "Foo", "url": "https://foo.dev", "score": 1204}]
+
+
+def test_decode_drops_truncated_row():
+    text = "title\turl\tscore\nFoo\thttps://foo.dev\t10\nBar\thttps://ba"
+    assert decode_compact(text) == [{"title": "Foo", "url": "https://foo.dev", "score": 10}]
+
+
+def test_decode_rejects_json():
+    with pytest.raises(ValueError):
+        decode_compact('[{"title": "Foo"}]')
+
+
+def test_budget_is_well_below_json_budget():
+    assert story_token_budget(30, STORY_FIELDS) < 8000
+    assert story_token_budget(30, ["title", "url"]) < story_token_budget(30, STORY_FIELDS)
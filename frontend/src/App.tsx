@@ -13,6 +13,7 @@ function App() {
   const { t, i18n } = useTranslation();
   const [year, setYear] = useState(2035);
   const [stories, setStories] = useState<Story[]>([]);
+  const [pageId, setPageId] = useState<string | undefined>();
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [generated, setGenerated] = useState(false);
@@ -49,6 +50,7 @@ function App() {
         activeToken?.token,
       );
       setStories(data.stories);
+      setPageId(data.page_id);
       setGenerated(true);
 
       // Update local state after usage
@@ -88,7 +90,7 @@ function App() {
           </div>
         )}
         {!loading && generated && stories.length > 0 && (
-          <StoryList stories={stories} year={year} />
+          <StoryList key={pageId} stories={stories} year={year} pageId={pageId} />
         )}
         {!loading && !generated && (
           <div className="hn-welcome">
@@ -1,18 +1,36 @@
 import { useState } from 'react';
 import { useTranslation } from 'react-i18next';
-import { getStoryDetails } from '../services/api';
-import type { Story, StoryDetails } from '../services/api';
+import { getCommentReplies, getStoryDetails } from '../services/api';
+import { useTokenStore } from '../stores/tokenStore';
+import type { Comment, Story, StoryDetails } from '../services/api';
+
+// Matches the server's MAX_THREAD_DEPTH: comments this deep get no replies.
+const MAX_THREAD_DEPTH = 6;
+
+function withReplies(comments: Comment[], commentId: string, replies: Comment[], hasMore: boolean): Comment[] {
+  return comments.map((comment) => {
+    if (comment.id === commentId) return { ...comment, replies, has_more: hasMore };
+    if (comment.replies && commentId.startsWith(`${comment.id}.`)) {
+      return { ...comment, replies: withReplies(comment.replies, commentId, replies, hasMore) };
+    }
+    return comment;
+  });
+}
 
 interface StoryListProps {
   stories: Story[];
   year: number;
+  pageId?: string;
 }
 
-export function StoryList({ stories, year }: StoryListProps) {
+export function StoryList({ stories, year, pageId }: StoryListProps) {
   const { t, i18n } = useTranslation();
+  const { getActiveToken } = useTokenStore();
   const [expandedId, setExpandedId] = useState<number | null>(null);
   const [details, setDetails] = useState<Record<number, StoryDetails>>({});
   const [loadingId, setLoadingId] = useState<number | null>(null);
+  const [loadingReplies, setLoadingReplies] = useState<string | null>(null);
+  const lang = i18n.language.split('-')[0];
 
   const handleToggle = async (storyId: number) => {
     if (expandedId === storyId) {
@@ -25,7 +43,13 @@ export function StoryList({ stories, year }: StoryListProps) {
     if (!details[storyId]) {
       setLoadingId(storyId);
       try {
-        const data = await getStoryDetails(storyId, year, i18n.language.split('-')[0]);
+        const data = await getStoryDetails(
+          storyId,
+          year,
+          lang,
+          getActiveToken()?.token,
+          pageId,
+        );
         setDetails((prev) => ({ ...prev, [storyId]: data }));
       } catch {
         // silently fail
@@ -35,6 +59,28 @@ export function StoryList({ stories, year }: StoryListProps) {
     }
   };
 
+  const handleReplies = async (storyId: number, commentId: string, more: boolean) => {
+    const key = `${storyId}/${commentId}`;
+    if (loadingReplies === key) return;
+    setLoadingReplies(key);
+    try {
+      const data = await getCommentReplies(
+        storyId, commentId, year, lang, more, getActiveToken()?.token, pageId,
+      );
+      setDetails((prev) => ({
+        ...prev,
+        [storyId]: {
+          ...prev[storyId],
+          comments: withReplies(prev[storyId].comments, commentId, data.replies, data.has_more),
+        },
+      }));
+    } catch {
+      // silently fail
+    } finally {
+      setLoadingReplies(null);
+    }
+  };
+
   return (
     <table className="hn-story-table">
       <tbody>
@@ -46,7 +92,9 @@ export function StoryList({ stories, year }: StoryListProps) {
             expanded={expandedId === story.id}
             detail={details[story.id]}
             loading={loadingId === story.id}
+            loadingReplies={loadingReplies}
             onToggle={() => handleToggle(story.id)}
+            onReplies={(commentId, more) => handleReplies(story.id, commentId, more)}
             t={t}
           />
         ))}
@@ -61,11 +109,15 @@ interface StoryRowProps {
   expanded: boolean;
   detail?: StoryDetails;
   loading: boolean;
+  loadingReplies: string | null;
   onToggle: () => void;
+  onReplies: (commentId: string, more: boolean) => void;
   t: (key: string) => string;
 }
 
-function StoryRow({ story, index, expanded, detail, loading, onToggle, t }: StoryRowProps) {
+function StoryRow({
+  story, index, expanded, detail, loading, loadingReplies, onToggle, onReplies, t,
+}: StoryRowProps) {
   return (
     <>
       <tr className="hn-story-row">
@@ -111,14 +163,14 @@ function StoryRow({ story, index, expanded, detail, loading, onToggle, t }: Stor
                     <div className="hn-detail-comments">
                       <h3>{t('topComments')}</h3>
                       {detail.comments.map((comment, i) => (
-                        <div key={i} className="hn-comment">
-                          <div className="hn-comment-meta">
-                            <span className="hn-comment-author">{comment.author}</span>
-                            <span className="hn-comment-time">{comment.time}</span>
-                            <span className="hn-comment-score">{comment.score} {t('points')}</span>
-                          </div>
-                          <div className="hn-comment-text">{comment.text}</div>
-                        </div>
+                        <CommentItem
+                          key={comment.id ?? i}
+                          comment={comment}
+                          loadingKey={loadingReplies}
+                          storyId={story.id}
+                          onReplies={onReplies}
+                          t={t}
+                        />
                       ))}
                     </div>
                   )}
@@ -131,3 +183,58 @@ function StoryRow({ story, index, expanded, detail, loading, onToggle, t }: Stor
     </>
   );
 }
+
+interface CommentItemProps {
+  comment: Comment;
+  storyId: number;
+  loadingKey: string | null;
+  onReplies: (commentId: string, more: boolean) => void;
+  t: (key: string) => string;
+}
+
+function CommentItem({ comment, storyId, loadingKey, onReplies, t }: CommentItemProps) {
+  const loading = loadingKey === `${storyId}/${comment.id}`;
+  // Details cached before comments had path ids cannot open threads.
+  const canReply = !!comment.id && comment.id.split('.').length < MAX_THREAD_DEPTH;
+  const control = !comment.replies
+    ? canReply && t('showReplies') + (comment.reply_count ? ` (${comment.reply_count})` : '')
+    : comment.has_more && t('moreReplies');
+
+  return (
+    <div className="hn-comment">
+      <div className="hn-comment-meta">
+        <span className="hn-comment-author">{comment.author}</span>
+        <span className="hn-comment-time">{comment.time}</span>
+        <span className="hn-comment-score">{comment.score} {t('points')}</span>
+      </div>
+      <div className="hn-comment-text">{comment.text}</div>
+      {comment.replies && comment.replies.length > 0 && (
+        <div className="hn-comment-replies">
+          {comment.replies.map((reply) => (
+            <CommentItem
+              key={reply.id}
+              comment={reply}
+              storyId={storyId}
+              loadingKey={loadingKey}
+              onReplies={onReplies}
+              t={t}
+            />
+          ))}
+        </div>
+      )}
+      {loading && <div className="hn-comment-more">{t('loadingReplies')}</div>}
+      {!loading && control && (
+        <a
+          href="#"
+          className="hn-comment-more"
+          onClick={(e) => {
+            e.preventDefault();
+            onReplies(comment.id, !!comment.replies);
+          }}
+        >
+          {control}
+        </a>
+      )}
+    </div>
+  );
+}
@@ -11,20 +11,37 @@ export interface Story {
   comments: number;
 }
 
+export interface Comment {
+  // Path id: "2.1" is the first reply to the second top-level comment.
+  id: string;
+  author: string;
+  text: string;
+  score: number;
+  time: string;
+  reply_count?: number;
+  // Present once the thread has been expanded.
+  replies?: Comment[];
+  has_more?: boolean;
+}
+
 export interface StoryDetails {
   story_id: number;
   summary: string;
-  comments: Array<{
-    author: string;
-    text: string;
-    score: number;
-    time: string;
-  }>;
+  comments: Comment[];
+}
+
+export interface CommentReplies {
+  story_id: number;
+  comment_id: string;
+  replies: Comment[];
+  has_more: boolean;
 }
 
 export interface GenerateResponse {
   year: number;
   stories: Story[];
+  // Opens this page's stories on any server, not just the latest page.
+  page_id?: string;
 }
 
 export interface TrialStatus {
@@ -85,8 +102,37 @@ export async function generateStories(
   return res.json();
 }
 
-export async function getStoryDetails(storyId: number, year: number, lang: string): Promise<StoryDetails> {
-  const res = await fetch(`${API_BASE}/story/${storyId}/details?year=${year}&lang=${lang}`);
+export async function getStoryDetails(
+  storyId: number,
+  year: number,
+  lang: string,
+  token?: string,
+  pageId?: string,
+): Promise<StoryDetails> {
+  // A paid token gets the details generated ahead of free-trial traffic.
+  // Sent as a header so the token stays out of URLs, logs and history.
+  const headers: Record<string, string> = token ? { 'X-Generation-Token': token } : {};
+  const page = pageId ? `&page_id=${encodeURIComponent(pageId)}` : '';
+  const res = await fetch(`${API_BASE}/story/${storyId}/details?year=${year}&lang=${lang}${page}`, { headers });
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+  return res.json();
+}
+
+export async function getCommentReplies(
+  storyId: number,
+  commentId: string,
+  year: number,
+  lang: string,
+  more: boolean,
+  token?: string,
+  pageId?: string,
+): Promise<CommentReplies> {
+  const headers: Record<string, string> = token ? { 'X-Generation-Token': token } : {};
+  const page = pageId ? `&page_id=${encodeURIComponent(pageId)}` : '';
+  const res = await fetch(
+    `${API_BASE}/story/${storyId}/comments/${commentId}/replies?year=${year}&lang=${lang}&more=${more}${page}`,
+    { headers },
+  );
   if (!res.ok) throw new Error(`HTTP ${res.status}`);
   return res.json();
 }